@@ -3,11 +3,16 @@ import sqlite3
 import os
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QLabel, QPushButton,
-    QScrollArea, QLineEdit, QFormLayout, QMessageBox, QDialog, QDialogButtonBox, QListWidget, QInputDialog
+    QScrollArea, QLineEdit, QFormLayout, QMessageBox, QDialog, QDialogButtonBox, QListWidget, QInputDialog,
+    QFileDialog, QHBoxLayout, QAbstractItemView
 )
 from PyQt6.QtCore import Qt
 import objects
+import theme
 import datafetching
+import backup
+import departments
+from autoimport import FOLDER_SETTING
 
 def resource_path(relative_path):
     """Get absolute path to resource, works for PyInstaller."""
@@ -18,14 +23,6 @@ def resource_path(relative_path):
         base_path = os.path.abspath(".")
     return os.path.join(base_path, relative_path)
 
-def db_path(relative_path):
-    appdata_path = os.path.join(os.environ["APPDATA"], "HR_App")
-    os.makedirs(appdata_path, exist_ok=True)
-
-    # Always use this path for the database
-    db_path = os.path.join(appdata_path, relative_path)
-    return db_path
-
 # Password dialog
 class PasswordDialog(objects.StyledDialog):
     def __init__(self, parent=None):
@@ -80,66 +77,112 @@ class ChangePasswordDialog(objects.StyledDialog):
         return self.newPass1.text(), self.newPass2.text()
 
 
+class DepartmentsDialog(objects.StyledDialog):
+    """Rename, merge or delete departments; every change is previewed first."""
+    def __init__(self, conn, parent=None):
+        super().__init__(parent, title="Manage Departments")
+        self.conn = conn
+        self.resize(420, 480)
+
+        self.list = QListWidget()
+        self.list.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.main_layout.addWidget(QLabel("Select a department (several to merge):"))
+        self.main_layout.addWidget(self.list)
+
+        btn_layout = QHBoxLayout()
+        for label, slot in (("Rename", self.rename), ("Merge", self.merge), ("Delete", self.delete)):
+            btn = QPushButton(label)
+            btn.clicked.connect(slot)
+            btn_layout.addWidget(btn)
+        close = QPushButton("Close")
+        close.clicked.connect(self.accept)
+        btn_layout.addWidget(close)
+        self.main_layout.addLayout(btn_layout)
+
+        self.load()
+
+    def load(self):
+        self.list.clear()
+        for (name,) in datafetching.run_query(self.conn, "SELECT name FROM departments ORDER BY name"):
+            self.list.addItem(name)
+
+    def selected(self):
+        return [item.text() for item in self.list.selectedItems()]
+
+    def confirm(self, title, question, names):
+        counts = departments.preview(self.conn, names)
+        answer = QMessageBox.question(self, title, f"{question}\n\n{departments.format_preview(counts)}")
+        return answer == QMessageBox.StandardButton.Yes
+
+    def apply(self, title, operation, *args):
+        try:
+            operation(self.conn, *args)
+        except ValueError as e:
+            QMessageBox.warning(self, title, str(e))
+            return
+        except sqlite3.Error as e:
+            QMessageBox.critical(self, title, f"Failed:\n{e}")
+            return
+        self.load()
+
+    def rename(self):
+        names = self.selected()
+        if len(names) != 1:
+            QMessageBox.information(self, "Rename", "Select one department to rename.")
+            return
+        new, ok = QInputDialog.getText(self, "Rename Department", f"New name for '{names[0]}':", text=names[0])
+        if ok and new.strip() and new.strip() != names[0]:
+            if self.confirm("Rename", f"Rename '{names[0]}' to '{new.strip()}'?", names):
+                self.apply("Rename", departments.rename, names[0], new)
+
+    def merge(self):
+        names = self.selected()
+        if len(names) < 2:
+            QMessageBox.information(self, "Merge", "Select the departments to merge, including the one to keep.")
+            return
+        target, ok = QInputDialog.getItem(self, "Merge Departments", "Keep which department?", names, 0, False)
+        if not ok:
+            return
+        sources = [n for n in names if n != target]
+        if self.confirm("Merge", f"Merge {', '.join(sources)} into '{target}'?", sources):
+            self.apply("Merge", departments.merge, sources, target)
+
+    def delete(self):
+        names = self.selected()
+        if len(names) != 1:
+            QMessageBox.information(self, "Delete", "Select one department to delete.")
+            return
+        if self.confirm("Delete", f"Delete '{names[0]}' and remove it from all trainings?", names):
+            self.apply("Delete", departments.delete, names[0])
+
+
 class InfoPage(QWidget):
-    def __init__(self):
+    def __init__(self, conn=None):
         super().__init__()
-        self.conn = sqlite3.connect(db_path("hr_app.db"))
+        # Reuse the main window's connection when given
+        if conn is None:
+            conn = datafetching.connect(timeout=datafetching.GUI_BUSY_TIMEOUT)
+            datafetching.createtables(conn)
+        self.conn = conn
         self.cursor = self.conn.cursor()
         self.password = "admin123"  # fallback in case no password in DB
-        self.setStyleSheet(f"""
-            QWidget {{
-                background-color: rgba(3, 47, 48, 0.95);
-            }}
-            QLabel {{
-                color: white;
-                font-size: 14px;
-                font-weight: bold;
-            }}
-            QLineEdit {{
-                background-color: {objects.COLOR_DARK_GREEN};
-                color: white;
-                border: 1px solid {objects.COLOR_TEAL};
-                border-radius: 6px;
-                padding: 6px;
-            }}
-            QLineEdit:read-only {{
-                background-color: rgba(3, 47, 48, 0.7);
-                color: #aaa;
-            }}
-            QPushButton {{
-                background-color: {objects.COLOR_TEAL};
-                color: white;
-                font-weight: bold;
-                padding: 8px 16px;
-                border-radius: 8px;
-            }}
-            QPushButton:hover {{
-                background-color: {objects.COLOR_MINT};
-            }}
-            QPushButton:pressed {{
-                background-color: {objects.COLOR_SLATE};
-            }}
-            QScrollArea {{
-                border: none;
-            }}
-        """)
+        theme.mark_page(self, theme.PAGE_INFO)
         self.load_password_from_db()
         self.initUI()
 
     def load_password_from_db(self):
-        datafetching.createtables(self.conn)
         row = datafetching.run_query(self.conn, "SELECT value FROM settings WHERE key='password'", fetchone=True)
         if row:
             self.password = row[0]
         else:
-            datafetching.run_query(self.conn, "INSERT INTO settings (key, value) VALUES ('password', ?)", (self.password,), commit=True)
+            datafetching.set_setting(self.conn, "password", self.password)
 
     def initUI(self):
         layout = QVBoxLayout()
 
         # Header
         header = QLabel("Header")
-        header.setStyleSheet("font-size: 20px; font-weight: bold;")
+        header.setProperty("variant", "title")
         layout.addWidget(header)
 
         # Scrollable Info Section
@@ -152,6 +195,9 @@ class InfoPage(QWidget):
         self.company_name = QLineEdit()
         self.company_type = QLineEdit()
         self.departments = QLineEdit()
+        self.import_folder = QLineEdit()
+        self.import_folder.setReadOnly(True)
+        self.import_folder.setPlaceholderText("Off")
 
         # Load info from DB
         self.load_info()
@@ -164,6 +210,7 @@ class InfoPage(QWidget):
         self.form_layout.addRow("Company Name:", self.company_name)
         self.form_layout.addRow("Company Type:", self.company_type)
         self.form_layout.addRow("Departments:", self.departments)
+        self.form_layout.addRow("Auto-Import Folder:", self.import_folder)
 
         scroll_area.setWidget(scroll_content)
         layout.addWidget(scroll_area)
@@ -177,6 +224,27 @@ class InfoPage(QWidget):
         self.extra_button.clicked.connect(self.change_password)
         layout.addWidget(self.extra_button)
 
+        self.departments_button = QPushButton("Manage Departments")
+        self.departments_button.clicked.connect(self.manage_departments)
+        layout.addWidget(self.departments_button)
+
+        self.import_folder_button = QPushButton("Auto-Import Folder")
+        self.import_folder_button.clicked.connect(self.set_import_folder)
+        layout.addWidget(self.import_folder_button)
+
+        # Backups run on a worker thread; results come back through the relay
+        self.backup_job = None
+        self.backup_relay = objects.ThreadRelay(self)
+        self.backup_relay.done.connect(self.on_backup_job_done)
+
+        self.backup_button = QPushButton("Back Up Now")
+        self.backup_button.clicked.connect(self.backup_now)
+        layout.addWidget(self.backup_button)
+
+        self.restore_button = QPushButton("Restore Backup")
+        self.restore_button.clicked.connect(self.restore_backup)
+        layout.addWidget(self.restore_button)
+
         self.setLayout(layout)
 
     def set_fields_editable(self, editable):
@@ -184,15 +252,18 @@ class InfoPage(QWidget):
         self.company_type.setReadOnly(not editable)
 
     def load_info(self):
-        datafetching.createtables(self.conn)
         row = datafetching.run_query(self.conn, "SELECT name, type FROM company_info WHERE id=1", fetchone=True)
         departments = self.load_dept_info()
         if row:
             self.company_name.setText(row[0])
             self.company_type.setText(row[1])
             self.departments.setText(departments)
+            folder = datafetching.run_query(self.conn, "SELECT value FROM settings WHERE key=?", (FOLDER_SETTING,), fetchone=True)
+            self.import_folder.setText(folder[0] if folder else "")
         else:
-            datafetching.run_query(self.conn, "INSERT INTO company_info (id, name, type) VALUES (1, '', '')", commit=True)
+            datafetching.write_transaction(
+                self.conn, lambda conn: conn.execute("INSERT OR IGNORE INTO company_info (id, name, type) VALUES (1, '', '')")
+            )
 
     def load_dept_info(self):
         rows = datafetching.run_query(self.conn, "SELECT name FROM departments ORDER BY name")
@@ -219,7 +290,13 @@ class InfoPage(QWidget):
     def save_info(self):
         name = self.company_name.text()
         ctype = self.company_type.text()
-        datafetching.run_query(self.conn, "UPDATE company_info SET name=?, type=? WHERE id=1", (name, ctype), commit=True)
+        try:
+            datafetching.write_transaction(
+                self.conn, lambda conn: conn.execute("UPDATE company_info SET name=?, type=? WHERE id=1", (name, ctype))
+            )
+        except sqlite3.OperationalError as e:
+            QMessageBox.critical(self, "Database Busy", f"The database is in use by someone else, try again:\n{e}")
+            return
 
         self.set_fields_editable(False)
         self.edit_button.setText("Edit")
@@ -241,13 +318,102 @@ class InfoPage(QWidget):
         if dialog.exec():
             new_pass1, new_pass2 = dialog.getPasswords()
             if new_pass1 and new_pass2 and new_pass1 == new_pass2:
+                try:
+                    datafetching.set_setting(self.conn, "password", new_pass1)
+                except sqlite3.OperationalError as e:
+                    QMessageBox.critical(self, "Database Busy", f"The database is in use by someone else, try again:\n{e}")
+                    return
                 self.password = new_pass1
-                datafetching.run_query(self.conn, "UPDATE settings SET value=? WHERE key='password'", (new_pass1,), commit=True)
                 QMessageBox.information(self, "Success", "Password updated.")
             else:
                 QMessageBox.warning(self, "Error", "Passwords do not match.")
             
 
+    def manage_departments(self):
+        pdialog = PasswordDialog(self)
+        if not pdialog.exec():
+            return
+        if pdialog.getPassword() != self.password:
+            QMessageBox.warning(self, "Error", "Incorrect password")
+            return
+        DepartmentsDialog(self.conn, self).exec()
+        self.departments.setText(self.load_dept_info())
+
+    def set_import_folder(self):
+        """Choose (or turn off) the folder the app imports new spreadsheets from."""
+        pdialog = PasswordDialog(self)
+        if not pdialog.exec():
+            return
+        if pdialog.getPassword() != self.password:
+            QMessageBox.warning(self, "Error", "Incorrect password")
+            return
+
+        folder = QFileDialog.getExistingDirectory(self, "Auto-Import Folder", self.import_folder.text())
+        if not folder:
+            if not self.import_folder.text():
+                return
+            answer = QMessageBox.question(self, "Auto-Import", "Stop watching the current folder?")
+            if answer != QMessageBox.StandardButton.Yes:
+                return
+
+        try:
+            datafetching.set_setting(self.conn, FOLDER_SETTING, folder or None)
+        except sqlite3.OperationalError as e:
+            QMessageBox.critical(self, "Database Busy", f"The database is in use by someone else, try again:\n{e}")
+            return
+        self.import_folder.setText(folder)
+
+    def _start_backup_job(self, func, *args):
+        if self.backup_job is not None and self.backup_job.is_alive():
+            QMessageBox.information(self, "Backup", "A backup or restore is already running.")
+            return
+        self.backup_button.setEnabled(False)
+        self.restore_button.setEnabled(False)
+        self.backup_job = backup.BackupJob(func, *args, on_done=self.backup_relay.done.emit)
+        self.backup_job.start()
+
+    def backup_now(self):
+        self._start_backup_job(backup.create_backup, "manual")
+
+    def restore_backup(self):
+        pdialog = PasswordDialog(self)
+        if not pdialog.exec():
+            return
+        if pdialog.getPassword() != self.password:
+            QMessageBox.warning(self, "Error", "Incorrect password")
+            return
+
+        path, _ = QFileDialog.getOpenFileName(self, "Restore Backup", backup.backup_dir(), "Backups (*.db)")
+        if not path:
+            return
+        ok, message = backup.verify(path)
+        if not ok:
+            QMessageBox.critical(self, "Restore", f"This backup cannot be restored:\n{message}")
+            return
+        answer = QMessageBox.question(
+            self, "Restore",
+            f"Replace all current data with {os.path.basename(path)}?\n"
+            "A backup of the current data is made first."
+        )
+        if answer == QMessageBox.StandardButton.Yes:
+            self._start_backup_job(backup.restore, path)
+
+    def on_backup_job_done(self, outcome):
+        result, error = outcome
+        self.backup_button.setEnabled(True)
+        self.restore_button.setEnabled(True)
+        if error is not None:
+            QMessageBox.critical(self, "Backup", f"Failed:\n{error}")
+            return
+
+        if self.backup_job.func is backup.restore:
+            # Everything may have changed (backup.restore() tells the other pages)
+            self.load_password_from_db()
+            self.load_info()
+            QMessageBox.information(self, "Restore", f"Backup restored.\nPrevious data saved to:\n{result}")
+        else:
+            QMessageBox.information(self, "Backup", f"Backup saved to:\n{result}")
+
     def add_department(self):
         new_dept, ok = QInputDialog.getText(self, "Add Department", "Department name:")
         if ok and new_dept:
@@ -258,9 +424,12 @@ class InfoPage(QWidget):
 
             try:
                 # Insert into departments table
-                datafetching.run_query(self.conn, "INSERT INTO departments (name) VALUES (?)", (new_dept,), commit=True)
-            except sqlite3.IntegrityError:
-                QMessageBox.warning(self, "Error", f"Department '{new_dept}' already exists.")
+                departments.add(self.conn, new_dept)
+            except ValueError as e:
+                QMessageBox.warning(self, "Error", str(e))
+                return
+            except sqlite3.OperationalError as e:
+                QMessageBox.critical(self, "Database Busy", f"The database is in use by someone else, try again:\n{e}")
                 return
 
             # Update the line edit with the new list of departments
@@ -0,0 +1,344 @@
+# Read-only JSON API over the HR database for other internal tools.
+#
+#   python api.py [--db path] [--host 127.0.0.1] [--port 8765]
+# or set HR_APP_API_PORT=8765 to run it inside the desktop app.
+#
+# GET /employees?after=<id>&limit=<n>[&department=<name>]
+# GET /trainings?after=<id>&limit=<n>
+# GET /trainings/<id>/enrollments?after=<row id>&limit=<n>[&status=<status>]
+# GET /departments
+# GET /compliance                  status counts per training
+#
+# Lists are keyset-paginated: pass the returned "next_after" as ?after= to
+# get the next page. Every response carries an ETag derived from SQLite's
+# PRAGMA data_version, so a poller sending If-None-Match gets a bodiless 304
+# until something is committed.
+#
+# The API leaves the journal mode alone. With `python api.py --enable-wal`
+# the database is switched to WAL once (it is stored in the file), so the
+# API's readers never block the app's writes. Only do that for a database
+# on a local disk: WAL needs shared memory between the processes using the
+# file, which network filesystems do not provide, so every client sharing
+# a database on a network drive would be affected. enable_wal() refuses
+# databases it can tell are on one.
+import argparse
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import datafetching
+
+API_PORT_ENV = "HR_APP_API_PORT"
+
+DEFAULT_PORT = 8765
+POOL_SIZE = 4
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+# Rendered responses kept per (path, query) for the current data version
+CACHE_SIZE = 256
+
+
+# Filesystem types WAL does not work on (see /proc/mounts)
+NETWORK_FILESYSTEMS = {"nfs", "nfs4", "cifs", "smb3", "smbfs", "afs", "9p", "fuse.sshfs"}
+
+
+def on_network_drive(path):
+    """True when `path` is known to be on a network filesystem.
+
+    UNC paths and Windows network drives are detected, as are the usual
+    network mounts on Linux. Unknown cases count as local.
+    """
+    path = os.path.abspath(path)
+    if path.startswith(("\\\\", "//")):
+        return True
+    if sys.platform == "win32":
+        import ctypes
+        DRIVE_REMOTE = 4
+        return ctypes.windll.kernel32.GetDriveTypeW(os.path.splitdrive(path)[0] + "\\") == DRIVE_REMOTE
+    try:
+        with open("/proc/mounts") as mounts:
+            entries = [line.split()[1:3] for line in mounts]
+    except OSError:
+        return False
+    best, fstype = "", None
+    for mount_point, kind in entries:
+        mount_point = mount_point.replace("\\040", " ")
+        if (path == mount_point or path.startswith(mount_point.rstrip("/") + "/")) and len(mount_point) > len(best):
+            best, fstype = mount_point, kind
+    return fstype in NETWORK_FILESYSTEMS
+
+
+def enable_wal(database):
+    """Switch the database to WAL so readers never block the app's writes.
+
+    The mode is stored in the file, so this only needs doing once, and it
+    applies to every client of the database. Raises ValueError for a
+    database on a network drive, where WAL does not work.
+    """
+    if database != datafetching.MEMORY and on_network_drive(database):
+        raise ValueError(f"{database} is on a network drive; WAL only works on a local disk.")
+    conn = datafetching.connect(database)
+    try:
+        datafetching.createtables(conn)
+        conn.execute("PRAGMA journal_mode=WAL")
+    finally:
+        conn.close()
+
+
+class ReadOnlyPool:
+    """A fixed set of read-only connections shared by the request threads."""
+
+    def __init__(self, database, size=POOL_SIZE):
+        self._idle = queue.Queue()
+        for _ in range(size):
+            self._idle.put(self._open(database))
+        # data_version only moves when *other* connections commit, so one
+        # dedicated connection gives a version that is comparable across calls.
+        self._probe = self._open(database)
+        self._probe_lock = threading.Lock()
+
+    @staticmethod
+    def _open(database):
+        conn = datafetching.connect(database, read_only=True, check_same_thread=False)
+        conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        conn = self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def data_version(self):
+        with self._probe_lock:
+            return self._probe.execute("PRAGMA data_version").fetchone()[0]
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _int_param(params, name, default):
+    try:
+        return int(params.get(name, [default])[0])
+    except (TypeError, ValueError):
+        raise ApiError(400, f"'{name}' must be an integer")
+
+
+def _page(conn, sql, args, params, columns, key="id"):
+    """Run a keyset-paginated query: rows with integer `key` > ?after, in key order."""
+    after = _int_param(params, "after", None) if "after" in params else None
+    limit = max(1, min(_int_param(params, "limit", DEFAULT_LIMIT), MAX_LIMIT))
+    where = "WHERE" if " WHERE " not in sql else "AND"
+    if after is not None:
+        sql += f" {where} {key} > ?"
+        args = (*args, after)
+    sql += f" ORDER BY {key} LIMIT ?"
+    # One extra row tells us whether there is a next page
+    rows = conn.execute(sql, (*args, limit + 1)).fetchall()
+    items = [dict(zip(columns, row)) for row in rows[:limit]]
+    next_after = items[-1][key] if len(rows) > limit else None
+    return {"items": items, "next_after": next_after}
+
+
+def list_employees(conn, params):
+    sql = "SELECT id, company_id, name, job, department FROM employees"
+    args = ()
+    if "department" in params:
+        sql += " WHERE department = ?"
+        args = (params["department"][0],)
+    return _page(conn, sql, args, params, ["id", "company_id", "name", "job", "department"])
+
+
+def list_trainings(conn, params):
+    return _page(conn, "SELECT id, name, description, departments FROM trainings", (), params,
+                 ["id", "name", "description", "departments"])
+
+
+def list_departments(conn, params):
+    return {"items": [row[0] for row in conn.execute("SELECT name FROM departments ORDER BY name")]}
+
+
+def _training_table(conn, training_id):
+    row = conn.execute("SELECT name FROM trainings WHERE id=?", (training_id,)).fetchone()
+    if not row:
+        raise ApiError(404, f"No training with id {training_id}")
+    return datafetching.training_table(training_id, row[0])
+
+
+def list_enrollments(conn, params, training_id):
+    table_name = _training_table(conn, training_id)
+    sql = f'SELECT id, employee_id, employee_name, department, status FROM "{table_name}"'
+    args = ()
+    if "status" in params:
+        code = datafetching.status_code(params["status"][0])
+        if code is None:
+            raise ApiError(400, f"Unknown status {params['status'][0]!r}")
+        sql += " WHERE status = ?"
+        args = (code,)
+    try:
+        page = _page(conn, sql, args, params, ["id", "employee_id", "employee_name", "department", "status"])
+    except sqlite3.OperationalError:
+        return {"items": [], "next_after": None}  # roster table not created yet
+    for item in page["items"]:
+        item["status"] = datafetching.status_name(item["status"])
+    return page
+
+
+def compliance(conn, params):
+    items = []
+    for training_id, name in conn.execute("SELECT id, name FROM trainings ORDER BY id").fetchall():
+        table_name = datafetching.training_table(training_id, name)
+        try:
+            counts = {
+                datafetching.status_name(code): count
+                for code, count in conn.execute(f'SELECT status, COUNT(*) FROM "{table_name}" GROUP BY status')
+            }
+        except sqlite3.OperationalError:
+            counts = {}
+        items.append({"training_id": training_id, "name": name, "statuses": counts})
+    return {"items": items}
+
+
+def route(conn, path, params):
+    parts = [p for p in path.split("/") if p]
+    if parts == ["employees"]:
+        return list_employees(conn, params)
+    if parts == ["trainings"]:
+        return list_trainings(conn, params)
+    if parts == ["departments"]:
+        return list_departments(conn, params)
+    if parts == ["compliance"]:
+        return compliance(conn, params)
+    if len(parts) == 3 and parts[0] == "trainings" and parts[2] == "enrollments":
+        try:
+            training_id = int(parts[1])
+        except ValueError:
+            raise ApiError(404, "Training ids are integers")
+        return list_enrollments(conn, params, training_id)
+    raise ApiError(404, f"Unknown path {path}")
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    server_version = "HRAppAPI/1.0"
+
+    def do_GET(self):
+        server = self.server
+        url = urlsplit(self.path)
+        version = server.pool.data_version()
+        # data_version restarts with the connection, hence the per-server prefix
+        etag = f'"{server.instance}-{version}"'
+
+        if self.headers.get("If-None-Match") == etag:
+            self._send(304, None, etag)
+            return
+
+        cache_key = (url.path, url.query)
+        with server.cache_lock:
+            cached = server.cache.get(cache_key)
+            if cached and cached[0] == version:
+                server.cache.move_to_end(cache_key)
+            else:
+                cached = None
+        if cached:
+            self._send(200, cached[1], etag)
+            return
+
+        try:
+            with server.pool.connection() as conn:
+                body = json.dumps(route(conn, url.path, parse_qs(url.query))).encode("utf-8")
+        except ApiError as e:
+            self._send(e.status, json.dumps({"error": str(e)}).encode("utf-8"))
+            return
+        except sqlite3.Error as e:
+            self._send(500, json.dumps({"error": str(e)}).encode("utf-8"))
+            return
+
+        with server.cache_lock:
+            server.cache[cache_key] = (version, body)
+            server.cache.move_to_end(cache_key)
+            while len(server.cache) > CACHE_SIZE:
+                server.cache.popitem(last=False)
+        self._send(200, body, etag)
+
+    def _send(self, status, body, etag=None):
+        self.send_response(status)
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        if body is not None:
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body is not None:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # keep the app's console quiet; polling tools hit this a lot
+
+
+def make_server(database, host="127.0.0.1", port=DEFAULT_PORT, pool_size=POOL_SIZE):
+    # Read-only connections cannot create the schema themselves
+    conn = datafetching.connect(database)
+    try:
+        datafetching.createtables(conn)
+    finally:
+        conn.close()
+    server = ThreadingHTTPServer((host, port), ApiHandler)
+    server.daemon_threads = True
+    server.pool = ReadOnlyPool(database, pool_size)
+    server.cache = OrderedDict()
+    server.cache_lock = threading.Lock()
+    server.instance = uuid.uuid4().hex[:8]
+    return server
+
+
+def serve_in_thread(database, port, host="127.0.0.1"):
+    """Start the API on a daemon thread; call .shutdown() on the result to stop."""
+    server = make_server(database, host, port)
+    threading.Thread(target=server.serve_forever, name="api", daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the HR database as read-only JSON.")
+    parser.add_argument("--db", default=None, help="database file or :memory: (default: $HR_APP_DB or the app's database)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--enable-wal", action="store_true",
+                        help="switch the database to WAL first (local disks only; affects every client)")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        datafetching.configure_database(args.db)
+    if args.enable_wal:
+        try:
+            enable_wal(datafetching.database_location())
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 1
+    server = make_server(datafetching.database_location(), args.host, args.port)
+    print(f"Serving on http://{args.host}:{args.port} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+# archive.py
+#
+# Departed employees and retired trainings are moved, together with their
+# enrollment history, into a separate hr_app_archive.db next to the main
+# database. The hot tables stay small and the history stays queryable: the
+# archive is ATTACHed to the app's connection as schema "archive", e.g.
+#   SELECT * FROM archive.enrollments WHERE employee_id = ?
+import sqlite3
+from datetime import datetime
+
+import datafetching
+import events
+import migrations
+
+ARCHIVE_NAME = "hr_app_archive.db"
+SCHEMA = "archive"
+# The archive keeps status names, so it reads on its own without the lookup table
+STATUS_NAME = "(SELECT name FROM main.statuses WHERE code = status)"
+ENROLLMENT_COLUMNS = ("training_id, training_name, employee_id, employee_name, department, status, archived_at, "
+                      "completed_at, due_date")
+
+
+def archive_location():
+    """The archive file next to the database; an in-memory database gets an
+    in-memory archive so throwaway runs leave nothing behind."""
+    if datafetching.database_location() == datafetching.MEMORY:
+        return datafetching.MEMORY
+    return datafetching.db_path(ARCHIVE_NAME)
+
+
+def attach(conn):
+    """ATTACH the archive database to `conn` (once) and create its tables.
+
+    Raises sqlite3.ProgrammingError if `conn` has a transaction open, since
+    ATTACH is not allowed inside one; call it before write_transaction().
+    """
+    attached = {row[1] for row in conn.execute("PRAGMA database_list")}
+    if SCHEMA in attached:
+        return
+    if conn.in_transaction:
+        raise sqlite3.ProgrammingError("archive.attach() called with a transaction already open")
+    conn.execute(f"ATTACH DATABASE ? AS {SCHEMA}", (archive_location(),))
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {SCHEMA}.employees (
+            id INTEGER,
+            company_id TEXT,
+            name TEXT,
+            job TEXT,
+            department TEXT,
+            archived_at TEXT
+        )
+    """)
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {SCHEMA}.trainings (
+            id INTEGER,
+            name TEXT,
+            description TEXT,
+            departments TEXT,
+            archived_at TEXT
+        )
+    """)
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {SCHEMA}.enrollments (
+            training_id INTEGER,
+            training_name TEXT,
+            employee_id TEXT,
+            employee_name TEXT,
+            department TEXT,
+            status TEXT,
+            archived_at TEXT,
+            completed_at TEXT,
+            due_date TEXT
+        )
+    """)
+    # Archives written before completion dates existed
+    migrations.ensure_column(conn, "enrollments", "completed_at", "TEXT", schema=SCHEMA)
+    migrations.ensure_column(conn, "enrollments", "due_date", "TEXT", schema=SCHEMA)
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {SCHEMA}.idx_archive_enrollments_employee ON enrollments(employee_id)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {SCHEMA}.idx_archive_employees_company_id ON employees(company_id)")
+
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def _rosters(conn):
+    names = {t_id: name for t_id, name in conn.execute("SELECT id, name FROM trainings")}
+    return [(t_id, table_name, names[t_id]) for t_id, table_name in migrations.roster_tables(conn)]
+
+
+def archive_employee(conn, emp_id):
+    """Move one employee (employees.id) and all their enrollments to the archive.
+
+    Copies go in before the deletes and everything is one
+    write_transaction(). With a rollback journal that commit is atomic
+    across both files; in WAL mode SQLite only guarantees it per file, so a
+    crash at the wrong moment can at worst leave a copy in the archive,
+    never lose the history.
+    Returns the training ids whose rosters changed.
+    """
+    attach(conn)
+    stamp = _now()
+
+    def work(c):
+        touched = []
+        row = c.execute("SELECT company_id FROM employees WHERE id=?", (emp_id,)).fetchone()
+        if not row:
+            return touched
+        company_id = row[0]
+        c.execute(f"""
+            INSERT INTO {SCHEMA}.employees (id, company_id, name, job, department, archived_at)
+            SELECT id, company_id, name, job, department, ? FROM main.employees WHERE id=?
+        """, (stamp, emp_id))
+        for t_id, table_name, t_name in _rosters(c):
+            moved = c.execute(f"""
+                INSERT INTO {SCHEMA}.enrollments ({ENROLLMENT_COLUMNS})
+                SELECT ?, ?, employee_id, employee_name, department, {STATUS_NAME}, ?, completed_at, due_date
+                FROM main."{table_name}" WHERE employee_id=?
+            """, (t_id, t_name, stamp, company_id)).rowcount
+            if moved:
+                c.execute(f'DELETE FROM main."{table_name}" WHERE employee_id=?', (company_id,))
+                touched.append(t_id)
+                events.notify(events.ENROLLMENT, events.DELETE, None, t_id)
+        c.execute("DELETE FROM main.employees WHERE id=?", (emp_id,))
+        events.notify(events.EMPLOYEE, events.DELETE, [emp_id])
+        return touched
+
+    return datafetching.write_transaction(conn, work)
+
+
+def archive_training(conn, training_id):
+    """Move a training, its whole roster and the roster's history to the archive.
+
+    The roster table is dropped afterwards. Same transaction rules as
+    archive_employee(). Returns the number of enrollments moved.
+    """
+    attach(conn)
+    stamp = _now()
+
+    def work(c):
+        row = c.execute("SELECT name FROM trainings WHERE id=?", (training_id,)).fetchone()
+        if not row:
+            return 0
+        t_name = row[0]
+        table_name = datafetching.training_table(training_id, t_name)
+        c.execute(f"""
+            INSERT INTO {SCHEMA}.trainings (id, name, description, departments, archived_at)
+            SELECT id, name, description, departments, ? FROM main.trainings WHERE id=?
+        """, (stamp, training_id))
+        moved = 0
+        if (training_id, table_name) in migrations.roster_tables(c):
+            moved = c.execute(f"""
+                INSERT INTO {SCHEMA}.enrollments ({ENROLLMENT_COLUMNS})
+                SELECT ?, ?, employee_id, employee_name, department, {STATUS_NAME}, ?, completed_at, due_date
+                FROM main."{table_name}"
+            """, (training_id, t_name, stamp)).rowcount
+            c.execute(f'DROP TABLE main."{table_name}"')
+        c.execute("DELETE FROM main.trainings WHERE id=?", (training_id,))
+        events.notify(events.TRAINING, events.DELETE, [training_id])
+        return moved
+
+    return datafetching.write_transaction(conn, work)
+
+
+def delete_training(conn, training_id):
+    """Hard-delete a training and its roster table (no history is kept)."""
+    def work(c):
+        row = c.execute("SELECT name FROM trainings WHERE id=?", (training_id,)).fetchone()
+        if not row:
+            return
+        c.execute(f'DROP TABLE IF EXISTS "{datafetching.training_table(training_id, row[0])}"')
+        c.execute("DELETE FROM trainings WHERE id=?", (training_id,))
+        events.notify(events.TRAINING, events.DELETE, [training_id])
+
+    datafetching.write_transaction(conn, work)
+
+
+def employee_history(conn, company_id):
+    """Archived enrollments of one employee, oldest first:
+    [(training_name, status, archived_at, completed_at, due_date), ...]"""
+    attach(conn)
+    return datafetching.run_query(conn, f"""
+        SELECT training_name, status, archived_at, completed_at, due_date FROM {SCHEMA}.enrollments
+        WHERE employee_id = ? ORDER BY archived_at
+    """, (str(company_id),))
@@ -0,0 +1,261 @@
+# Watched-folder auto-import.
+#
+# Spreadsheets dropped into a folder (e.g. the nightly HRIS export) are run
+# through the normal employee/training import, each file exactly once. The
+# service is Qt-free: the GUI runs it on a worker thread, or it can run on its
+# own:
+#   python autoimport.py --folder \\server\hr\exports [--db path] [--once]
+import argparse
+import hashlib
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+import datafetching
+import importers
+
+# settings key holding the watched folder
+FOLDER_SETTING = "autoimport_folder"
+
+# Seconds between directory scans
+POLL_SECONDS = 5.0
+# A file must keep the same size and mtime this long before it is imported,
+# so half-copied exports are left alone.
+SETTLE_SECONDS = 10.0
+
+EMPLOYEES = "employees"
+TRAININGS = "trainings"
+
+
+def file_sha256(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FolderWatcher:
+    """Polls a folder and yields spreadsheets once they have stopped changing."""
+
+    def __init__(self, folder, settle_seconds=SETTLE_SECONDS):
+        self.folder = folder
+        self.settle_seconds = settle_seconds
+        self._pending = {}   # path -> ((size, mtime), first time seen with that stat)
+        self._done = {}      # path -> (size, mtime) already handed out
+
+    def poll(self, now=None):
+        """Return paths that are new or changed and have settled."""
+        now = time.monotonic() if now is None else now
+        ready = []
+        try:
+            paths = importers.excel_files(self.folder)
+        except OSError:
+            return ready  # share offline; try again next poll
+
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            stat = (st.st_size, st.st_mtime)
+            if self._done.get(path) == stat or st.st_size == 0:
+                continue
+            seen = self._pending.get(path)
+            if seen is None or seen[0] != stat:
+                self._pending[path] = (stat, now)  # still being written
+            elif now - seen[1] >= self.settle_seconds:
+                del self._pending[path]
+                self._done[path] = stat
+                ready.append(path)
+
+        # Forget files that were removed
+        for path in set(self._pending) - set(paths):
+            del self._pending[path]
+        return ready
+
+    def retry(self, path):
+        """Hand `path` out again on a later poll (e.g. it was still locked)."""
+        self._done.pop(path, None)
+
+
+def _record(conn, file_path, digest, kind, status, detail):
+    """Add the import_history row, inside the caller's transaction."""
+    conn.execute(
+        "INSERT OR IGNORE INTO import_history (file_name, sha256, kind, status, detail, imported_at) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        (os.path.basename(file_path), digest, kind, status, detail, datetime.now().isoformat(timespec="seconds"))
+    )
+
+
+def _read(file_path):
+    """(kind, frame): the sheet type is taken from its header row,
+    employee columns first, then training columns."""
+    try:
+        df = importers.read_employees(file_path, drop_incomplete=False)
+    except ValueError:
+        return TRAININGS, importers.read_trainings(file_path, drop_incomplete=False)
+    return EMPLOYEES, df
+
+
+def _import_employees(conn, df):
+    preview = importers.preview_employees(conn, df)
+    # Nobody is there to answer the dry-run dialog: take its defaults
+    importers.insert_departments(conn, preview["unknown_departments"])
+    return importers.upsert_employees(conn, importers.employee_rows(preview), update_existing=True, source="auto-import")
+
+
+def _import_trainings(conn, df):
+    preview = importers.preview_trainings(conn, df)
+    importers.insert_departments(conn, preview["unknown_departments"])
+    return importers.upsert_trainings(conn, importers.training_rows(preview), source="auto-import")
+
+
+def import_file(conn, file_path):
+    """Import one spreadsheet unless a file with the same content already was.
+
+    The sheet type is taken from its header row (employee columns first,
+    then training columns). Every file that is read ends up in
+    import_history, failed ones included, keyed on its SHA-256, so nothing
+    is processed twice: a successful import and its history row commit in
+    the same transaction. Returns an outcome dict (file, kind, status,
+    detail, result), or None when the file could not be opened yet and
+    should be retried.
+    """
+    try:
+        digest = file_sha256(file_path)
+    except OSError:
+        return None  # locked by the writer, try later
+
+    done = datafetching.run_query(conn, "SELECT status FROM import_history WHERE sha256=?", (digest,), fetchone=True)
+    if done:
+        return {"file": file_path, "kind": None, "status": "skipped",
+                "detail": f"same content already {done[0]}", "result": None}
+
+    kind, result = None, None
+    try:
+        kind, df = _read(file_path)
+        importer = _import_employees if kind == EMPLOYEES else _import_trainings
+
+        def work(conn):
+            result = importer(conn, df)
+            detail = (f"{len(result['added'])} added, {len(result['updated'])} updated, "
+                      f"{result['unchanged']} unchanged")
+            _record(conn, file_path, digest, kind, "imported", detail)
+            return result, detail
+
+        result, detail = datafetching.write_transaction(conn, work)
+        status = "imported"
+    except PermissionError:
+        return None
+    except Exception as e:
+        # The import (if it got that far) was rolled back; only the failure is recorded
+        status, detail = "failed", str(e)
+        datafetching.write_transaction(conn, lambda c: _record(c, file_path, digest, kind, status, detail))
+    return {"file": file_path, "kind": kind, "status": status, "detail": detail, "result": result}
+
+
+class AutoImportService:
+    """Watches `folder` on a daemon thread and imports settled files in order.
+
+    The thread opens its own connection to `database`. on_result(outcome)
+    is called from that thread after every file; GUI callers must hand it
+    over to the GUI thread (see main.HRApp).
+    """
+
+    def __init__(self, database, folder, on_result=None,
+                 poll_seconds=POLL_SECONDS, settle_seconds=SETTLE_SECONDS):
+        self.database = database
+        self.watcher = FolderWatcher(folder, settle_seconds)
+        self.on_result = on_result
+        self.poll_seconds = poll_seconds
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def folder(self):
+        return self.watcher.folder
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="autoimport", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def run_once(self, conn):
+        """One scan: import every settled file. Returns the outcomes."""
+        outcomes = []
+        for path in self.watcher.poll():
+            outcome = import_file(conn, path)
+            if outcome is None:
+                self.watcher.retry(path)
+                continue
+            outcomes.append(outcome)
+            if self.on_result is not None:
+                self.on_result(outcome)
+        return outcomes
+
+    def _run(self):
+        conn = datafetching.connect(self.database, timeout=30)
+        try:
+            datafetching.createtables(conn)
+            while not self._stop.is_set():
+                try:
+                    self.run_once(conn)
+                except Exception as e:
+                    print(f"Auto-import scan failed: {e}")
+                self._stop.wait(self.poll_seconds)
+        finally:
+            conn.close()
+
+
+def _print_outcome(outcome):
+    print(f"{os.path.basename(outcome['file'])}: {outcome['status']} ({outcome['detail']})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import spreadsheets dropped into a folder.")
+    parser.add_argument("--folder", help="folder to watch (default: the folder set in the app)")
+    parser.add_argument("--db", default=None, help="database file (default: $HR_APP_DB or the app's database)")
+    parser.add_argument("--once", action="store_true", help="import what is there now and exit")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        datafetching.configure_database(args.db)
+    database = datafetching.database_location()
+    conn = datafetching.connect(database, timeout=30)
+    try:
+        datafetching.createtables(conn)
+
+        folder = args.folder
+        if not folder:
+            row = datafetching.run_query(conn, "SELECT value FROM settings WHERE key=?", (FOLDER_SETTING,), fetchone=True)
+            folder = row[0] if row else None
+        if not folder:
+            parser.error("no folder given and none configured in the app")
+
+        # --once has no earlier scan to compare against, so skip the settle wait
+        service = AutoImportService(database, folder, _print_outcome,
+                                    settle_seconds=0 if args.once else SETTLE_SECONDS)
+        if args.once:
+            service.watcher.poll()  # first sighting
+            service.run_once(conn)
+            return 0
+
+        print(f"Watching {folder} (Ctrl+C to stop)")
+        while True:
+            service.run_once(conn)
+            time.sleep(service.poll_seconds)
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,205 @@
+# backup.py
+#
+# Online backups with SQLite's backup API. Pages are copied in small steps
+# from a connection of the job's own, so the app keeps working while a backup
+# runs. Backups are verified before they count, rotated, and can be restored
+# into the running database.
+#   python backup.py [--db path] create | list | verify FILE | restore FILE
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import datafetching
+import events
+import migrations
+
+# Folder next to the database that holds the backups
+BACKUP_DIR = "backups"
+PREFIX = "hr_app_"
+# Backups kept by rotation (newest first)
+KEEP = 10
+# Scheduled backups run at most this often
+INTERVAL = timedelta(hours=24)
+LAST_RUN_SETTING = "backup_last_run"
+
+# Pages copied per step, and the pause between steps that lets writers in
+PAGES_PER_STEP = 256
+STEP_SLEEP = 0.01
+
+
+def backup_dir():
+    path = datafetching.db_path(BACKUP_DIR)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def list_backups():
+    """Backup files, newest first."""
+    folder = backup_dir()
+    names = [n for n in os.listdir(folder) if n.startswith(PREFIX) and n.endswith(".db")]
+    return [os.path.join(folder, n) for n in sorted(names, reverse=True)]
+
+
+def verify(path):
+    """Return (ok, message) after an integrity check of a backup file."""
+    try:
+        conn = sqlite3.connect(Path(os.path.abspath(path)).as_uri() + "?mode=ro", uri=True)
+    except sqlite3.Error as e:
+        return False, str(e)
+    try:
+        problems = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+        if problems != ["ok"]:
+            return False, "; ".join(problems[:5])
+        has_core = conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE name IN ('employees', 'trainings')").fetchone()[0]
+        if has_core != 2:
+            return False, "not an HR app database"
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        return True, f"ok (schema v{version})"
+    except sqlite3.Error as e:
+        return False, str(e)
+    finally:
+        conn.close()
+
+
+def _copy(source, target, progress=None):
+    source.backup(target, pages=PAGES_PER_STEP, progress=progress, sleep=STEP_SLEEP)
+
+
+def create_backup(label="auto", database=None, progress=None):
+    """Copy the database into a new verified backup file and return its path.
+
+    The copy is written under a temporary name and only renamed into place
+    once it passes verify(), so a half-written backup never shows up in
+    list_backups(). progress(status, remaining, total) is called per step.
+    """
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    final = os.path.join(backup_dir(), f"{PREFIX}{stamp}_{label}.db")
+    partial = final + ".partial"
+
+    source = datafetching.connect(database, timeout=30)
+    target = sqlite3.connect(partial)
+    try:
+        _copy(source, target, progress)
+    finally:
+        target.close()
+        source.close()
+
+    ok, message = verify(partial)
+    if not ok:
+        os.remove(partial)
+        raise sqlite3.DatabaseError(f"Backup failed verification: {message}")
+    os.replace(partial, final)
+    return final
+
+
+def rotate(keep=KEEP):
+    """Delete all but the newest `keep` backups; returns the removed paths."""
+    removed = list_backups()[keep:]
+    for path in removed:
+        os.remove(path)
+    return removed
+
+
+def restore(path, database=None, progress=None):
+    """Replace the live database with a backup, keeping a safety copy first.
+
+    Runs on its own connection, so it can be called from a worker thread
+    while the app is open; other connections see the restored data on
+    their next query. Returns the path of the pre-restore safety backup.
+    """
+    ok, message = verify(path)
+    if not ok:
+        raise sqlite3.DatabaseError(f"Cannot restore {os.path.basename(path)}: {message}")
+
+    safety = create_backup("pre-restore", database)
+    source = sqlite3.connect(path)
+    target = datafetching.connect(database, timeout=30)
+    try:
+        _copy(source, target, progress)
+        # An older backup may predate some migrations
+        datafetching.createtables(target)
+        # Everything may have changed: open pages re-read it all
+        for entity in (events.EMPLOYEE, events.TRAINING, events.DEPARTMENT, events.SETTING):
+            events.notify(entity, events.UPDATE)
+        for t_id, _ in migrations.roster_tables(target):
+            events.notify(events.ENROLLMENT, events.UPDATE, training_id=t_id)
+    finally:
+        source.close()
+        target.close()
+    return safety
+
+
+def is_due(conn, interval=INTERVAL):
+    return datafetching.is_due(conn, LAST_RUN_SETTING, interval)
+
+
+def scheduled_backup(database=None):
+    """Back up, rotate and record the run. Returns (path, removed)."""
+    path = create_backup("auto", database)
+    removed = rotate()
+    conn = datafetching.connect(database, timeout=30)
+    try:
+        datafetching.set_setting(conn, LAST_RUN_SETTING, datetime.now().isoformat(timespec="seconds"))
+    finally:
+        conn.close()
+    return path, removed
+
+
+class BackupJob(threading.Thread):
+    """Runs `func(*args)` on a daemon thread and reports to on_done(result, error).
+
+    on_done is called from the worker thread; GUI callers relay it through
+    a Qt signal (objects.ThreadRelay).
+    """
+
+    def __init__(self, func, *args, on_done=None):
+        super().__init__(name="backup", daemon=True)
+        self.func = func
+        self.args = args
+        self.on_done = on_done
+
+    def run(self):
+        result, error = None, None
+        try:
+            result = self.func(*self.args)
+        except Exception as e:
+            error = e
+        if self.on_done is not None:
+            self.on_done((result, error))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Back up or restore the HR database.")
+    parser.add_argument("--db", default=None, help="database file (default: $HR_APP_DB or the app's database)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("create", help="make a verified backup and rotate old ones")
+    sub.add_parser("list", help="list backups, newest first")
+    sub.add_parser("verify", help="integrity-check a backup").add_argument("file")
+    sub.add_parser("restore", help="restore a backup into the database").add_argument("file")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        datafetching.configure_database(args.db)
+
+    if args.command == "create":
+        path, removed = scheduled_backup()
+        print(f"Backed up to {path}; removed {len(removed)} old backups")
+    elif args.command == "list":
+        for path in list_backups():
+            print(f"{os.path.basename(path)}  {os.path.getsize(path) / 1024:.0f} KB")
+    elif args.command == "verify":
+        ok, message = verify(args.file)
+        print(message)
+        return 0 if ok else 1
+    elif args.command == "restore":
+        safety = restore(args.file)
+        print(f"Restored {args.file}; previous data saved to {safety}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
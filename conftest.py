@@ -0,0 +1,38 @@
+# conftest.py
+#
+# pytest fixtures for tests and benchmarks. Each test gets its own copy of
+# a seeded database in the shared in-memory store, restored with the
+# backup API in milliseconds, so connect() anywhere in the code sees it:
+#   def test_import(hr_db): ...
+# HR_APP_SEED_DB=path/to/hr_app.db seeds from a real database instead of an
+# empty schema.
+import os
+import sqlite3
+
+import pytest
+
+import datafetching
+
+SEED_ENV = "HR_APP_SEED_DB"
+
+
+@pytest.fixture(scope="session")
+def seed_db():
+    """Private in-memory template: HR_APP_SEED_DB (if set), migrated to the current schema."""
+    template = sqlite3.connect(datafetching.MEMORY)
+    seed = os.environ.get(SEED_ENV)
+    if seed:
+        datafetching.clone_database(seed, template)
+    datafetching.createtables(template)
+    yield template
+    template.close()
+
+
+@pytest.fixture
+def hr_db(seed_db):
+    """Connection to a fresh copy of seed_db, which is also what connect() opens."""
+    datafetching.configure_database(datafetching.MEMORY)
+    conn = datafetching.clone_database(seed_db)
+    yield conn
+    conn.close()
+    datafetching.configure_database(None)
@@ -1,60 +1,327 @@
 import sys
 import sqlite3
 import os
+import getpass
+import json
+import hashlib
+import random
+import re
+import time
+from datetime import datetime
+from pathlib import Path
+
+import events
+import migrations
+
+BANNED_CHARS = r'[;"\'\\/]'
+
+# Enrollment statuses are stored as small integer codes; the statuses table
+# holds the names. Completed enrollments are closed, everything else is open
+# work (Pending) or retired (Not Required).
+PENDING = 1
+COMPLETED = 2
+NOT_REQUIRED = 3
+STATUSES = {PENDING: "Pending", COMPLETED: "Completed", NOT_REQUIRED: "Not Required"}
+# Spellings older versions wrote, folded into the canonical set
+STATUS_ALIASES = {"not started": PENDING, "not needed": NOT_REQUIRED}
+
+# Where the database lives, first match wins:
+#   configure_database() (the --db command line flag), HR_APP_DB, the per-user
+#   data folder. ":memory:" keeps everything in RAM (tests, benchmarks); a path
+#   under /dev/shm gives a tmpfs-backed file.
+DB_ENV = "HR_APP_DB"
+DB_NAME = "hr_app.db"
+MEMORY = ":memory:"
+# Named shared-cache database, so every connection in the process (pages,
+# worker threads, the API pool) sees the same in-memory data.
+MEMORY_URI = "file:hr_app_memdb?mode=memory&cache=shared"
+
+_database = None
+
+# Several people may share one database file (e.g. on a network drive).
+# Connections wait up to BUSY_TIMEOUT seconds for another writer's lock;
+# write_transaction() then retries WRITE_ATTEMPTS times, doubling the pause.
+# The GUI's connection waits only GUI_BUSY_TIMEOUT per attempt, so a held
+# lock costs the window at most about two seconds before "busy" is shown;
+# worker threads and command line tools keep the long wait.
+BUSY_TIMEOUT = 10
+GUI_BUSY_TIMEOUT = 0.5
+WRITE_ATTEMPTS = 3
+WRITE_BACKOFF = 0.1
+
+
+class ConflictError(Exception):
+    """A row was changed or deleted by someone else since it was read."""
+
+
+def configure_database(location):
+    """Use `location` (a path or ":memory:") for every later connect()."""
+    global _database
+    _database = location
+
+
+def data_dir():
+    """Per-user folder for app data: %APPDATA%\\HR_App on Windows, XDG data dir elsewhere."""
+    base = (
+        os.environ.get("APPDATA")
+        or os.environ.get("XDG_DATA_HOME")
+        or os.path.join(os.path.expanduser("~"), ".local", "share")
+    )
+    path = os.path.join(base, "HR_App")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def database_location():
+    return _database or os.environ.get(DB_ENV) or os.path.join(data_dir(), DB_NAME)
+
+
+def db_path(relative_path):
+    """Path of a file that lives next to the database (archives, backups)."""
+    location = database_location()
+    if location == MEMORY:
+        return os.path.join(data_dir(), relative_path)
+    folder = os.path.dirname(os.path.abspath(location))
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, relative_path)
+
+
+def connect(database=None, read_only=False, **kwargs):
+    """Open a connection to `database` (default: the configured database).
+
+    read_only connections use mode=ro (query_only for ":memory:"); extra
+    keyword arguments go to sqlite3.connect. The busy timeout defaults to
+    BUSY_TIMEOUT seconds.
+    """
+    kwargs.setdefault("timeout", BUSY_TIMEOUT)
+    location = database or database_location()
+    if location == MEMORY:
+        conn = sqlite3.connect(MEMORY_URI, uri=True, **kwargs)
+        if read_only:
+            conn.execute("PRAGMA query_only=ON")
+        return conn
+    if read_only:
+        uri = Path(os.path.abspath(location)).as_uri() + "?mode=ro"
+        return sqlite3.connect(uri, uri=True, **kwargs)
+    folder = os.path.dirname(os.path.abspath(location))
+    os.makedirs(folder, exist_ok=True)
+    return sqlite3.connect(location, **kwargs)
+
+
+def clone_database(source, target=None):
+    """Copy `source` (a path or connection) into `target` with the backup API.
+
+    target defaults to a connection to the shared in-memory database, so
+    with configure_database(MEMORY) every connect() in the process sees the
+    copy (for as long as the returned connection stays open). That makes
+    this a quick way to give each test or benchmark its own seeded
+    database; see the hr_db fixture in conftest.py. Returns the target
+    connection.
+    """
+    src = sqlite3.connect(source) if isinstance(source, str) else source
+    if target is None:
+        target = connect(MEMORY)
+    try:
+        src.backup(target)
+    finally:
+        if src is not source:
+            src.close()
+    return target
 
 
 def createtables(conn, extra_tables=None):
-    """Create all required tables if they don't exist.
-    extra_tables: list of table names to create dynamically (optional).
+    """Bring the schema up to date and create per-training tables.
+
+    The schema itself lives in migrations.py; once a database is current the
+    check is a single PRAGMA read. extra_tables: list of training table
+    names to create (optional).
     """
-    cursor = conn.cursor()
+    migrations.migrate(conn)
+    if extra_tables:
+        for table_name in extra_tables:
+            create_training_table(conn, table_name)
+        conn.commit()
 
-    # Core tables
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS company_info (
-            id INTEGER PRIMARY KEY,
-            name TEXT,
-            type TEXT
-        )
-    """)
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS departments (
+
+def create_training_table(conn, table_name):
+    """Create one training's roster table and its index (no commit, so it
+    can be part of a larger transaction)."""
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS "{table_name}" (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT UNIQUE
+            employee_id TEXT,
+            employee_name TEXT,
+            department TEXT,
+            status INTEGER NOT NULL DEFAULT {PENDING} REFERENCES statuses(code),
+            completed_at TEXT,
+            due_date TEXT,
+            updated_by TEXT,
+            row_version INTEGER NOT NULL DEFAULT 1
         )
     """)
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS employees (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            company_id TEXT,
-            name TEXT,
-            job TEXT,
-            department TEXT
+    create_roster_index(conn, table_name)
+    create_open_index(conn, table_name)
+    create_due_index(conn, table_name)
+    create_completion_trigger(conn, table_name)
+    create_event_triggers(conn, table_name)
+    create_version_trigger(conn, table_name)
+
+
+def create_roster_index(conn, table_name):
+    # Rosters are looked up and joined by employee far more than by row id
+    conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{table_name}_employee_id" ON "{table_name}"(employee_id)')
+
+
+def create_open_index(conn, table_name):
+    # Partial index over outstanding (Pending) enrollments only. Queries must
+    # spell the code as a literal (status = 1) for the planner to use it.
+    conn.execute(
+        f'CREATE INDEX IF NOT EXISTS "idx_{table_name}_open" ON "{table_name}"(employee_id) WHERE status = {PENDING}'
+    )
+
+
+def create_due_index(conn, table_name):
+    # Expiry sweeps and the due/overdue view are range scans on due_date
+    conn.execute(
+        f'CREATE INDEX IF NOT EXISTS "idx_{table_name}_due" ON "{table_name}"(due_date) WHERE due_date IS NOT NULL'
+    )
+
+
+def create_completion_trigger(conn, table_name):
+    """Stamp completed_at and the next due date whenever a row becomes Completed.
+
+    Done in the database so every writer (buttons, bulk updates, sheet
+    imports) gets it. due_date stays NULL for trainings without a
+    validity period.
+    """
+    training_id = roster_training_id(table_name)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS "trg_{table_name}_completed"
+        AFTER UPDATE OF status ON "{table_name}"
+        WHEN NEW.status = {COMPLETED} AND OLD.status IS NOT {COMPLETED}
+        BEGIN
+            UPDATE "{table_name}"
+            SET completed_at = date('now', 'localtime'),
+                due_date = (SELECT date('now', 'localtime', '+' || validity_months || ' months')
+                            FROM trainings WHERE id = {training_id} AND validity_months > 0)
+            WHERE id = NEW.id;
+        END
+    """)
+
+
+def create_version_trigger(conn, table_name):
+    """Move row_version on whenever a row changes without doing so itself.
+
+    update_versioned() bumps the version in its own UPDATE; every other
+    writer (imports, bulk status changes, department moves) gets it from
+    here, so optimistic checks notice their changes as well.
+    """
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS "trg_{table_name}_version"
+        AFTER UPDATE ON "{table_name}"
+        WHEN NEW.row_version = OLD.row_version
+        BEGIN
+            UPDATE "{table_name}" SET row_version = OLD.row_version + 1 WHERE id = NEW.id;
+        END
+    """)
+
+
+def content_hash(*values):
+    """Stable hash of a record's fields, used to spot unchanged import rows."""
+    text = "\x1f".join("" if v is None else str(v) for v in values)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def employee_hash(company_id, name, job, department):
+    return content_hash(company_id, name, job, department)
+
+
+def training_hash(name, description, departments):
+    # Names match case-insensitively, so the hash does too
+    return content_hash(name.lower(), description, departments)
+
+
+def sanitize_training_name(raw_name):
+    """
+    Returns a safe version of the training name for use in table names.
+    Raises ValueError if raw_name contains banned characters.
+    """
+    if re.search(BANNED_CHARS, raw_name):
+        raise ValueError(
+            f"Training name '{raw_name}' contains invalid characters.\n"
+            "Please remove ; \" ' \\ / and try again."
         )
+
+    # Replace spaces and other non-alphanumeric characters with underscores
+    safe_name = "".join(c if c.isalnum() else "_" for c in raw_name)
+    # Avoid empty table names
+    if not safe_name:
+        safe_name = "training"
+    return safe_name
+
+
+def training_table(training_id, training_name):
+    """Name of the per-training roster table for a training."""
+    safe_name = "".join(c if c.isalnum() else "_" for c in training_name)
+    return f"{safe_name}_{training_id}"
+
+
+def status_name(code):
+    """Display name of a status code."""
+    return STATUSES.get(code, str(code))
+
+
+def status_code(name):
+    """Code for a status name (case-insensitive, old spellings accepted), or None."""
+    key = str(name).strip().lower()
+    for code, canonical in STATUSES.items():
+        if canonical.lower() == key:
+            return code
+    return STATUS_ALIASES.get(key)
+
+
+def create_event_triggers(conn, table_name):
+    """Log every enrollment and status change of a roster to enrollment_events.
+
+    Triggers run inside the writing statement, so the log entry commits or
+    rolls back together with the change. Writers put who made the change
+    in the row's updated_by (see actor()).
+    """
+    training_id = roster_training_id(table_name)
+    columns = "training_id, row_id, employee_id, old_status, new_status, changed_at, changed_by"
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS "trg_{table_name}_log_insert"
+        AFTER INSERT ON "{table_name}"
+        BEGIN
+            INSERT INTO enrollment_events ({columns})
+            VALUES ({training_id}, NEW.id, NEW.employee_id, NULL, NEW.status,
+                    datetime('now', 'localtime'), NEW.updated_by);
+        END
     """)
-    cursor.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT)")
-    cursor.execute("""
-            CREATE TABLE IF NOT EXISTS company_info (
-                id INTEGER PRIMARY KEY,
-                name TEXT,
-                type TEXT
-            )
-        """)
-    
-    # Extra dynamic tables (like trainings)
-    if extra_tables:
-        for table_name in extra_tables:
-            cursor.execute(f"""
-                CREATE TABLE IF NOT EXISTS "{table_name}" (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    employee_id INTEGER,
-                    employee_name TEXT,
-                    department TEXT,
-                    status TEXT DEFAULT 'Pending'
-                )
-            """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS "trg_{table_name}_log_status"
+        AFTER UPDATE OF status ON "{table_name}"
+        WHEN NEW.status IS NOT OLD.status
+        BEGIN
+            INSERT INTO enrollment_events ({columns})
+            VALUES ({training_id}, NEW.id, NEW.employee_id, OLD.status, NEW.status,
+                    datetime('now', 'localtime'), NEW.updated_by);
+        END
+    """)
+
+
+def actor(source):
+    """Who a change is logged against: "<os user> (<source>)", e.g. "sam (import)"."""
+    try:
+        user = getpass.getuser()
+    except Exception:
+        user = "unknown"
+    return f"{user} ({source})"
+
 
-    conn.commit()
+def roster_training_id(table_name):
+    """Training id a roster table belongs to (the suffix training_table() adds)."""
+    return int(table_name.rsplit("_", 1)[1])
 
 
 def run_query(conn, query, params=None, fetchone=False, commit=False, return_id=False):
@@ -72,4 +339,161 @@ def run_query(conn, query, params=None, fetchone=False, commit=False, return_id=
 
     if fetchone:
         return cursor.fetchone()
-    return cursor.fetchall()
\ No newline at end of file
+    return cursor.fetchall()
+
+
+def _is_busy(error):
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+
+def write_transaction(conn, work, attempts=WRITE_ATTEMPTS):
+    """Run work(conn) in one BEGIN IMMEDIATE transaction and commit it.
+
+    IMMEDIATE takes the write lock before anything is read, so a busy
+    database is waited on up front (the connection's busy timeout) instead
+    of failing halfway when a read lock cannot be upgraded. If the lock is
+    still held after the timeout, the attempt is rolled back and retried
+    with exponential backoff; the last "database is locked" error is
+    raised. work must not commit; keep it to the writes so the lock is held
+    briefly. events.notify() calls made by work are published once the
+    transaction has committed. Returns what work returned.
+
+    Raises sqlite3.ProgrammingError if `conn` already has a transaction
+    open: committing someone else's half-done writes is not ours to do.
+    """
+    if conn.in_transaction:
+        raise sqlite3.ProgrammingError("write_transaction() called with a transaction already open")
+    delay = WRITE_BACKOFF
+    for attempt in range(1, attempts + 1):
+        try:
+            # Changes work() publishes go out after the commit, never for a rollback
+            with events.deferred():
+                conn.execute("BEGIN IMMEDIATE")
+                result = work(conn)
+                conn.commit()
+            return result
+        except sqlite3.OperationalError as e:
+            conn.rollback()
+            if attempt == attempts or not _is_busy(e):
+                raise
+        except BaseException:
+            conn.rollback()
+            raise
+        # Jitter keeps two clients that collided from retrying in lockstep
+        time.sleep(delay * random.uniform(0.5, 1.5))
+        delay *= 2
+
+
+# events entity of a versioned table; any other table is a training roster
+ROW_ENTITIES = {"employees": events.EMPLOYEE, "trainings": events.TRAINING}
+
+
+def update_versioned(conn, table_name, row_id, row_version, values):
+    """UPDATE row `row_id` with {column: value} only if it is still at `row_version`.
+
+    The check and the version bump are part of the same UPDATE. Raises
+    ConflictError when the row was changed or deleted since it was read;
+    otherwise returns its new row_version (read back, as triggers may move
+    it on further). Does not commit; publishes an UPDATE for the row.
+    """
+    assignments = ", ".join(f'"{column}"=?' for column in values)
+    cursor = conn.execute(
+        f'UPDATE "{table_name}" SET {assignments}, row_version = row_version + 1 WHERE id=? AND row_version=?',
+        (*values.values(), row_id, row_version)
+    )
+    if cursor.rowcount == 0:
+        raise ConflictError(f"Row {row_id} of {table_name} was changed by someone else.")
+    if table_name in ROW_ENTITIES:
+        events.notify(ROW_ENTITIES[table_name], events.UPDATE, [row_id])
+    else:
+        events.notify(events.ENROLLMENT, events.UPDATE, [row_id], roster_training_id(table_name))
+    return row_version_of(conn, table_name, row_id)
+
+
+def row_version_of(conn, table_name, row_id):
+    """Current row_version of one row, or None if it no longer exists."""
+    row = conn.execute(f'SELECT row_version FROM "{table_name}" WHERE id=?', (row_id,)).fetchone()
+    return row[0] if row else None
+
+
+def is_due(conn, setting, interval):
+    """True when the timestamp stored under settings[`setting`] is missing,
+    unreadable or more than `interval` (a timedelta) ago."""
+    row = run_query(conn, "SELECT value FROM settings WHERE key=?", (setting,), fetchone=True)
+    if not row:
+        return True
+    try:
+        return datetime.now() - datetime.fromisoformat(row[0]) >= interval
+    except ValueError:
+        return True
+
+
+def set_setting(conn, key, value):
+    """Store settings[`key`] = value (None removes the key) in one write_transaction()."""
+    def work(c):
+        if value is None:
+            c.execute("DELETE FROM settings WHERE key=?", (key,))
+        else:
+            c.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, value))
+        events.notify(events.SETTING, events.UPDATE, [key])
+    write_transaction(conn, work)
+
+
+def id_list(ids):
+    """Pack ids into one JSON parameter for `IN (SELECT value FROM json_each(?))`.
+
+    Keeps set-based statements to a single bound parameter however many
+    rows are selected.
+    """
+    return json.dumps(list(ids))
+
+
+# SQLite caps a compound SELECT at 500 terms by default
+UNION_CHUNK = 400
+
+
+def union_all(conn, arms, params=()):
+    """Run SELECT `arms` joined with UNION ALL and return all rows.
+
+    Statements hold at most UNION_CHUNK arms; use named parameters so the
+    same `params` fit every chunk.
+    """
+    rows = []
+    for start in range(0, len(arms), UNION_CHUNK):
+        rows.extend(conn.execute(" UNION ALL ".join(arms[start:start + UNION_CHUNK]), params).fetchall())
+    return rows
+
+
+def employee_transcript(conn, company_id):
+    """Every enrollment of one employee, by training name.
+
+    One UNION ALL over the rosters, each arm an index lookup on employee_id.
+    Returns [(training_id, training_name, status, completed_at, due_date)].
+    """
+    names = dict(conn.execute("SELECT id, name FROM trainings"))
+    arms = [
+        f'SELECT {t_id}, status, completed_at, due_date FROM "{table_name}" WHERE employee_id = :employee_id'
+        for t_id, table_name in migrations.roster_tables(conn)
+    ]
+    rows = union_all(conn, arms, {"employee_id": company_id})
+    return sorted(
+        ((t_id, names.get(t_id, ""), status, completed_at, due_date) for t_id, status, completed_at, due_date in rows),
+        key=lambda row: row[1].lower()
+    )
+
+
+def set_enrollment_status(conn, table_name, row_ids, status, source="app"):
+    """Set `status` (a status code) on many rows of one training table with a single UPDATE.
+
+    Runs in one write_transaction(); returns the number of rows that changed.
+    """
+    def work(c):
+        changed = [r[0] for r in c.execute(
+            f'UPDATE "{table_name}" SET status=?, updated_by=? '
+            f'WHERE id IN (SELECT value FROM json_each(?)) AND status IS NOT ? RETURNING id',
+            (status, actor(source), id_list(row_ids), status)
+        )]
+        events.notify(events.ENROLLMENT, events.UPDATE, changed, roster_training_id(table_name))
+        return len(changed)
+    return write_transaction(conn, work)
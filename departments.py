@@ -0,0 +1,211 @@
+# departments.py
+#
+# Adding, renaming, merging and deleting departments. A department name is
+# stored in employees.department, inside every trainings.departments list and
+# in the department column of every roster, so renames, merges and deletes
+# rewrite all of them in one transaction: one UPDATE for employees, one for
+# trainings and one per roster. preview() reports the row counts first. Names
+# match case-insensitively everywhere, like the rest of the department
+# handling.
+import json
+
+import datafetching
+import enrollments
+import events
+import migrations
+
+
+def _names_param(names):
+    """Lower-cased names as one JSON parameter, for lower(column) IN (...)."""
+    return datafetching.id_list(sorted({name.lower() for name in names}))
+
+
+def _split(departments):
+    return [d.strip() for d in (departments or "").split(",") if d.strip()]
+
+
+def _rewrite_list(departments, sources_json, target):
+    """SQL function: replace any of the source names in a "A, B" list with
+    target (dropping it when target is NULL), keeping order, no duplicates."""
+    sources = {s.lower() for s in json.loads(sources_json)}
+    result = []
+    for name in _split(departments):
+        if name.lower() in sources:
+            name = target
+        if name and name.lower() not in {r.lower() for r in result}:
+            result.append(name)
+    return ", ".join(result)
+
+
+def _lists_any(departments, sources_json):
+    """SQL function: does a "A, B" list mention any of the source names?"""
+    sources = {s.lower() for s in json.loads(sources_json)}
+    return any(name.lower() in sources for name in _split(departments))
+
+
+def _register_functions(conn):
+    # Python helpers usable inside the set-based statements below
+    conn.create_function("dept_rewrite", 3, _rewrite_list, deterministic=True)
+    conn.create_function("dept_lists_any", 2, _lists_any, deterministic=True)
+    conn.create_function("employee_hash", 4, datafetching.employee_hash, deterministic=True)
+    conn.create_function("training_hash", 3, datafetching.training_hash, deterministic=True)
+
+
+def _stored_name(conn, name):
+    row = conn.execute("SELECT name FROM departments WHERE lower(name) = lower(?)", (name.strip(),)).fetchone()
+    return row[0] if row else None
+
+
+def preview(conn, names):
+    """Rows that mention any of `names`: {"employees": n, "trainings": n, "enrollments": n}."""
+    _register_functions(conn)
+    param = _names_param(names)
+    employees = conn.execute(
+        "SELECT COUNT(*) FROM employees WHERE lower(department) IN (SELECT value FROM json_each(?))", (param,)
+    ).fetchone()[0]
+    trainings = conn.execute("SELECT COUNT(*) FROM trainings WHERE dept_lists_any(departments, ?)", (param,)).fetchone()[0]
+    arms = [
+        f'SELECT COUNT(*) FROM "{table_name}" WHERE lower(department) IN (SELECT value FROM json_each(:names))'
+        for _, table_name in migrations.roster_tables(conn)
+    ]
+    enrollments = sum(row[0] for row in datafetching.union_all(conn, arms, {"names": param}))
+    return {"employees": employees, "trainings": trainings, "enrollments": enrollments}
+
+
+def format_preview(counts):
+    return (f"{counts['employees']} employees, {counts['trainings']} trainings and "
+            f"{counts['enrollments']} enrollment records will be updated.")
+
+
+def _move(conn, sources, target):
+    """Point every reference to `sources` at `target` (None: drop from
+    training lists only). Runs inside the caller's transaction and
+    publishes what it changed."""
+    param = _names_param(sources)
+    result = {"employees": [], "trainings": [], "enrollments": {}}
+    if target is not None:
+        result["employees"] = [r[0] for r in conn.execute("""
+            UPDATE employees
+            SET department = ?, content_hash = employee_hash(company_id, name, job, ?)
+            WHERE lower(department) IN (SELECT value FROM json_each(?))
+            RETURNING id
+        """, (target, target, param))]
+    result["trainings"] = [r[0] for r in conn.execute("""
+        UPDATE trainings
+        SET departments = dept_rewrite(departments, :sources, :target),
+            content_hash = training_hash(name, description, dept_rewrite(departments, :sources, :target))
+        WHERE dept_lists_any(departments, :sources)
+        RETURNING id
+    """, {"sources": param, "target": target})]
+    if target is not None:
+        for t_id, table_name in migrations.roster_tables(conn):
+            changed = conn.execute(
+                f'UPDATE "{table_name}" SET department = ? WHERE lower(department) IN (SELECT value FROM json_each(?))',
+                (target, param)
+            ).rowcount
+            if changed:
+                result["enrollments"][t_id] = changed
+                events.notify(events.ENROLLMENT, events.UPDATE, None, t_id)
+    events.notify(events.DEPARTMENT, events.UPDATE)
+    events.notify(events.EMPLOYEE, events.UPDATE, result["employees"])
+    events.notify(events.TRAINING, events.UPDATE, result["trainings"])
+    return result
+
+
+def add(conn, name):
+    """Create department `name`; raises ValueError if it exists in any case."""
+    name = name.strip()
+    existing = _stored_name(conn, name)
+    if existing is not None:
+        raise ValueError(f"Department '{existing}' already exists.")
+
+    def work(c):
+        c.execute("INSERT INTO departments (name) VALUES (?)", (name,))
+        events.notify(events.DEPARTMENT, events.INSERT, [name])
+
+    datafetching.write_transaction(conn, work)
+
+
+def rename(conn, old, new):
+    """Rename department `old` to `new` everywhere. Returns what _move() changed."""
+    old_name = _stored_name(conn, old)
+    new = new.strip()
+    if old_name is None:
+        raise ValueError(f"No department named '{old}'.")
+    if not new:
+        raise ValueError("Department name cannot be empty.")
+    existing = _stored_name(conn, new)
+    if existing is not None and existing != old_name:
+        raise ValueError(f"Department '{existing}' already exists; merge into it instead.")
+
+    _register_functions(conn)
+
+    def work(c):
+        c.execute("UPDATE departments SET name=? WHERE name=?", (new, old_name))
+        return _move(c, [old_name], new)
+
+    return datafetching.write_transaction(conn, work)
+
+
+def merge(conn, sources, target):
+    """Fold `sources` into the existing department `target` and delete them.
+
+    Enrollments are recomputed with enrollments.fan_out() for everyone in
+    the merged department: missing enrollments in the trainings it now
+    requires are added, and the moved employees' retired (Not Required)
+    rows in those trainings are reopened, as for any department move.
+    Returns what changed, with enrollments counting both rewritten and
+    fanned-out roster rows.
+    """
+    target_name = _stored_name(conn, target)
+    if target_name is None:
+        raise ValueError(f"No department named '{target}'.")
+    source_names = [n for n in (_stored_name(conn, s) for s in sources) if n and n != target_name]
+    if not source_names:
+        raise ValueError("Choose at least one other department to merge.")
+
+    _register_functions(conn)
+    by = datafetching.actor("department merge")
+
+    def work(c):
+        # Stage everyone in the merged department with where they came from,
+        # before _move() rewrites it
+        c.execute("DROP TABLE IF EXISTS temp.employee_fanout")
+        c.execute("""
+            CREATE TEMP TABLE employee_fanout AS
+            SELECT company_id, name, ? AS department, department AS old_department, 0 AS is_new
+            FROM employees WHERE lower(department) IN (SELECT value FROM json_each(?))
+        """, (target_name, _names_param(source_names + [target_name])))
+
+        result = _move(c, source_names, target_name)
+        c.execute("DELETE FROM departments WHERE lower(name) IN (SELECT value FROM json_each(?))",
+                  (_names_param(source_names),))
+
+        # The merged department now requires the union of both training sets
+        for t_id, company_ids in enrollments.fan_out(c, by).items():
+            result["enrollments"][t_id] = result["enrollments"].get(t_id, 0) + len(company_ids)
+        c.execute("DROP TABLE temp.employee_fanout")
+        return result
+
+    return datafetching.write_transaction(conn, work)
+
+
+def delete(conn, name):
+    """Delete a department nobody works in and drop it from training lists.
+
+    Departments with employees must be merged into another one instead.
+    """
+    stored = _stored_name(conn, name)
+    if stored is None:
+        raise ValueError(f"No department named '{name}'.")
+    employees = conn.execute("SELECT COUNT(*) FROM employees WHERE lower(department) = lower(?)", (stored,)).fetchone()[0]
+    if employees:
+        raise ValueError(f"'{stored}' still has {employees} employees; merge it into another department instead.")
+
+    _register_functions(conn)
+
+    def work(c):
+        c.execute("DELETE FROM departments WHERE name=?", (stored,))
+        return _move(c, [stored], None)
+
+    return datafetching.write_transaction(conn, work)
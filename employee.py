@@ -1,16 +1,23 @@
 import sys
 import sqlite3
 import os
+import threading
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QPushButton, QTableWidgetItem, QHBoxLayout, QLineEdit, QLabel, QMessageBox, QDialog, QFormLayout,
-    QScrollArea, QDialogButtonBox, QComboBox, QToolButton, QMenu, QInputDialog, QFileDialog
+    QScrollArea, QDialogButtonBox, QComboBox, QToolButton, QMenu, QInputDialog, QFileDialog, QAbstractItemView
 )
 from PyQt6.QtGui import QIcon
 from PyQt6.QtCore import Qt, QSize
 import pandas as pd
 from datetime import datetime
 import objects
+import theme
 import datafetching
+import events
+import importers
+import enrollments
+import archive
+import profiling
 
 def resource_path(relative_path):
     """Get absolute path to resource, works for PyInstaller."""
@@ -21,82 +28,31 @@ def resource_path(relative_path):
         base_path = os.path.abspath(".")
     return os.path.join(base_path, relative_path)
 
-def db_path(relative_path):
-    appdata_path = os.path.join(os.environ["APPDATA"], "HR_App")
-    os.makedirs(appdata_path, exist_ok=True)
-
-    # Always use this path for the database
-    db_path = os.path.join(appdata_path, relative_path)
-    return db_path
-
-def handle_department(conn, dept, parent = None):
-    # Check if department exists
-    department = datafetching.run_query(
-        conn,
-        "SELECT name FROM departments WHERE name=?",
-        (dept,),
-        fetchone=True
-    )
-
-    if not department:
-        # Ask user if they want to add new dept
-        msg = QMessageBox()
-        msg.setWindowTitle("Department Missing")
-        msg.setText(f"Department '{dept}' was not found.")
-        msg.setInformativeText("Do you want to add it as a new department?")
-        msg.setStandardButtons(QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
-        msg.setDefaultButton(QMessageBox.StandardButton.No)
-
-        response = msg.exec()
-
-        if response == QMessageBox.StandardButton.Yes:
-            # Insert new department
-            datafetching.run_query(
-                conn,
-                "INSERT INTO departments (name) VALUES (?)",
-                (dept,),
-                commit=True
-            )
-            QMessageBox.information(parent, "Success", f"Department '{dept}' added.")
-            return dept
-        else:
-            # Show list of existing departments for selection
-            all_departments = datafetching.run_query(conn, "SELECT name FROM departments")
-            dept_names = [d[0] for d in all_departments]
-
-            selected, ok = QInputDialog.getItem(
-                None,
-                "Select Department",
-                "Choose from existing departments:",
-                dept_names,
-                0,
-                False
-            )
-
-            if ok and selected:
-                return selected
-            else:
-                return None  # user cancelled
-    else:
-        return dept
+def load_transcript(company_id, on_done):
+    """Worker-thread body: read one employee's transcript on a connection of
+    its own and hand (rows, error) to on_done."""
+    rows, error = None, None
+    try:
+        conn = datafetching.connect(read_only=True, timeout=30)
+        try:
+            rows = datafetching.employee_transcript(conn, company_id)
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        error = e
+    on_done((rows, error))
 
 class EmployeePage(QWidget):
-    def __init__(self):
+    def __init__(self, conn=None):
         super().__init__()
         self.setWindowTitle("HR Training Tracker")
-        self.setStyleSheet(f"""
-            QWidget {{
-                background: qlineargradient(
-                    x1:0, y1:0, x2:1, y2:1,
-                    stop:0 {objects.COLOR_DARK_GREEN}, stop:0.5 {objects.COLOR_TEAL}, stop:1 {objects.COLOR_MINT}
-                );
-                font-family: Segoe UI, Arial, sans-serif;
-            }}
-        """)
-
-        # Database setup
-        self.conn = sqlite3.connect(db_path("hr_app.db"))
-        self.create_tables()
+        theme.mark_page(self, theme.PAGE_GRADIENT)
+
+        # Database setup (reuse the main window's connection when given)
+        if conn is None:
+            conn = datafetching.connect(timeout=datafetching.GUI_BUSY_TIMEOUT)
+            datafetching.createtables(conn)
+        self.conn = conn
 
         # Layout
         self.main_layout = QVBoxLayout()
@@ -118,12 +74,22 @@ class EmployeePage(QWidget):
         self.import_btn.clicked.connect(self.import_employees_from_excel)
         btn_layout.addWidget(self.import_btn)
 
+        self.import_folder_btn = objects.StyledButton("Upload Folder")
+        self.import_folder_btn.setIcon(QIcon(resource_path("icons/upload.png")))
+        self.import_folder_btn.setIconSize(QSize(32, 32))
+        self.import_folder_btn.clicked.connect(self.import_employees_from_folder)
+        btn_layout.addWidget(self.import_folder_btn)
+
         self.export_btn = objects.StyledButton("Download Employees")
         self.export_btn.setIcon(QIcon(resource_path("icons/download.png")))
         self.export_btn.setIconSize(QSize(32, 32))
         self.export_btn.clicked.connect(self.export_employees_to_excel)
         btn_layout.addWidget(self.export_btn)
 
+        self.move_btn = objects.StyledButton("Move to Department")
+        self.move_btn.clicked.connect(self.move_selected_employees)
+        btn_layout.addWidget(self.move_btn)
+
         # === Scroll Area ===
         scroll_area = QScrollArea()
         scroll_area.setWidgetResizable(True)
@@ -134,8 +100,14 @@ class EmployeePage(QWidget):
 
         self.scroll_layout.addWidget(btn_frame)
 
-        # Table widget
+        # Table widget (select several rows with Ctrl/Shift-click)
         self.table = objects.Table()
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.table.setColumnCount(6)  # Extra column for the button
+        self.table.setHorizontalHeaderLabels(["ID", "Company ID", "Name", "Job", "Department", "Details"])
+        for col in range(self.table.columnCount()):
+            self.table.setColumnWidth(col, self.table.columnWidth(col)+25)
         self.scroll_layout.addWidget(self.table)
 
         scroll_area.setWidget(scroll_content)
@@ -156,39 +128,80 @@ class EmployeePage(QWidget):
         self.setLayout(self.main_layout)
         self.show_employees()
 
+        # Patch rows when employees change anywhere in the app
+        events.subscribe(events.EMPLOYEE, self._on_employee_change)
 
-    def create_tables(self):
-        datafetching.createtables(self.conn) 
 
+    @profiling.profiled("show_employees")
     def show_employees(self):
-        rows = datafetching.run_query(self.conn, "SELECT * FROM employees")
-
-        self.table.setRowCount(len(rows))
-        self.table.setColumnCount(6)  # Extra column for the button
-        self.table.setHorizontalHeaderLabels(["ID", "Company ID", "Name", "Job", "Department", "Details"])
+        """Sync the table with the employees table; only changed rows are touched."""
+        rows = datafetching.run_query(self.conn, "SELECT id, company_id, name, job, department FROM employees")
+        self.table.sync_rows(rows, self._fill_employee_row)
+        self._ensure_header_buttons()
+
+    def refresh_employees(self, emp_ids):
+        """Re-read just `emp_ids` and patch (or drop) their rows."""
+        rows = datafetching.run_query(
+            self.conn,
+            "SELECT id, company_id, name, job, department FROM employees WHERE id IN (SELECT value FROM json_each(?))",
+            (datafetching.id_list(emp_ids),)
+        )
+        self.table.sync_rows(rows, self._fill_employee_row, only_ids=emp_ids)
 
-        for col in range(self.table.columnCount()):
-            self.table.setColumnWidth(col, self.table.columnWidth(col)+25)
+    def _on_employee_change(self, change):
+        if change.ids is None:
+            self.show_employees()
+        else:
+            self.refresh_employees(change.ids)
 
-        # Fill the table
-        for i, row in enumerate(rows):
-            for j, val in enumerate(row):
-                self.table.setItem(i, j, QTableWidgetItem(str(val)))
+    def _fill_employee_row(self, i, row, is_new):
+        for j, val in enumerate(row):
+            self.table.setItem(i, j, QTableWidgetItem(str(val)))
 
-            # Add "..." button in last column
+        if is_new:
+            # Add "..." button in last column (kept across refreshes)
             btn = objects.TableStyledButton("...")
             btn.clicked.connect(lambda checked, emp_id=row[0]: self.show_employee_details(emp_id))
             self.table.setCellWidget(i, 5, btn)
 
-        # === Add down arrow buttons for headers (except Details) ===
+    @profiling.profiled("move_selected_employees")
+    def move_selected_employees(self):
+        """Move every selected employee to one department.
+
+        Their enrollments are recomputed together in one transaction: newly
+        required trainings are added, ones no longer required are retired.
+        """
+        emp_ids = [int(self.table.item(index.row(), 0).text()) for index in self.table.selectionModel().selectedRows()]
+        if not emp_ids:
+            QMessageBox.information(self, "No Selection", "Select one or more employees first.")
+            return
+        departments = [row[0] for row in datafetching.run_query(self.conn, "SELECT name FROM departments ORDER BY name")]
+        if not departments:
+            QMessageBox.warning(self, "Move Employees", "There are no departments yet.")
+            return
+        dept, ok = QInputDialog.getItem(self, "Move Employees", f"Move {len(emp_ids)} employees to:", departments, 0, False)
+        if not ok:
+            return
+
+        try:
+            result = enrollments.move_employees(self.conn, emp_ids, dept)
+        except sqlite3.Error as e:
+            QMessageBox.critical(self, "Move Employees", f"Failed to move employees:\n{e}")
+            return
+
+        QMessageBox.information(
+            self, "Move Employees",
+            f"Moved {len(result['moved'])} employees to {dept}; {len(result['enrollments'])} training rosters updated."
+        )
+
+    def _ensure_header_buttons(self):
+        """Add the down arrow buttons for headers (except Details) once."""
+        if getattr(self, "header_buttons", None):
+            return
+
         header = self.table.horizontalHeader()
         header.setSectionsClickable(True)
 
-        # Remove old buttons if they exist
-        if hasattr(self, "header_buttons"):
-            for b in self.header_buttons:
-                b.deleteLater()
-
         self.header_buttons = []
 
         # Create buttons for first 4 headers
@@ -248,19 +261,25 @@ class EmployeePage(QWidget):
 
     def show_employee_details(self, emp_id):
         """Open a dialog showing details of one employee with edit/delete options."""
-        employee = datafetching.run_query(self.conn, "SELECT * FROM employees WHERE id=?", (emp_id,), fetchone=True)
+        # The version is read with the values shown, so saving checks exactly what the form displays
+        employee = datafetching.run_query(
+            self.conn, "SELECT id, company_id, name, job, department, row_version FROM employees WHERE id=?",
+            (emp_id,), fetchone=True
+        )
 
         def loadDept():
                 cursor = self.conn.cursor()
                 cursor.execute("SELECT name FROM departments ORDER BY name")
                 for row in cursor.fetchall():
                     self.dept_edit.addItem(row[0])
-                index = self.dept_edit.findText(employee[3])
+                index = self.dept_edit.findText(employee[4])
                 if index >= 0:
                     self.dept_edit.setCurrentIndex(index)
 
         if employee:
             dialog = objects.StyledDialog(self, title="Employee Details")
+            # Saving checks this, so edits made meanwhile by someone else are not overwritten
+            self.employee_version = employee[5]
 
             # Fields
             form_layout = QFormLayout()
@@ -293,6 +312,35 @@ class EmployeePage(QWidget):
             form_layout.addRow("Department:", self.dept_label)
             form_layout.addRow("", self.dept_edit)
 
+            # === Transcript: every training of this employee, loaded off the GUI thread ===
+            transcript_label = QLabel("Loading trainings...")
+            dialog.main_layout.addWidget(transcript_label)
+            transcript = objects.Table()
+            transcript.setColumnCount(4)
+            transcript.setHorizontalHeaderLabels(["Training", "Status", "Completed", "Due"])
+            transcript.hide()
+            dialog.main_layout.addWidget(transcript)
+
+            def show_transcript(outcome):
+                rows, error = outcome
+                if error is not None:
+                    transcript_label.setText(f"Could not load trainings: {error}")
+                    return
+                transcript_label.setText(f"Trainings ({len(rows)}):" if rows else "Not enrolled in any training.")
+                transcript.setRowCount(len(rows))
+                for i, (t_id, t_name, status, completed_at, due_date) in enumerate(rows):
+                    for j, value in enumerate((t_name, datafetching.status_name(status), completed_at or "", due_date or "")):
+                        transcript.setItem(i, j, QTableWidgetItem(value))
+                transcript.setVisible(bool(rows))
+
+            # The relay lives as long as the dialog; the slot runs on the GUI thread
+            dialog.transcript_relay = objects.ThreadRelay()
+            dialog.transcript_relay.done.connect(show_transcript)
+            threading.Thread(
+                target=load_transcript, args=(employee[1], dialog.transcript_relay.done.emit),
+                name="transcript", daemon=True
+            ).start()
+
             # Buttons
             btn_layout = QHBoxLayout()
             self.btn_edit = QPushButton("Edit")
@@ -326,34 +374,33 @@ class EmployeePage(QWidget):
                     new_job = self.job_edit.text().strip()
                     new_dept = self.dept_edit.currentText().strip()
 
-                    # Update employee record
-                    datafetching.run_query(
-                        self.conn,
-                        """
-                        UPDATE employees
-                        SET company_id=?, name=?, job=?, department=?
-                        WHERE id=?
-                        """,
-                        (new_ID, new_name, new_job, new_dept, emp_id),
-                        commit=True
-                    )
-
-                    # === Update related training tables ===
-                    trainings = datafetching.run_query(self.conn, "SELECT id, name, departments FROM trainings")
-                    if trainings:
-                        for t_id, t_name, t_depts in trainings:
-                            # Clean training name so it can be used as a table name
-                            safe_name = "".join(c if c.isalnum() else "_" for c in t_name)
-                            table_name = f"{safe_name}_{t_id}"
-
-                            # If this training applies to the new department
-                            if new_dept in t_depts.split(","):
-                                exists = datafetching.run_query(self.conn, f"SELECT 1 FROM {table_name} WHERE employee_id=?", (emp_id,), fetchone=True)
-                                if not exists:
-                                    datafetching.run_query(self.conn, f"INSERT INTO {table_name} (employee_id, status) VALUES (?, ?)", params=(emp_id, "Not Started"), commit=True)
-                            else:
-                                # Mark as "Not Required" instead of deleting
-                                datafetching.run_query(self.conn, f"UPDATE {table_name} SET status=? WHERE employee_id=?", ("Not Required", emp_id), commit=True)
+                    # Rosters key on the company id, so read the current one off the label
+                    old_ID = self.company_id_label.text()
+                    old_dept = self.dept_label.text()
+
+                    # One short write transaction: the version check, the employee
+                    # record, id/name changes on the rosters and the department move
+                    def save(conn):
+                        datafetching.update_versioned(conn, "employees", emp_id, self.employee_version, {
+                            "company_id": new_ID, "name": new_name, "job": new_job,
+                            "content_hash": datafetching.employee_hash(new_ID, new_name, new_job, old_dept),
+                        })
+                        enrollments.rename_on_rosters(conn, old_ID, new_ID, new_name)
+                        if new_dept != old_dept:
+                            enrollments.stage_move(conn, [emp_id], new_dept, datafetching.actor("app"))
+                        return datafetching.row_version_of(conn, "employees", emp_id)
+
+                    try:
+                        self.employee_version = datafetching.write_transaction(self.conn, save)
+                    except datafetching.ConflictError:
+                        reload_after_conflict()
+                        return
+                    except sqlite3.IntegrityError:
+                        QMessageBox.warning(dialog, "Error", f"Another employee already has Company ID '{new_ID}'.")
+                        return
+                    except sqlite3.OperationalError as e:
+                        QMessageBox.critical(dialog, "Database Busy", f"The database is in use by someone else, try again:\n{e}")
+                        return
 
                     # Update UI labels
                     self.company_id_label.setText(new_ID)
@@ -370,41 +417,53 @@ class EmployeePage(QWidget):
                     self.name_edit.hide()
                     self.job_edit.hide()
                     self.dept_edit.hide()
-                    self.show_employees()
 
                     self.btn_edit.setText("Edit")
 
 
-            def delete_employee():
-                confirm = QMessageBox.question(
-                    dialog,
-                    "Confirm Delete",
-                    "Are you sure you want to delete this employee?",
-                    QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+            def reload_after_conflict():
+                """Someone else saved this employee first: show their values, keep editing."""
+                current = datafetching.run_query(
+                    self.conn, "SELECT company_id, name, job, department, row_version FROM employees WHERE id=?",
+                    (emp_id,), fetchone=True
+                )
+                if current is None:
+                    QMessageBox.warning(dialog, "Employee Removed", "This employee was removed by someone else.")
+                    self.refresh_employees([emp_id])
+                    dialog.reject()
+                    return
+                company_id, name, job, dept, self.employee_version = current
+                self.company_id_label.setText(company_id)
+                self.company_id_edit.setText(company_id)
+                self.name_label.setText(name)
+                self.name_edit.setText(name)
+                self.job_label.setText(job)
+                self.job_edit.setText(job)
+                self.dept_label.setText(dept)
+                self.dept_edit.setCurrentIndex(self.dept_edit.findText(dept))
+                self.refresh_employees([emp_id])
+                QMessageBox.warning(
+                    dialog, "Edit Conflict",
+                    "Someone else changed this employee while you were editing.\n"
+                    "Their changes are now shown; re-apply yours and save again."
                 )
-                if confirm == QMessageBox.StandardButton.Yes:
-                    # Check all training tables first
-                    trainings = datafetching.run_query(self.conn, "SELECT id, name FROM trainings")
-
-                    for t_id, t_name in trainings:
-                        safe_name = "".join(c if c.isalnum() else "_" for c in t_name)
-                        table_name = f"{safe_name}_{t_id}"
-
-                        try:
-                            record = datafetching.run_query(self.conn, f"SELECT status FROM \"{table_name}\" WHERE employee_id=?", (emp_id,), True)
-                            if record:
-                                current_status = record[0]
-                                if current_status != "Completed":
-                                    datafetching.run_query(self.conn, f"UPDATE \"{table_name}\" SET status=? WHERE employee_id=?", ("Not Required", emp_id), commit=True)
-                        except sqlite3.OperationalError as e:
-                            print(f"Skipping table {table_name}: {e}")
-
-
-                    # Now delete the employee
-                    datafetching.run_query(self.conn, "DELETE FROM employees WHERE id=?", (emp_id,), commit=True)
 
-                    self.show_employees()
-                    dialog.accept()  # close dialog
+            def delete_employee():
+                choice = objects.ask_archive_or_delete(dialog, "employee")
+                if choice is None:
+                    return
+                try:
+                    if choice == "archive":
+                        # Employee and enrollment history move to the archive database
+                        archive.archive_employee(self.conn, emp_id)
+                    else:
+                        # Open enrollments become "Not Required", completed ones stay
+                        enrollments.remove_employee(self.conn, emp_id)
+                except sqlite3.Error as e:
+                    QMessageBox.critical(dialog, "Delete Employee", f"Failed to remove employee:\n{e}")
+                    return
+
+                dialog.accept()  # close dialog
 
 
             self.btn_edit.clicked.connect(toggle_edit)
@@ -452,167 +511,109 @@ class EmployeePage(QWidget):
                 QMessageBox.warning(dialog, "Error", "All fields must be filled in.")
                 return
 
-            datafetching.run_query(self.conn, "INSERT INTO employees (company_id, name, job, department) VALUES (?, ?, ?, ?)", (id, name, job, dept), commit=True)
-
-            # Get the new employee's ID
-            emp_id = id
-
-            # Find all trainings that include this department
-            has_trainings = False
-            trainings = datafetching.run_query(self.conn, "SELECT id, name, departments FROM trainings")
-            if trainings:
-                has_trainings = True
-                for t_id, t_name, t_depts in trainings:
-                    if dept in (t_depts or ""):
-                        # Same sanitisation used for training table name
-                        safe_name = "".join(c if c.isalnum() else "_" for c in t_name)
-                        table_name = f"{safe_name}_{t_id}"
-
-                        datafetching.run_query(
-                            self.conn, 
-                            f"INSERT INTO {table_name} (employee_id, employee_name, department, status) VALUES (?, ?, ?, ?)", 
-                            (emp_id, name, dept, "Pending"),
-                            commit=True
-                            )
-
-            if has_trainings:
+            # Employee and their department's enrollments are saved together
+            try:
+                result = enrollments.add_employee(self.conn, id, name, job, dept)
+            except sqlite3.IntegrityError:
+                QMessageBox.warning(dialog, "Error", f"An employee with Company ID '{id}' already exists.")
+                return
+            except sqlite3.Error as e:
+                QMessageBox.critical(dialog, "Add Employee", f"Failed to add employee:\n{e}")
+                return
+
+            if result["enrollments"]:
                 print(f"Employees added to training tables")
             else:
                 print(f"No trainings found.")
 
             QMessageBox.information(dialog, "Success", "Employee added successfully.")
             dialog.accept()
-            self.show_employees()  # refresh table
 
         buttons.accepted.connect(save_employee)
         buttons.rejected.connect(dialog.reject)
 
         dialog.exec()
 
+    @profiling.profiled("import_employees_from_excel")
     def import_employees_from_excel(self):
-        """Import employees from an Excel file into the employees table.
-
-        - Detect header row in first 10 rows (case-insensitive).
-        - Require columns: Name, Job, Department.
-        - Add missing departments to DB automatically.
-        - Skip exact duplicates (same name, job, department).
-        - Add employee to any training tables that include their department.
-        """
-        file_path, _ = QFileDialog.getOpenFileName(
+        """Import employees from one or more Excel files into the employees table."""
+        file_paths, _ = QFileDialog.getOpenFileNames(
             self,
-            "Open Employee Excel File",
+            "Open Employee Excel Files",
             "",
             "Excel Files (*.xlsx *.xls)"
         )
 
-        if not file_path:
+        if not file_paths:
+            return  # User cancelled
+        self.import_employee_files(file_paths)
+
+    @profiling.profiled("import_employees_from_folder")
+    def import_employees_from_folder(self):
+        """Import every Excel file in a folder (one workbook per department)."""
+        folder = QFileDialog.getExistingDirectory(self, "Open Employee Folder")
+        if not folder:
             return  # User cancelled
 
+        file_paths = importers.excel_files(folder)
+        if not file_paths:
+            QMessageBox.warning(self, "No Files", f"No Excel files found in:\n{folder}")
+            return
+        self.import_employee_files(file_paths)
+
+    def import_employee_files(self, file_paths):
+        """Import employees from Excel files into the employees table.
+
+        - Several files are parsed in parallel and merged (later files win).
+        - Detect header row in first 10 rows (case-insensitive).
+        - Require columns: Company_ID, Name, Job, Department.
+        - Dry run first: the whole sheet is validated and diffed against the
+          database, and one summary dialog asks for confirmation.
+        - Employees are keyed on Company_ID: new ones are inserted and, in sync
+          mode, changed name/job/department values are updated in place.
+        - Only new or department-changed employees are added to / retired from
+          training tables.
+        - Everything is written by this one connection in a single transaction.
+        """
         try:
-            required = {"company_id", "name", "job", "department"}
-
-            # 1) Preview first 10 rows (no header) to find header row
-            preview = pd.read_excel(file_path, header=None, nrows=10)
-            header_row_index = None
-            for i, row in preview.iterrows():
-                row_vals = [str(v).strip().lower() for v in row.values if pd.notna(v)]
-                if required.issubset(set(row_vals)):
-                    header_row_index = i
-                    break
-
-            if header_row_index is None:
-                QMessageBox.warning(
-                    self,
-                    "Invalid File",
-                    "Could not find required header row (Company_ID, Name, Job, Department) in the first 10 rows."
-                )
+            # 1) Read the whole sheets; incomplete rows are reported, not dropped
+            df, file_errors = importers.read_many(importers.read_employees, file_paths)
+            if df is None:
+                details = "\n".join(f"{os.path.basename(p)}: {err}" for p, err in file_errors.items())
+                QMessageBox.warning(self, "Invalid File", details)
                 return
 
-            # 2) Re-read file with detected header row
-            df = pd.read_excel(file_path, header=header_row_index)
-
-            # 3) Map columns case-insensitively
-            col_map = {str(c).strip().lower(): c for c in df.columns}
-            missing = required - set(col_map.keys())
-            if missing:
-                QMessageBox.warning(
-                    self,
-                    "Invalid File",
-                    f"Missing required columns after header detection: {', '.join(missing)}"
-                )
+            # 2) Dry run: validate and diff against the database, confirm once
+            preview = importers.preview_employees(self.conn, df)
+            preview["file_errors"] = file_errors
+            unknown = preview["unknown_departments"]
+            options = [("update", "Update existing employees whose details changed", True)]
+            if unknown:
+                options.append(("add_departments",
+                                f"Add {len(unknown)} new departments (otherwise their employees are skipped)", True))
+            dialog = objects.ImportPreviewDialog(
+                importers.summarize(preview, "employees"), options, self, "Import Employees"
+            )
+            if not dialog.exec():
                 return
 
-            company_id_col = col_map["company_id"]
-            name_col = col_map["name"]
-            job_col = col_map["job"]
-            dept_col = col_map["department"]
-
-            added_count = 0
-
-            # 4) Process each data row
-            for _, row in df.iterrows():
-                # Safely read values
-                id = str(row[company_id_col]).strip() if pd.notna(row[company_id_col]) else ""
-                name = str(row[name_col]).strip() if pd.notna(row[name_col]) else ""
-                job = str(row[job_col]).strip() if pd.notna(row[job_col]) else ""
-                dept = str(row[dept_col]).strip() if pd.notna(row[dept_col]) else ""
-
-                if not id or not name or not job or not dept:
-                    # skip incomplete rows
-                    continue
-
-                # 5) Ensure department exists in departments table (create if missing)
-                dept_map = {} 
-                if dept in dept_map:
-                    dept = dept_map[dept]  # reuse previous choice
-                else:
-                    dept = handle_department(self.conn, dept, self)
-                    if not dept:
-                        return  # user cancelled
-                    dept_map[dept] = dept
-                
-                # 6) Check for duplicate employee (same name, job, department)
-                existing = datafetching.run_query(self.conn, "SELECT id FROM employees WHERE company_id=? AND name=? AND job=? AND department=?", (id, name, job, dept), fetchone=True)
-                if not existing:
-                    # Insert new employee
-                    datafetching.run_query(self.conn, "INSERT INTO employees (company_id, name, job, department) VALUES (?, ?, ?, ?)", (id, name, job, dept), commit=True)
-                    added_count += 1
-
-                # 7) Add / ensure in training tables where this department applies
-                trainings = datafetching.run_query(self.conn, "SELECT id, name, departments FROM trainings")
-                if trainings:
-                    for t_id, t_name, t_depts in trainings:
-                        # build normalized list of departments for this training
-                        dept_list = []
-                        if t_depts and isinstance(t_depts, str):
-                            dept_list = [d.strip().lower() for d in t_depts.split(",") if d.strip()]
-
-                        if dept.lower() in dept_list:
-                            # sanitize training name for table name
-                            safe_name = "".join(c if c.isalnum() else "_" for c in t_name)
-                            table_name = f"{safe_name}_{t_id}"
-
-                            # ensure training table exists and has the expected schema
-                            try:
-                                datafetching.createtables(self.conn, table_name)
-                            except sqlite3.Error as e:
-                                QMessageBox.critical(self, "Database Error", f"Could not create training table:\n{e}")
-                                return
-
-                            # avoid duplicate entry in training table
-                            excist = datafetching.run_query(self.conn, f'SELECT 1 FROM "{table_name}" WHERE employee_id=?', (id,), True)
-                            if not excist:
-                                datafetching.run_query(self.conn, f'INSERT INTO "{table_name}" (employee_id, employee_name, department, status) VALUES (?, ?, ?, ?)', commit=True)
-
-            # 8) Commit and show message
+            # 3) Write everything in one pass
+            add_departments = dialog.option("add_departments")
+            if add_departments:
+                importers.add_departments(self.conn, unknown)
+            result = importers.sync_employees(
+                self.conn,
+                importers.employee_rows(preview, add_departments),
+                update_existing=dialog.option("update")
+            )
+
             QMessageBox.information(
                 self,
                 "Import Successful",
-                f"Successfully imported {added_count} new employees."
+                f"Added {len(result['added'])} new employees, updated {len(result['updated'])}, "
+                f"{result['unchanged']} unchanged."
             )
 
-            self.show_employees()  # refresh table view
-
         except Exception as e:
             QMessageBox.critical(
                 self,
@@ -620,6 +621,7 @@ class EmployeePage(QWidget):
                 f"Failed to import employees:\n{e}"
             )
 
+    @profiling.profiled("export_employees_to_excel")
     def export_employees_to_excel(self):
         """Export employees table into a new Excel sheet with timestamp in name."""
         try:
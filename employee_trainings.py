@@ -2,14 +2,20 @@ import sys
 import sqlite3
 import os
 from PyQt6.QtWidgets import (
-    QWidget, QVBoxLayout, QTableWidgetItem, QMessageBox, QScrollArea, QToolButton, QMenu, QInputDialog, QFileDialog
+    QWidget, QVBoxLayout, QHBoxLayout, QTableWidgetItem, QMessageBox, QScrollArea, QToolButton, QMenu, QInputDialog,
+    QFileDialog, QAbstractItemView, QLabel, QPushButton
 )
 from PyQt6.QtCore import Qt, QSize
 from PyQt6.QtGui import QIcon
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, date, timedelta
 import objects
+import theme
 import datafetching
+import importers
+import events
+import enrollment_log
+import profiling
 
 def resource_path(relative_path):
     """Get absolute path to resource, works for PyInstaller."""
@@ -20,30 +26,16 @@ def resource_path(relative_path):
         base_path = os.path.abspath(".")
     return os.path.join(base_path, relative_path)
 
-def db_path(relative_path):
-    appdata_path = os.path.join(os.environ["APPDATA"], "HR_App")
-    os.makedirs(appdata_path, exist_ok=True)
-
-    # Always use this path for the database
-    db_path = os.path.join(appdata_path, relative_path)
-    return db_path
-
 class EmployeeTrainingPages(QWidget):
-    def __init__(self):
+    def __init__(self, conn=None):
         super().__init__()
         self.setWindowTitle("Employee Training Records")
-        self.setStyleSheet(f"""
-            QWidget {{
-                background: qlineargradient(
-                    x1:0, y1:0, x2:1, y2:1,
-                    stop:0 {objects.COLOR_DARK_GREEN}, stop:0.5 {objects.COLOR_TEAL}, stop:1 {objects.COLOR_MINT}
-                );
-                font-family: Segoe UI, Arial, sans-serif;
-            }}
-        """)
-
-        # Database setup
-        self.conn = sqlite3.connect(db_path("hr_app.db"))
+        theme.mark_page(self, theme.PAGE_GRADIENT)
+
+        # Database setup (reuse the caller's connection when given)
+        self.conn = conn if conn is not None else datafetching.connect(timeout=datafetching.GUI_BUSY_TIMEOUT)
+        self.table_name = None
+        self.training_id = None
 
         # Layout
         self.main_layout = QVBoxLayout()
@@ -58,8 +50,35 @@ class EmployeeTrainingPages(QWidget):
         scroll_content = QWidget()
         self.scroll_layout = QVBoxLayout(scroll_content)
 
-        # Table widget
+        # Bulk status buttons, applied to every selected row
+        btn_frame = objects.ButtonFrame()
+        btn_layout = QHBoxLayout(btn_frame)
+        btn_layout.setSpacing(15)
+        for status in (datafetching.COMPLETED, datafetching.PENDING, datafetching.NOT_REQUIRED):
+            btn = objects.StyledButton(f"Mark {datafetching.status_name(status)}")
+            btn.clicked.connect(lambda checked, s=status: self.set_selected_status(s))
+            btn_layout.addWidget(btn)
+
+        self.import_btn = objects.StyledButton("Upload Statuses")
+        self.import_btn.setIcon(QIcon(resource_path("icons/upload.png")))
+        self.import_btn.setIconSize(QSize(32, 32))
+        self.import_btn.clicked.connect(self.import_statuses_from_excel)
+        btn_layout.addWidget(self.import_btn)
+
+        self.history_btn = objects.StyledButton("History")
+        self.history_btn.clicked.connect(self.show_history)
+        btn_layout.addWidget(self.history_btn)
+        self.scroll_layout.addWidget(btn_frame)
+
+        # Table widget (select several rows with Ctrl/Shift-click)
         self.table = objects.Table()
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        # Add an extra column for the button
+        self.table.setColumnCount(6)
+        self.table.setHorizontalHeaderLabels(["ID", "Employee ID", "Name", "Department", "Status", "Action"])
+        for col in range(self.table.columnCount()):
+            self.table.setColumnWidth(col, self.table.columnWidth(col) + 35)
         self.scroll_layout.addWidget(self.table)
 
         scroll_area.setWidget(scroll_content)
@@ -72,51 +91,81 @@ class EmployeeTrainingPages(QWidget):
         self.main_layout.addWidget(self.export_btn, alignment=Qt.AlignmentFlag.AlignBottom | Qt.AlignmentFlag.AlignRight)
         self.setLayout(self.main_layout)
 
+        # Patch rows when this roster is written to anywhere in the app
+        events.subscribe(events.ENROLLMENT, self._on_enrollment_change)
+
+    @profiling.profiled("show_training_employees")
     def show_training_employees(self, training_id, training_name):
-        """Show all employees and their status for a given training."""
+        """Show all employees and their status for a given training.
+
+        Re-showing the same training only patches rows that changed.
+        """
         self.header.setText(training_name)
         # Safe table name
         safe_name = "".join(c if c.isalnum() else "_" for c in training_name)
-        self.table_name = f"{safe_name}_{training_id}"
+        table_name = f"{safe_name}_{training_id}"
+        if table_name != self.table_name:
+            # Different roster: none of the current rows apply
+            self.table.setRowCount(0)
+            self.table_name = table_name
+        self.training_id = training_id
 
-        # Join training table with employees to get employee names
         rows = datafetching.run_query(self.conn, f"""
-            SELECT id, employee_id, employee_name, department, status
+            SELECT id, employee_id, employee_name, department, status, row_version
             FROM "{self.table_name}"
         """ )
+        self.table.sync_rows(rows, self._fill_roster_row)
+        self._ensure_header_buttons()
 
-        # Add an extra column for the button
-        self.table.setRowCount(len(rows))
-        self.table.setColumnCount(6)
-        self.table.setHorizontalHeaderLabels(["ID", "Employee ID", "Name", "Department", "Status", "Action"])
-        
-        for col in range(self.table.columnCount()):
-            self.table.setColumnWidth(col, self.table.columnWidth(col) + 35)
+    def _on_enrollment_change(self, change):
+        if self.table_name is None or change.training_id != self.training_id:
+            return
 
-        for i, row in enumerate(rows):
-            db_id, emp_id, name, dept, status = row
+        query = f"SELECT id, employee_id, employee_name, department, status, row_version FROM \"{self.table_name}\""
+        if change.ids is None:
+            self.table.sync_rows(datafetching.run_query(self.conn, query), self._fill_roster_row)
+            return
 
-            # Fill normal columns
-            self.table.setItem(i, 0, QTableWidgetItem(str(db_id)))
-            self.table.setItem(i, 1, QTableWidgetItem(str(emp_id)))
-            self.table.setItem(i, 2, QTableWidgetItem(name))
-            self.table.setItem(i, 3, QTableWidgetItem(dept))
-            self.table.setItem(i, 4, QTableWidgetItem(status))
+        column = events.BY_EMPLOYEE if change.key == events.BY_EMPLOYEE else events.BY_ROW
+        rows = datafetching.run_query(
+            self.conn, f"{query} WHERE {column} IN (SELECT value FROM json_each(?))", (datafetching.id_list(change.ids),)
+        )
+        only_ids = change.ids if column == events.BY_ROW else [row[0] for row in rows]
+        self.table.sync_rows(rows, self._fill_roster_row, only_ids=only_ids)
 
+    def refresh_rows(self, row_ids):
+        """Re-read just `row_ids` of the shown roster and patch their rows."""
+        rows = datafetching.run_query(self.conn, f"""
+            SELECT id, employee_id, employee_name, department, status, row_version
+            FROM "{self.table_name}" WHERE id IN (SELECT value FROM json_each(?))
+        """, (datafetching.id_list(row_ids),))
+        self.table.sync_rows(rows, self._fill_roster_row, only_ids=row_ids)
+
+    def _fill_roster_row(self, i, row, is_new):
+        # row_version stays in the row values kept on column 0 (see objects.Table.sync_rows)
+        db_id, emp_id, name, dept, status, _ = row
+
+        # Fill normal columns
+        self.table.setItem(i, 0, QTableWidgetItem(str(db_id)))
+        self.table.setItem(i, 1, QTableWidgetItem(str(emp_id)))
+        self.table.setItem(i, 2, QTableWidgetItem(name))
+        self.table.setItem(i, 3, QTableWidgetItem(dept))
+        self.table.setItem(i, 4, QTableWidgetItem(datafetching.status_name(status)))
+
+        if is_new:
             # Add action button
             btn = objects.TableStyledButton("Toggle")
-            btn.clicked.connect(lambda checked, emp_db_id=db_id, row_index=i: self.toggle_training_status(emp_db_id, row_index))
+            btn.clicked.connect(lambda checked, emp_db_id=db_id: self.toggle_training_status(emp_db_id))
             self.table.setCellWidget(i, 5, btn)
 
-        # === Add down arrow buttons for headers ===
+    def _ensure_header_buttons(self):
+        """Add the down arrow buttons for headers once."""
+        if getattr(self, "header_buttons", None):
+            return
+
         header = self.table.horizontalHeader()
         header.setSectionsClickable(True)
 
-        # Remove old buttons if they exist
-        if hasattr(self, "header_buttons"):
-            for b in self.header_buttons:
-                b.deleteLater()
-
         self.header_buttons = []
 
         for col in range(5):  # now includes Action column
@@ -165,6 +214,7 @@ class EmployeeTrainingPages(QWidget):
                 match = text.lower() in item.text().lower()
                 self.table.setRowHidden(row, not match)
 
+    @profiling.profiled("export_training_employees_to_excel")
     def export_training_employees_to_excel(self):
         """Export all trainings to an Excel file."""
         file_path, _ = QFileDialog.getSaveFileName(
@@ -185,6 +235,7 @@ class EmployeeTrainingPages(QWidget):
                 return
 
             df = pd.DataFrame(rows, columns=["ID","Employee ID", "Name", "Departments", "Status"])
+            df["Status"] = df["Status"].map(datafetching.status_name)
 
             with pd.ExcelWriter(file_path, engine="openpyxl") as writer:
                 df.to_excel(writer, sheet_name="Trainings", index=False, startrow=2)
@@ -196,13 +247,120 @@ class EmployeeTrainingPages(QWidget):
         except Exception as e:
             QMessageBox.critical(self, "Export Error", f"Failed to export trainings:\n{e}") 
 
-    def toggle_training_status(self, emp_db_id, row_index):
-        """Toggle training status (0=Pending, 1=Completed) for a single employee."""
-        status = datafetching.run_query(self.conn, f"SELECT status FROM {self.table_name} WHERE id=?", (emp_db_id,), fetchone=True)
-        current_status = status[0]
+    @profiling.profiled("toggle_training_status")
+    def toggle_training_status(self, emp_db_id):
+        """Toggle training status (Pending <-> Completed) for a single employee.
+
+        Toggles the status shown, and only if the row still has the version
+        shown; a change someone else made meanwhile is reported, not overwritten.
+        """
+        pos = self.table.row_for_id(emp_db_id)
+        if pos < 0:
+            return
+        *_, current_status, version = self.table.item(pos, 0).data(Qt.ItemDataRole.UserRole)
 
-        new_status = "Pending"if current_status == "Completed" else "Completed"
-        datafetching.run_query(self.conn, f"UPDATE {self.table_name} SET status=? WHERE id=?", (new_status, emp_db_id), commit=True)
+        new_status = datafetching.PENDING if current_status == datafetching.COMPLETED else datafetching.COMPLETED
+        try:
+            datafetching.write_transaction(self.conn, lambda conn: datafetching.update_versioned(
+                conn, self.table_name, emp_db_id, version, {"status": new_status, "updated_by": datafetching.actor("app")}
+            ))
+        except datafetching.ConflictError:
+            self.refresh_rows([emp_db_id])
+            QMessageBox.warning(
+                self, "Edit Conflict",
+                "Someone else changed this enrollment in the meantime. The row now shows the current status."
+            )
+        except sqlite3.OperationalError as e:
+            QMessageBox.critical(self, "Database Busy", f"The database is in use by someone else, try again:\n{e}")
+
+    @profiling.profiled("set_selected_status")
+    def set_selected_status(self, status):
+        """Give every selected employee `status` (a code) in one UPDATE and one commit."""
+        if self.table_name is None:
+            return
+        row_ids = [self.table.item(index.row(), 0).text() for index in self.table.selectionModel().selectedRows()]
+        if not row_ids:
+            QMessageBox.information(self, "No Selection", "Select one or more employees first.")
+            return
+
+        try:
+            datafetching.set_enrollment_status(self.conn, self.table_name, row_ids, status)
+        except sqlite3.OperationalError as e:
+            QMessageBox.critical(self, "Database Busy", f"The database is in use by someone else, try again:\n{e}")
+
+    @profiling.profiled("show_history")
+    def show_history(self):
+        """Who changed what on this roster and when, newest first, with the 30-day completion count."""
+        if self.training_id is None:
+            return
+        try:
+            changes = enrollment_log.history(self.conn, training_id=self.training_id)
+            start = (date.today() - timedelta(days=enrollment_log.REPORT_DAYS)).isoformat()
+            completed = sum(n for _, n in enrollment_log.completions(self.conn, start, date.today().isoformat(), self.training_id))
+        except sqlite3.Error as e:
+            QMessageBox.critical(self, "History", f"Failed to load history:\n{e}")
+            return
+
+        dialog = objects.StyledDialog(self, f"History - {self.header.text()}")
+        dialog.resize(800, 500)
+        dialog.main_layout.addWidget(QLabel(
+            f"{completed} completions in the last {enrollment_log.REPORT_DAYS} days. "
+            f"Showing the latest {len(changes)} changes."
+        ))
+        columns = [("changed_at", "When"), ("employee_id", "Employee ID"), ("old_status", "From"),
+                   ("new_status", "To"), ("changed_by", "By")]
+        table = objects.Table()
+        table.setColumnCount(len(columns))
+        table.setHorizontalHeaderLabels([label for _, label in columns])
+        table.setRowCount(len(changes))
+        for i, change in enumerate(changes):
+            for j, (key, _) in enumerate(columns):
+                table.setItem(i, j, QTableWidgetItem(str(change[key])))
+        dialog.main_layout.addWidget(table)
+
+        close = QPushButton("Close")
+        close.clicked.connect(dialog.accept)
+        dialog.main_layout.addWidget(close)
+        dialog.exec()
+
+    @profiling.profiled("import_statuses_from_excel")
+    def import_statuses_from_excel(self):
+        """Apply a trainer's attendance sheet (Company_ID/Employee ID + Status) to this roster.
+
+        - Rows are matched on the employee's company id.
+        - All changes are applied with one staged UPDATE in a single transaction.
+        - Unmatched ids and unknown statuses are reported, not applied.
+        """
+        if self.table_name is None:
+            return
+
+        file_path, _ = QFileDialog.getOpenFileName(
+            self,
+            "Open Attendance Excel File",
+            "",
+            "Excel Files (*.xlsx *.xls)"
+        )
+        if not file_path:
+            return
+
+        try:
+            rows, invalid = importers.read_roster_statuses(file_path)
+        except ValueError as e:
+            QMessageBox.warning(self, "Invalid File", str(e))
+            return
+        except Exception as e:
+            QMessageBox.critical(self, "Import Error", f"Failed to read statuses:\n{e}")
+            return
+
+        try:
+            updated, matched, unmatched = importers.apply_roster_statuses(self.conn, self.table_name, rows)
+        except sqlite3.Error as e:
+            QMessageBox.critical(self, "Import Error", f"Failed to import statuses:\n{e}")
+            return
 
-        # Update UI immediately
-        self.table.setItem(row_index, 4, QTableWidgetItem(new_status))
+        message = f"Updated {updated} of {len(matched)} matched employees."
+        if unmatched:
+            message += f"\n\n{len(unmatched)} not on this roster:\n" + ", ".join(unmatched[:50])
+        if invalid:
+            message += f"\n\n{len(invalid)} with an unknown status:\n" + ", ".join(invalid[:50])
+        QMessageBox.information(self, "Import Complete", message)
@@ -0,0 +1,104 @@
+# enrollment_log.py
+#
+# Reading the enrollment event log. Every enrollment and status change is
+# appended to enrollment_events by triggers on the rosters (see
+# datafetching.create_event_triggers); a trigger on the log keeps the
+# enrollment_daily rollup current. Trend reports read the rollup, history
+# views read the log through its (training, time) / (employee, time) indexes.
+#   python enrollment_log.py [--db path] [--from DATE] [--to DATE] [--training ID]
+import argparse
+import sys
+from datetime import date, timedelta
+
+import datafetching
+
+# Rows returned by history() unless asked for more
+HISTORY_LIMIT = 500
+# Default report window
+REPORT_DAYS = 30
+
+
+def history(conn, training_id=None, employee_id=None, limit=HISTORY_LIMIT):
+    """Latest changes first, for one training and/or one employee.
+
+    Returns dicts with changed_at, training_id, employee_id, old/new status
+    names and changed_by.
+    """
+    where, args = [], []
+    if training_id is not None:
+        where.append("training_id = ?")
+        args.append(training_id)
+    if employee_id is not None:
+        where.append("employee_id = ?")
+        args.append(str(employee_id))
+    sql = "SELECT changed_at, training_id, employee_id, old_status, new_status, changed_by FROM enrollment_events"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY changed_at DESC, id DESC LIMIT ?"
+    return [
+        {
+            "changed_at": changed_at,
+            "training_id": t_id,
+            "employee_id": emp_id,
+            "old_status": "" if old is None else datafetching.status_name(old),
+            "new_status": datafetching.status_name(new),
+            "changed_by": changed_by or "",
+        }
+        for changed_at, t_id, emp_id, old, new, changed_by in conn.execute(sql, (*args, limit))
+    ]
+
+
+def daily_changes(conn, start, end, training_id=None):
+    """{day: {status name: changes}} for start..end (ISO dates, inclusive).
+
+    Reads the daily rollup with a range scan on its primary key, so the cost
+    follows the number of days, not the number of events.
+    """
+    sql = "SELECT day, status, SUM(changes) FROM enrollment_daily WHERE day BETWEEN ? AND ?"
+    args = [start, end]
+    if training_id is not None:
+        sql += " AND training_id = ?"
+        args.append(training_id)
+    sql += " GROUP BY day, status ORDER BY day"
+    result = {}
+    for day, status, changes in conn.execute(sql, args):
+        result.setdefault(day, {})[datafetching.status_name(status)] = changes
+    return result
+
+
+def completions(conn, start, end, training_id=None):
+    """[(day, completions)] for start..end, days without completions left out."""
+    sql = f"SELECT day, SUM(changes) FROM enrollment_daily WHERE day BETWEEN ? AND ? AND status = {datafetching.COMPLETED}"
+    args = [start, end]
+    if training_id is not None:
+        sql += " AND training_id = ?"
+        args.append(training_id)
+    sql += " GROUP BY day ORDER BY day"
+    return conn.execute(sql, args).fetchall()
+
+
+def main(argv=None):
+    today = date.today()
+    parser = argparse.ArgumentParser(description="Report enrollment status changes per day.")
+    parser.add_argument("--db", default=None, help="database file (default: $HR_APP_DB or the app's database)")
+    parser.add_argument("--from", dest="start", default=(today - timedelta(days=REPORT_DAYS)).isoformat())
+    parser.add_argument("--to", dest="end", default=today.isoformat())
+    parser.add_argument("--training", type=int, default=None, help="only this training id")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        datafetching.configure_database(args.db)
+    conn = datafetching.connect()
+    try:
+        datafetching.createtables(conn)
+        names = list(datafetching.STATUSES.values())
+        print("day         " + "  ".join(f"{n:>12}" for n in names))
+        for day, counts in daily_changes(conn, args.start, args.end, args.training).items():
+            print(f"{day}  " + "  ".join(f"{counts.get(n, 0):>12}" for n in names))
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,271 @@
+# enrollments.py
+#
+# Set-based roster upkeep shared by imports, edits and bulk moves. Employees
+# who are new, renamed or changed department are staged in temp.employee_fanout
+# (company_id, name, department, old_department, is_new); fan_out() then brings every roster
+# in line with one INSERT and one UPDATE per training, however many
+# employees are staged.
+import datafetching
+import events
+import migrations
+import recertification
+
+
+def training_departments(conn):
+    """[(training_id, table_name, {lower-case department, ...}), ...]"""
+    trainings = datafetching.run_query(conn, "SELECT id, name, departments FROM trainings")
+    return [
+        (t_id, datafetching.training_table(t_id, t_name),
+         {d.strip().lower() for d in (t_depts or "").split(",") if d.strip()})
+        for t_id, t_name, t_depts in trainings
+    ]
+
+
+def fan_out(conn, by):
+    """Apply temp.employee_fanout to every roster, inside the caller's transaction.
+
+    - Staged employees whose department a training requires and who are not
+      on its roster yet are enrolled as Pending.
+    - Existing roster rows get the current name and department. For
+      employees who changed department, open enrollments the new department
+      does not require are retired (Not Required) and retired ones it does
+      require are reopened. Completions are kept.
+
+    `by` is written to updated_by (see datafetching.actor). Publishes the
+    changed rosters; returns {training_id: [company_id, ...]} of them.
+    """
+    touched = {}
+    staged_ids = [r[0] for r in conn.execute("SELECT company_id FROM temp.employee_fanout")]
+    if not staged_ids:
+        return touched
+    for t_id, table_name, depts in training_departments(conn):
+        required = datafetching.id_list(sorted(depts))
+        changed = conn.execute(f"""
+            INSERT INTO "{table_name}" (employee_id, employee_name, department, status, updated_by)
+            SELECT f.company_id, f.name, f.department, {datafetching.PENDING}, ?
+            FROM temp.employee_fanout AS f
+            WHERE lower(f.department) IN (SELECT value FROM json_each(?))
+              AND NOT EXISTS (SELECT 1 FROM "{table_name}" AS t WHERE t.employee_id = f.company_id)
+        """, (by, required)).rowcount
+        # Renamed or moved employees: keep roster name/department current;
+        # only a department change retires or reopens
+        changed += conn.execute(f"""
+            UPDATE "{table_name}"
+            SET department = f.department,
+                employee_name = f.name,
+                updated_by = ?,
+                status = CASE
+                    WHEN f.department IS f.old_department THEN "{table_name}".status
+                    WHEN lower(f.department) NOT IN (SELECT value FROM json_each(?))
+                         AND "{table_name}".status != {datafetching.COMPLETED} THEN {datafetching.NOT_REQUIRED}
+                    WHEN lower(f.department) IN (SELECT value FROM json_each(?))
+                         AND "{table_name}".status = {datafetching.NOT_REQUIRED} THEN {datafetching.PENDING}
+                    ELSE "{table_name}".status END
+            FROM temp.employee_fanout AS f
+            WHERE "{table_name}".employee_id = f.company_id AND NOT f.is_new
+              AND (f.department IS NOT f.old_department
+                   OR "{table_name}".department IS NOT f.department OR "{table_name}".employee_name IS NOT f.name)
+        """, (by, required, required)).rowcount
+        if changed:
+            touched[t_id] = staged_ids
+            events.notify(events.ENROLLMENT, events.UPDATE, staged_ids, t_id, events.BY_EMPLOYEE)
+    return touched
+
+
+def move_employees(conn, emp_ids, department, source="app"):
+    """Move employees (employees.id values) to `department` in one write_transaction().
+
+    Returns {"moved": [employees.id, ...], "enrollments": {training_id: [company_id, ...]}}.
+    """
+    by = datafetching.actor(source)
+    return datafetching.write_transaction(conn, lambda c: stage_move(c, emp_ids, department, by))
+
+
+def stage_move(conn, emp_ids, department, by):
+    """The work of move_employees(), inside the caller's transaction.
+
+    Employees already in that department are skipped; the rest are staged
+    once and fan_out() recomputes all their enrollments together.
+    """
+    conn.execute("DROP TABLE IF EXISTS temp.employee_fanout")
+    conn.execute("""
+        CREATE TEMP TABLE employee_fanout AS
+        SELECT company_id, name, ? AS department, department AS old_department, 0 AS is_new
+        FROM employees
+        WHERE id IN (SELECT value FROM json_each(?)) AND department IS NOT ?
+    """, (department, datafetching.id_list(emp_ids), department))
+
+    moved = []
+    for emp_id, company_id, name, job in conn.execute("""
+        SELECT id, company_id, name, job FROM employees
+        WHERE company_id IN (SELECT company_id FROM temp.employee_fanout)
+    """).fetchall():
+        moved.append((department, datafetching.employee_hash(company_id, name, job, department), emp_id))
+    conn.executemany("UPDATE employees SET department=?, content_hash=? WHERE id=?", moved)
+    events.notify(events.EMPLOYEE, events.UPDATE, [row[2] for row in moved])
+
+    touched = fan_out(conn, by)
+    conn.execute("DROP TABLE temp.employee_fanout")
+    return {"moved": [row[2] for row in moved], "enrollments": touched}
+
+
+def rename_on_rosters(conn, old_company_id, company_id, name):
+    """Carry an edited company id / name over to the employee's roster rows.
+
+    One UPDATE per roster (an index lookup on employee_id), plus one on the
+    enrollment log so the employee's history follows a corrected company
+    id; no commit. Returns the training ids whose rosters changed.
+    """
+    changed = []
+    for t_id, table_name in migrations.roster_tables(conn):
+        rows = conn.execute(
+            f'UPDATE "{table_name}" SET employee_id=?, employee_name=? '
+            f'WHERE employee_id=? AND (employee_id IS NOT ? OR employee_name IS NOT ?)',
+            (company_id, name, old_company_id, company_id, name)
+        ).rowcount
+        if rows:
+            changed.append(t_id)
+            events.notify(events.ENROLLMENT, events.UPDATE, None, t_id)
+    if str(company_id) != str(old_company_id):
+        conn.execute("UPDATE enrollment_events SET employee_id=? WHERE employee_id=?",
+                     (str(company_id), str(old_company_id)))
+    return changed
+
+
+def add_employee(conn, company_id, name, job, department, source="app"):
+    """Create an employee and enroll them in their department's trainings, in one write_transaction().
+
+    Raises sqlite3.IntegrityError if the company id is taken. Returns
+    {"id": employees.id, "enrollments": {training_id: [company_id]}}.
+    """
+    by = datafetching.actor(source)
+
+    def work(c):
+        emp_id = c.execute(
+            "INSERT INTO employees (company_id, name, job, department, content_hash) VALUES (?, ?, ?, ?, ?)",
+            (company_id, name, job, department, datafetching.employee_hash(company_id, name, job, department))
+        ).lastrowid
+        c.execute("DROP TABLE IF EXISTS temp.employee_fanout")
+        c.execute("""
+            CREATE TEMP TABLE employee_fanout AS
+            SELECT ? AS company_id, ? AS name, ? AS department, NULL AS old_department, 1 AS is_new
+        """, (company_id, name, department))
+        events.notify(events.EMPLOYEE, events.INSERT, [emp_id])
+        touched = fan_out(c, by)
+        c.execute("DROP TABLE temp.employee_fanout")
+        return {"id": emp_id, "enrollments": touched}
+
+    return datafetching.write_transaction(conn, work)
+
+
+def remove_employee(conn, emp_id, source="app"):
+    """Delete an employee in one write_transaction().
+
+    Their open enrollments become Not Required; completed ones stay on the
+    rosters. Returns {training_id: [company_id]} of the rosters that changed.
+    """
+    by = datafetching.actor(source)
+
+    def work(c):
+        row = c.execute("SELECT company_id FROM employees WHERE id=?", (emp_id,)).fetchone()
+        if not row:
+            return {}
+        # Rosters key enrollments on the company id, not employees.id
+        company_id = row[0]
+        touched = {}
+        for t_id, table_name in migrations.roster_tables(c):
+            changed = c.execute(f"""
+                UPDATE "{table_name}" SET status = {datafetching.NOT_REQUIRED}, updated_by = ?
+                WHERE employee_id = ? AND status NOT IN ({datafetching.COMPLETED}, {datafetching.NOT_REQUIRED})
+            """, (by, company_id)).rowcount
+            if changed:
+                touched[t_id] = [company_id]
+                events.notify(events.ENROLLMENT, events.UPDATE, [company_id], t_id, events.BY_EMPLOYEE)
+        c.execute("DELETE FROM employees WHERE id=?", (emp_id,))
+        events.notify(events.EMPLOYEE, events.DELETE, [emp_id])
+        return touched
+
+    return datafetching.write_transaction(conn, work)
+
+
+def _enroll_departments(conn, table_name, departments, by):
+    """Enroll everyone in `departments` (lower-case) who is not on the roster yet, as Pending.
+
+    Publishes and returns their company ids.
+    """
+    enrolled = [r[0] for r in conn.execute(f"""
+        INSERT INTO "{table_name}" (employee_id, employee_name, department, status, updated_by)
+        SELECT e.company_id, e.name, e.department, {datafetching.PENDING}, ?
+        FROM employees AS e
+        WHERE lower(e.department) IN (SELECT value FROM json_each(?))
+          AND NOT EXISTS (SELECT 1 FROM "{table_name}" AS t WHERE t.employee_id = e.company_id)
+        RETURNING employee_id
+    """, (by, datafetching.id_list(sorted(departments))))]
+    events.notify(events.ENROLLMENT, events.INSERT, enrolled, datafetching.roster_training_id(table_name),
+                  events.BY_EMPLOYEE)
+    return enrolled
+
+
+def add_training(conn, name, description, departments, validity_months, source="app"):
+    """Create a training and its roster, enrolling the selected departments, in one write_transaction().
+
+    Returns (training_id, [company_id, ...] enrolled).
+    """
+    dept_string = ", ".join(departments)
+    by = datafetching.actor(source)
+
+    def work(c):
+        training_id = c.execute(
+            "INSERT INTO trainings (name, description, departments, content_hash, validity_months) VALUES (?, ?, ?, ?, ?)",
+            (name, description, dept_string, datafetching.training_hash(name, description, dept_string), validity_months)
+        ).lastrowid
+        table_name = datafetching.training_table(training_id, name)
+        datafetching.create_training_table(c, table_name)
+        events.notify(events.TRAINING, events.INSERT, [training_id])
+        return training_id, _enroll_departments(c, table_name, {d.strip().lower() for d in departments}, by)
+
+    return datafetching.write_transaction(conn, work)
+
+
+def update_training(conn, training_id, row_version, description, departments, validity_months, source="app"):
+    """Save an edited training and bring its roster in line, in one write_transaction().
+
+    The version check (datafetching.update_versioned, raises ConflictError)
+    and the roster changes commit together: employees of added departments
+    are enrolled, open enrollments of removed departments are retired (Not
+    Required) and a new validity period re-derives the due dates. Returns
+    {"row_version", "added": [company_id, ...], "retired": [company_id, ...], "due_dates": n}.
+    """
+    dept_string = ", ".join(departments)
+    by = datafetching.actor(source)
+
+    def work(c):
+        row = c.execute("SELECT name, departments, validity_months FROM trainings WHERE id=?", (training_id,)).fetchone()
+        if not row:
+            raise datafetching.ConflictError(f"Row {training_id} of trainings was deleted by someone else.")
+        name, old_dept_string, old_validity = row
+        version = datafetching.update_versioned(c, "trainings", training_id, row_version, {
+            "description": description, "departments": dept_string, "validity_months": validity_months,
+            "content_hash": datafetching.training_hash(name, description, dept_string),
+        })
+
+        table_name = datafetching.training_table(training_id, name)
+        datafetching.create_training_table(c, table_name)
+        old = {d.strip().lower() for d in (old_dept_string or "").split(",") if d.strip()}
+        new = {d.strip().lower() for d in departments if d.strip()}
+        added = _enroll_departments(c, table_name, new - old, by)
+        retired = [r[0] for r in c.execute(f"""
+            UPDATE "{table_name}" SET status = {datafetching.NOT_REQUIRED}, updated_by = ?
+            WHERE status NOT IN ({datafetching.COMPLETED}, {datafetching.NOT_REQUIRED})
+              AND employee_id IN (SELECT company_id FROM employees
+                                  WHERE lower(department) IN (SELECT value FROM json_each(?)))
+            RETURNING employee_id
+        """, (by, datafetching.id_list(sorted(old - new))))]
+        events.notify(events.ENROLLMENT, events.UPDATE, retired, training_id, events.BY_EMPLOYEE)
+
+        due_dates = 0
+        if validity_months != old_validity:
+            due_dates = recertification.update_due_dates(c, table_name, validity_months)
+        return {"row_version": version, "added": added, "retired": retired, "due_dates": due_dates}
+
+    return datafetching.write_transaction(conn, work)
@@ -0,0 +1,122 @@
+# events.py
+#
+# In-process publish/subscribe bus for row-level data changes. The data-layer
+# functions that write to the database publish a Change for what they wrote;
+# open pages subscribe and patch just the affected rows instead of reloading
+# everything. Changes made inside datafetching.write_transaction() are held
+# back until it commits (see deferred()), and changes published on a worker
+# thread reach subscribers on the GUI thread (see set_dispatcher()).
+import threading
+import weakref
+from collections import namedtuple
+from contextlib import contextmanager
+
+# Entities
+EMPLOYEE = "employee"        # ids are employees.id
+TRAINING = "training"        # ids are trainings.id
+ENROLLMENT = "enrollment"    # rows of one per-training table, see `key`
+DEPARTMENT = "department"    # ids are department names
+SETTING = "setting"          # ids are settings keys
+
+# Actions
+INSERT = "insert"
+UPDATE = "update"
+DELETE = "delete"
+
+# What Change.ids refers to for ENROLLMENT changes
+BY_ROW = "id"                # row ids in the training table
+BY_EMPLOYEE = "employee_id"  # the table's employee_id column
+
+# ids=None means "many rows changed, re-sync the whole view".
+Change = namedtuple("Change", ["entity", "action", "ids", "training_id", "key"],
+                    defaults=(None, BY_ROW))
+
+_subscribers = {}
+# Set by set_dispatcher(): the thread subscribers run on, and how to get there
+_home_thread = None
+_dispatch = None
+# Per-thread list of changes held back by deferred()
+_local = threading.local()
+
+
+def subscribe(entity, callback):
+    """Call `callback(change)` for every Change published for `entity`.
+
+    Bound methods are held weakly, so a closed page drops out on its own.
+    """
+    try:
+        ref = weakref.WeakMethod(callback)
+    except TypeError:
+        ref = lambda: callback  # plain functions are kept alive
+    _subscribers.setdefault(entity, []).append(ref)
+
+
+def unsubscribe(entity, callback):
+    _subscribers[entity] = [ref for ref in _subscribers.get(entity, []) if ref() not in (None, callback)]
+
+
+def set_dispatcher(dispatch):
+    """Make the calling thread the one subscribers are called on.
+
+    Changes published on any other thread are passed to dispatch(change),
+    which must get them to publish() on this thread; main.py passes a Qt
+    signal's emit. Without a dispatcher (scripts, tests) every change is
+    delivered on the thread that published it.
+    """
+    global _home_thread, _dispatch
+    _home_thread = threading.get_ident()
+    _dispatch = dispatch
+
+
+def publish(change):
+    """Deliver `change` synchronously to the current subscribers."""
+    if _dispatch is not None and threading.get_ident() != _home_thread:
+        _dispatch(change)
+        return
+    for ref in list(_subscribers.get(change.entity, [])):
+        callback = ref()
+        if callback is None:
+            continue
+        try:
+            callback(change)
+        except Exception as e:
+            # One broken view must not stop the others from updating
+            print(f"Change handler failed for {change}: {e}")
+    # Forget subscribers whose page has been garbage collected
+    _subscribers[change.entity] = [ref for ref in _subscribers.get(change.entity, []) if ref() is not None]
+
+
+def notify(entity, action, ids=None, training_id=None, key=BY_ROW):
+    """Shorthand for publish(Change(...)); ids are copied into a tuple.
+
+    An empty id list means nothing changed, so nothing is published.
+    Inside deferred() the change waits for the block to end.
+    """
+    if ids is not None and not ids:
+        return
+    change = Change(entity, action, tuple(ids) if ids is not None else None, training_id, key)
+    pending = getattr(_local, "pending", None)
+    if pending is not None:
+        pending.append(change)
+    else:
+        publish(change)
+
+
+@contextmanager
+def deferred():
+    """Hold back notify() calls made on this thread inside the block.
+
+    They are published when the block exits normally and dropped if it
+    raises, so a rolled-back write announces nothing. A nested block joins
+    the outer one.
+    """
+    if getattr(_local, "pending", None) is not None:
+        yield
+        return
+    pending = _local.pending = []
+    try:
+        yield
+    finally:
+        _local.pending = None
+    for change in pending:
+        publish(change)
@@ -0,0 +1,591 @@
+# importers.py
+#
+# Spreadsheet parsing and set-based import helpers shared by the pages.
+# Nothing in here touches Qt, so the same code can run from a worker thread.
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import datafetching
+import enrollments
+import events
+
+# How far down a sheet we look for the header row
+HEADER_SEARCH_ROWS = 10
+
+# Files picked up when importing a whole folder
+EXCEL_SUFFIXES = (".xlsx", ".xls")
+
+
+def _normalise_header(value, aliases):
+    name = str(value).strip().lower().replace(" ", "_")
+    return aliases.get(name, name)
+
+
+def read_sheet(file_path, required, aliases=None):
+    """Read an Excel sheet whose header row is somewhere in the first rows.
+
+    Header names are matched case-insensitively, with spaces treated as
+    underscores; `aliases` maps alternative names onto the required ones
+    (e.g. {"employee_id": "company_id"}). Returns a DataFrame whose columns
+    are the normalised names and whose index is the Excel row number, so
+    validation messages can point at the sheet. Raises ValueError when no
+    header row or a required column is found.
+    """
+    aliases = aliases or {}
+
+    # 1) Preview first rows (no header) to find header row
+    preview = pd.read_excel(file_path, header=None, nrows=HEADER_SEARCH_ROWS)
+    header_row_index = None
+    for i, row in preview.iterrows():
+        row_vals = {_normalise_header(v, aliases) for v in row.values if pd.notna(v)}
+        if required.issubset(row_vals):
+            header_row_index = i
+            break
+
+    if header_row_index is None:
+        names = ", ".join(sorted(required))
+        raise ValueError(f"Could not find required header row ({names}) in the first {HEADER_SEARCH_ROWS} rows.")
+
+    # 2) Re-read file with detected header row
+    df = pd.read_excel(file_path, header=header_row_index)
+    df.columns = [_normalise_header(c, aliases) for c in df.columns]
+    missing = required - set(df.columns)
+    if missing:
+        raise ValueError(f"Missing required columns after header detection: {', '.join(sorted(missing))}")
+    # Data starts on the sheet row after the header (Excel rows are 1-based)
+    df.index = df.index + header_row_index + 2
+    return df
+
+
+def clean_text(series):
+    """Strip a column to text, turning blanks/NaN into ''."""
+    return series.where(series.notna(), "").astype(str).str.strip()
+
+
+def clean_ids(series):
+    """Company ids as text; Excel hands back whole numbers as floats ("1001.0")."""
+    return clean_text(series).str.replace(r"\.0$", "", regex=True)
+
+
+def read_employees(file_path, drop_incomplete=True):
+    """Parse an employee sheet into a DataFrame of company_id, name, job, department.
+
+    Rows missing any of the four fields are dropped unless drop_incomplete
+    is False (the dry run reports them instead).
+    """
+    columns = ["company_id", "name", "job", "department"]
+    df = read_sheet(file_path, set(columns))
+    out = pd.DataFrame({col: clean_text(df[col]) for col in columns})
+    out["company_id"] = clean_ids(df["company_id"])
+    if drop_incomplete:
+        out = out[(out != "").all(axis=1)]
+    return out
+
+
+def read_trainings(file_path, drop_incomplete=True):
+    """Parse a training sheet into a DataFrame of name, description, departments.
+
+    Rows missing any of the three fields are dropped unless drop_incomplete
+    is False (the dry run reports them instead).
+    """
+    columns = ["name", "description", "departments"]
+    df = read_sheet(file_path, set(columns))
+    out = pd.DataFrame({col: clean_text(df[col]) for col in columns})
+    if drop_incomplete:
+        out = out[(out != "").all(axis=1)]
+    return out
+
+
+def excel_files(folder):
+    """Spreadsheets directly inside `folder`, sorted by name.
+
+    Office lock files ("~$Book.xlsx") are skipped.
+    """
+    return sorted(
+        os.path.join(folder, name) for name in os.listdir(folder)
+        if name.lower().endswith(EXCEL_SUFFIXES) and not name.startswith("~$")
+    )
+
+
+def _read_file(reader, file_path):
+    """Process-pool task: parse one file, returning (frame, error)."""
+    try:
+        return reader(file_path, drop_incomplete=False), None
+    except Exception as e:
+        return None, str(e)
+
+
+def read_many(reader, file_paths, max_workers=None):
+    """Parse several sheets with `reader` and stack them into one DataFrame.
+
+    Parsing is CPU-bound, so more than one file is spread over a process
+    pool; a single file is read in-process. reader must be a module-level
+    function taking (file_path, drop_incomplete) such as read_employees.
+    Index labels become "<file name> row <n>" so validation messages still
+    point at the sheet. Files are stacked in the order given, so for
+    duplicate keys a later file wins.
+
+    Returns (DataFrame or None if nothing could be read, {file_path: error}).
+    """
+    file_paths = list(file_paths)
+    if len(file_paths) == 1:
+        results = [_read_file(reader, file_paths[0])]
+    else:
+        workers = min(len(file_paths), max_workers or os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_read_file, [reader] * len(file_paths), file_paths))
+
+    frames, errors = [], {}
+    for file_path, (df, error) in zip(file_paths, results):
+        if error is not None:
+            errors[file_path] = error
+            continue
+        name = os.path.basename(file_path)
+        df.index = [f"{name} row {row}" for row in df.index]
+        frames.append(df)
+
+    if not frames:
+        return None, errors
+    return pd.concat(frames), errors
+
+
+def read_roster_statuses(file_path):
+    """Parse a trainer's attendance sheet into (rows, invalid).
+
+    rows is a list of (company_id, status code); invalid lists the company
+    ids whose status is not a known status name (see datafetching.STATUSES).
+    """
+    df = read_sheet(file_path, {"company_id", "status"}, aliases={"employee_id": "company_id"})
+    ids = clean_ids(df["company_id"])
+    statuses = clean_text(df["status"]).map(datafetching.status_code)
+
+    present = ids != ""
+    valid = present & statuses.notna()
+    rows = list(zip(ids[valid], statuses[valid].astype(int)))
+    invalid = list(ids[present & statuses.isna()])
+    return rows, invalid
+
+
+def apply_roster_statuses(conn, table_name, rows, source="import"):
+    """Apply (company_id, status) pairs to one training table in one go.
+
+    The rows are staged in a temp table and applied with a single
+    UPDATE ... FROM join inside one write_transaction(). Returns
+    (updated_count, matched_ids, unmatched_ids).
+    """
+    return datafetching.write_transaction(conn, lambda c: _apply_roster_statuses(c, table_name, rows, source))
+
+
+def _apply_roster_statuses(conn, table_name, rows, source):
+    conn.execute("DROP TABLE IF EXISTS temp.status_import")
+    conn.execute("CREATE TEMP TABLE status_import (company_id TEXT PRIMARY KEY, status INTEGER)")
+    # Later rows for the same employee win
+    conn.executemany("INSERT OR REPLACE INTO temp.status_import (company_id, status) VALUES (?, ?)", rows)
+
+    changed = [r[0] for r in conn.execute(f"""
+        UPDATE "{table_name}" SET status = s.status, updated_by = ?
+        FROM temp.status_import AS s
+        WHERE "{table_name}".employee_id = s.company_id
+          AND "{table_name}".status IS NOT s.status
+        RETURNING "{table_name}".id
+    """, (datafetching.actor(source),))]
+    events.notify(events.ENROLLMENT, events.UPDATE, changed, datafetching.roster_training_id(table_name))
+
+    matched, unmatched = [], []
+    for company_id, found in conn.execute(f"""
+        SELECT s.company_id, EXISTS (SELECT 1 FROM "{table_name}" t WHERE t.employee_id = s.company_id)
+        FROM temp.status_import AS s
+    """):
+        (matched if found else unmatched).append(company_id)
+
+    conn.execute("DROP TABLE temp.status_import")
+    return len(changed), matched, unmatched
+
+
+def known_departments(conn):
+    """{lower-case name: stored name} for every department."""
+    return {name.lower(): name for (name,) in datafetching.run_query(conn, "SELECT name FROM departments")}
+
+
+def add_departments(conn, names):
+    """Create departments in one statement; existing names are left alone."""
+    datafetching.write_transaction(conn, lambda c: insert_departments(c, names))
+
+
+def insert_departments(conn, names):
+    """add_departments() inside the caller's transaction."""
+    if conn.executemany("INSERT OR IGNORE INTO departments (name) VALUES (?)", [(n,) for n in names]).rowcount:
+        events.notify(events.DEPARTMENT, events.INSERT, names)
+
+
+def _resolve_departments(conn, departments):
+    """Map department names onto their stored spelling (case-insensitive).
+
+    Returns (resolved Series, unknown mask).
+    """
+    known = known_departments(conn)
+    lower = departments.str.lower()
+    return lower.map(known).fillna(departments), ~lower.isin(list(known))
+
+
+def preview_employees(conn, df):
+    """Dry-run an employee import: validate the sheet and diff it against the database.
+
+    df comes from read_employees(..., drop_incomplete=False). Validation is
+    done on whole columns, and the diff uses a single query of the stored
+    employees. Nothing is written. Returns a dict with:
+
+    - rows: importable rows (company_id, name, job, department), duplicates
+      collapsed to the last occurrence and departments in stored spelling
+    - missing: Excel row numbers with a blank field
+    - duplicates: company ids listed more than once
+    - unknown_departments: departments not in the departments table
+    - insert / update: company ids that would be added / changed
+    - unchanged: number of rows identical to the database
+    - vanished: company ids in the database the file does not list
+    """
+    complete = (df != "").all(axis=1)
+    rows = df[complete]
+    duplicates = sorted(rows.loc[rows["company_id"].duplicated(keep=False), "company_id"].unique())
+    # Later rows for the same company id win, as in sync_employees
+    rows = rows.drop_duplicates("company_id", keep="last")
+
+    resolved, unknown = _resolve_departments(conn, rows["department"])
+    rows = rows.assign(department=resolved)
+
+    stored = pd.DataFrame(
+        datafetching.run_query(conn, "SELECT company_id, name, job, department FROM employees"),
+        columns=["company_id", "name", "job", "department"]
+    ).astype(str)
+    merged = rows.merge(stored, on="company_id", how="left", suffixes=("", "_db"), indicator=True)
+    is_new = merged["_merge"] == "left_only"
+    changed = ~is_new & (
+        (merged["name"] != merged["name_db"])
+        | (merged["job"] != merged["job_db"])
+        | (merged["department"] != merged["department_db"])
+    )
+
+    listed = set(df["company_id"])
+    return {
+        "rows": rows,
+        "missing": list(df.index[~complete]),
+        "duplicates": duplicates,
+        "unknown_departments": sorted(rows.loc[unknown, "department"].unique()),
+        "insert": list(merged.loc[is_new, "company_id"]),
+        "update": list(merged.loc[changed, "company_id"]),
+        "unchanged": int((~is_new & ~changed).sum()),
+        "vanished": [c for c in stored["company_id"] if c not in listed],
+    }
+
+
+def employee_rows(preview, add_departments=True):
+    """(company_id, name, job, department) tuples to hand to sync_employees.
+
+    Without add_departments, employees in unknown departments are left out.
+    """
+    rows = preview["rows"]
+    if not add_departments:
+        rows = rows[~rows["department"].isin(preview["unknown_departments"])]
+    return list(rows.itertuples(index=False, name=None))
+
+
+def preview_trainings(conn, df):
+    """Dry-run a training import: validate the sheet and diff it against the database.
+
+    df comes from read_trainings(..., drop_incomplete=False). Nothing is
+    written. Returns a dict with:
+
+    - rows: one row per (training, department) with name (sanitised), key
+      (lower-case name), description, department (stored spelling) and
+      known (department exists)
+    - missing: Excel row numbers with a blank field
+    - invalid: names containing characters banned from table names
+    - duplicates: training names listed more than once
+    - unknown_departments: departments not in the departments table
+    - no_match: trainings none of whose departments has any employees
+    - insert / update: training names that would be added / changed
+    - unchanged: number of trainings identical to the database
+    - vanished: trainings in the database the file does not list
+    """
+    complete = (df != "").all(axis=1)
+    rows = df[complete]
+    bad = rows["name"].str.contains(datafetching.BANNED_CHARS, regex=True)
+    invalid = list(rows.loc[bad, "name"])
+    rows = rows[~bad]
+    rows = rows.assign(name=rows["name"].map(datafetching.sanitize_training_name))
+    rows = rows.assign(key=rows["name"].str.lower())
+    duplicates = sorted(rows.loc[rows["key"].duplicated(keep=False), "name"].unique())
+    rows = rows.drop_duplicates("key", keep="last")
+
+    # One row per listed department
+    depts = rows.assign(department=rows["departments"].str.split(",")).explode("department")
+    depts["department"] = depts["department"].str.strip()
+    depts = depts[depts["department"] != ""].drop(columns="departments")
+    resolved, unknown = _resolve_departments(conn, depts["department"])
+    depts = depts.assign(department=resolved, known=~unknown)
+
+    staffed = {d for (d,) in datafetching.run_query(
+        conn, "SELECT DISTINCT lower(department) FROM employees WHERE department IS NOT NULL"
+    )}
+    has_staff = depts["department"].str.lower().isin(list(staffed)).groupby(depts["key"]).any()
+
+    listed = (
+        depts.drop_duplicates(["key", "department"])
+        .groupby("key", sort=False)
+        .agg(name=("name", "last"), description=("description", "last"), departments=("department", ", ".join))
+        .reset_index()
+    )
+    stored = pd.DataFrame(
+        datafetching.run_query(conn, "SELECT lower(name), name, description, departments FROM trainings"),
+        columns=["key", "name_db", "description_db", "departments_db"]
+    )
+    merged = listed.merge(stored, on="key", how="left", indicator=True)
+    is_new = merged["_merge"] == "left_only"
+    changed = ~is_new & (
+        (merged["description"] != merged["description_db"])
+        | (merged["departments"] != merged["departments_db"])
+    )
+
+    all_keys = set(df["name"].str.lower())
+    return {
+        "rows": depts,
+        "missing": list(df.index[~complete]),
+        "invalid": invalid,
+        "duplicates": duplicates,
+        "unknown_departments": sorted(depts.loc[unknown, "department"].unique()),
+        "no_match": list(listed.loc[~listed["key"].map(has_staff).fillna(False).astype(bool), "name"]),
+        "insert": list(merged.loc[is_new, "name"]),
+        "update": list(merged.loc[changed, "name_db"]),
+        "unchanged": int((~is_new & ~changed).sum()),
+        "vanished": [n for k, n in zip(stored["key"], stored["name_db"]) if k not in all_keys],
+    }
+
+
+def training_rows(preview, add_departments=True):
+    """(name, description, departments) tuples to hand to sync_trainings.
+
+    Without add_departments, unknown departments are dropped from each
+    training; trainings left with no department are skipped.
+    """
+    depts = preview["rows"]
+    if not add_departments:
+        depts = depts[depts["known"]]
+    grouped = (
+        depts.drop_duplicates(["key", "department"])
+        .groupby("key", sort=False)
+        .agg(name=("name", "last"), description=("description", "last"), departments=("department", ", ".join))
+    )
+    return list(grouped.itertuples(index=False, name=None))
+
+
+def _sample(values, limit=10):
+    values = [str(v) for v in values]
+    text = ", ".join(values[:limit])
+    if len(values) > limit:
+        text += f" and {len(values) - limit} more"
+    return text
+
+
+def summarize(preview, noun):
+    """Plain-text dry-run report for the confirmation dialog."""
+    lines = [
+        f"New {noun}: {len(preview['insert'])}",
+        f"Changed {noun}: {len(preview['update'])}",
+        f"Unchanged (skipped): {preview['unchanged']}",
+    ]
+    if preview["vanished"]:
+        lines.append(f"In the database but not in the import: {len(preview['vanished'])}")
+
+    # Batch imports: one line per file that failed to parse
+    file_errors = preview.get("file_errors", {})
+    if file_errors:
+        lines.append("")
+        lines.append(f"Files that could not be read ({len(file_errors)}):")
+        lines.extend(f"{os.path.basename(path)}: {error}" for path, error in file_errors.items())
+
+    problems = [
+        ("Rows with blank fields (skipped), sheet rows", preview["missing"]),
+        ("Names with ; \" ' \\ or / (skipped)", preview.get("invalid", [])),
+        ("Listed more than once (last row wins)", preview["duplicates"]),
+        ("Unknown departments", preview["unknown_departments"]),
+        ("Trainings whose departments have no employees", preview.get("no_match", [])),
+    ]
+    for label, values in problems:
+        if values:
+            lines.append("")
+            lines.append(f"{label} ({len(values)}):")
+            lines.append(_sample(values))
+    return "\n".join(lines)
+
+
+def sync_employees(conn, rows, update_existing=True, source="import"):
+    """Insert or update employees keyed on company_id, in one write_transaction().
+
+    rows are (company_id, name, job, department) with departments already
+    resolved. With update_existing, changed name/job/department values are
+    written in place (INSERT ... ON CONFLICT DO UPDATE); otherwise existing
+    company ids are left alone. Enrollments are only fanned out for new
+    employees and employees whose department or name actually changed
+    (renames reach the rosters' employee_name).
+
+    Each row's content hash is compared against employees.content_hash in
+    one join first, so rows that are identical to the stored record are
+    dropped before any further work.
+
+    Returns a dict with the added and updated employees.id values, the
+    number of unchanged rows, the company ids in the database that the
+    file no longer lists ("vanished") and {training_id: [company_id, ...]}
+    of rosters that were touched.
+    """
+    return datafetching.write_transaction(conn, lambda c: upsert_employees(c, rows, update_existing, source))
+
+
+def upsert_employees(conn, rows, update_existing=True, source="import"):
+    """The work of sync_employees(), inside the caller's transaction."""
+    hashed = ((*row, datafetching.employee_hash(*row)) for row in rows)
+    conn.execute("DROP TABLE IF EXISTS temp.employee_import")
+    conn.execute("""
+        CREATE TEMP TABLE employee_import (
+            company_id TEXT PRIMARY KEY, name TEXT, job TEXT, department TEXT, content_hash TEXT
+        )
+    """)
+    # Later rows for the same company id win
+    conn.executemany("INSERT OR REPLACE INTO temp.employee_import VALUES (?, ?, ?, ?, ?)", hashed)
+    staged = conn.execute("SELECT COUNT(*) FROM temp.employee_import").fetchone()[0]
+
+    vanished = [r[0] for r in conn.execute("""
+        SELECT company_id FROM employees
+        WHERE company_id NOT IN (SELECT company_id FROM temp.employee_import)
+    """)]
+    # Identical to what is stored: nothing else to do for these rows
+    conn.execute("""
+        DELETE FROM temp.employee_import
+        WHERE EXISTS (
+            SELECT 1 FROM employees AS e
+            WHERE e.company_id = employee_import.company_id
+              AND e.content_hash = employee_import.content_hash
+        )
+    """)
+
+    # Work out what will change before touching employees
+    conn.execute("DROP TABLE IF EXISTS temp.employee_fanout")
+    conn.execute(f"""
+        CREATE TEMP TABLE employee_fanout AS
+        SELECT s.company_id, s.name, s.department, e.department AS old_department, e.id IS NULL AS is_new
+        FROM temp.employee_import AS s
+        LEFT JOIN employees AS e ON e.company_id = s.company_id
+        WHERE e.id IS NULL {"OR e.department IS NOT s.department OR e.name IS NOT s.name" if update_existing else ""}
+    """)
+    updated_ids = []
+    if update_existing:
+        updated_ids = [r[0] for r in conn.execute("""
+            SELECT e.id FROM employees AS e JOIN temp.employee_import AS s ON s.company_id = e.company_id
+            WHERE e.name IS NOT s.name OR e.job IS NOT s.job OR e.department IS NOT s.department
+        """)]
+
+    conflict = """
+        DO UPDATE SET name = excluded.name, job = excluded.job, department = excluded.department,
+                      content_hash = excluded.content_hash
+        WHERE employees.name IS NOT excluded.name
+           OR employees.job IS NOT excluded.job
+           OR employees.department IS NOT excluded.department
+           OR employees.content_hash IS NOT excluded.content_hash
+    """ if update_existing else "DO NOTHING"
+    # "WHERE true" lets SQLite parse ON CONFLICT after INSERT ... SELECT
+    conn.execute(f"""
+        INSERT INTO employees (company_id, name, job, department, content_hash)
+        SELECT company_id, name, job, department, content_hash FROM temp.employee_import WHERE true
+        ON CONFLICT(company_id) {conflict}
+    """)
+    added_ids = [r[0] for r in conn.execute("""
+        SELECT e.id FROM employees AS e JOIN temp.employee_fanout AS f ON f.company_id = e.company_id
+        WHERE f.is_new
+    """)]
+    events.notify(events.EMPLOYEE, events.INSERT, added_ids)
+    events.notify(events.EMPLOYEE, events.UPDATE, updated_ids)
+
+    # Enrollment fan-out, one set-based pass per training table
+    touched = enrollments.fan_out(conn, datafetching.actor(source))
+
+    conn.execute("DROP TABLE temp.employee_import")
+    conn.execute("DROP TABLE temp.employee_fanout")
+
+    return {
+        "added": added_ids,
+        "updated": updated_ids,
+        "unchanged": staged - len(added_ids) - len(updated_ids),
+        "vanished": vanished,
+        "enrollments": touched,
+    }
+
+
+def sync_trainings(conn, rows, source="import"):
+    """Insert or update trainings keyed on name (case-insensitive).
+
+    rows are (name, description, departments) with the name sanitised and
+    departments already resolved. Stored content hashes are loaded in one
+    query; unchanged trainings are skipped, new or changed ones are written,
+    get their roster table and have the listed departments' employees
+    enrolled with one INSERT ... SELECT each. Runs in one
+    write_transaction().
+
+    Returns a dict with added/updated training ids, the unchanged count,
+    names the file no longer lists ("vanished") and
+    {training_id: [company_id, ...]} of rosters that gained employees.
+    """
+    return datafetching.write_transaction(conn, lambda c: upsert_trainings(c, rows, source))
+
+
+def upsert_trainings(conn, rows, source="import"):
+    """The work of sync_trainings(), inside the caller's transaction."""
+    incoming = {}
+    for name, desc, depts in rows:
+        incoming[name.lower()] = (name, desc, depts, datafetching.training_hash(name, desc, depts))
+
+    stored = {
+        name.lower(): (t_id, name, stored_hash)
+        for t_id, name, stored_hash in datafetching.run_query(conn, "SELECT id, name, content_hash FROM trainings")
+    }
+
+    added, updated, touched = [], [], {}
+    by = datafetching.actor(source)
+    for key, (name, desc, depts, new_hash) in incoming.items():
+        if key in stored:
+            training_id, name, stored_hash = stored[key]  # keep the stored spelling
+            if stored_hash == new_hash:
+                continue
+            conn.execute("UPDATE trainings SET description=?, departments=?, content_hash=? WHERE id=?",
+                         (desc, depts, new_hash, training_id))
+            updated.append(training_id)
+        else:
+            training_id = conn.execute(
+                "INSERT INTO trainings (name, description, departments, content_hash) VALUES (?, ?, ?, ?)",
+                (name, desc, depts, new_hash)
+            ).lastrowid
+            added.append(training_id)
+
+        table_name = datafetching.training_table(training_id, name)
+        datafetching.create_training_table(conn, table_name)
+        dept_keys = sorted({d.strip().lower() for d in depts.split(",") if d.strip()})
+        enrolled = [r[0] for r in conn.execute(f"""
+            INSERT INTO "{table_name}" (employee_id, employee_name, department, status, updated_by)
+            SELECT e.company_id, e.name, e.department, {datafetching.PENDING}, ? FROM employees AS e
+            WHERE lower(e.department) IN (SELECT value FROM json_each(?))
+              AND NOT EXISTS (SELECT 1 FROM "{table_name}" AS t WHERE t.employee_id = e.company_id)
+            RETURNING employee_id
+        """, (by, datafetching.id_list(dept_keys)))]
+        if enrolled:
+            touched[training_id] = enrolled
+            events.notify(events.ENROLLMENT, events.INSERT, enrolled, training_id, events.BY_EMPLOYEE)
+
+    events.notify(events.TRAINING, events.INSERT, added)
+    events.notify(events.TRAINING, events.UPDATE, updated)
+    return {
+        "added": added,
+        "updated": updated,
+        "unchanged": len(incoming) - len(added) - len(updated),
+        "vanished": [name for key, (t_id, name, h) in stored.items() if key not in incoming],
+        "enrollments": touched,
+    }
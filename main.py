@@ -2,16 +2,34 @@
 import sys
 import sqlite3
 import os
+import argparse
+import multiprocessing
+import threading
+import time
 from PyQt6.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout, QMessageBox
 )
-from PyQt6.QtGui import QIcon
-from PyQt6.QtCore import Qt, QSize
+from PyQt6.QtGui import QIcon, QCursor
+from PyQt6.QtCore import Qt, QSize, QObject, QTimer
 from employee import EmployeePage
 from training import TrainingPage
 from additionalInfo import InfoPage
 import datafetching
+import migrations
 import objects
+import theme
+import profiling
+import events
+import autoimport
+import api
+import maintenance
+import backup
+import recertification
+
+# How often the main window checks whether a scheduled backup is due
+BACKUP_CHECK_MS = 60 * 60 * 1000
+# How often it checks whether today's recertification sweep has run
+RECERT_CHECK_MS = 60 * 60 * 1000
 
 def resource_path(relative_path):
     """Get absolute path to resource, works for PyInstaller."""
@@ -22,13 +40,64 @@ def resource_path(relative_path):
         base_path = os.path.abspath(".")
     return os.path.join(base_path, relative_path)
 
-def db_path(relative_path):
-    appdata_path = os.path.join(os.environ["APPDATA"], "HR_App")
-    os.makedirs(appdata_path, exist_ok=True)
+class IdleMaintenance(QObject):
+    """Runs maintenance.run() once the user has left the app alone for a while.
+
+    Rather than filtering every Qt event, each check samples the mouse
+    cursor; a moved cursor or any change published on the events bus
+    counts as activity. After IDLE_SECONDS without either, a due pass runs
+    on a worker thread with its own connection so the window stays
+    responsive.
+    """
+    IDLE_SECONDS = 120
+    CHECK_MS = 30_000
+
+    def __init__(self, conn):
+        super().__init__()
+        self.conn = conn
+        self.last_input = time.monotonic()
+        self.last_cursor = QCursor.pos()
+        self.worker = None
+        for entity in (events.EMPLOYEE, events.TRAINING, events.ENROLLMENT, events.DEPARTMENT, events.SETTING):
+            events.subscribe(entity, self.note_activity)
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.check)
+        self.timer.start(self.CHECK_MS)
+
+    def note_activity(self, change=None):
+        self.last_input = time.monotonic()
+
+    def check(self):
+        cursor = QCursor.pos()
+        if cursor != self.last_cursor:
+            self.last_cursor = cursor
+            self.note_activity()
+            return
+        if self.worker is not None and self.worker.is_alive():
+            return
+        if time.monotonic() - self.last_input < self.IDLE_SECONDS:
+            return
+        if not maintenance.is_due(self.conn):
+            return
+        self.worker = threading.Thread(target=self._run, name="maintenance", daemon=True)
+        self.worker.start()
+
+    @staticmethod
+    def _run():
+        conn = datafetching.connect(timeout=30)
+        try:
+            result = maintenance.run(conn)
+            if result["quick_check"] != ["ok"]:
+                print("Database integrity check failed:\n" + "\n".join(result["quick_check"]))
+            else:
+                print(f"Maintenance done in {result['seconds']:.2f}s. {maintenance.format_report(result['after'])}")
+                if result["needs_conversion"]:
+                    print("Free pages are not being returned; run 'python maintenance.py --convert' once with the app closed.")
+        except Exception as e:
+            print(f"Maintenance skipped: {e}")
+        finally:
+            conn.close()
 
-    # Always use this path for the database
-    db_path = os.path.join(appdata_path, relative_path)
-    return db_path
 
 class HRApp(QWidget):  
     def __init__(self):
@@ -36,19 +105,54 @@ class HRApp(QWidget):
         self.setWindowTitle("HR Training App")
         self.setGeometry(100, 100, 300, 300)  # Bigger, dashboard feel
 
-        self.conn = sqlite3.connect(db_path("hr_app.db"))
+        # Changes written on worker threads (auto-import, backups) reach the pages on this thread
+        self.event_relay = objects.ThreadRelay()
+        self.event_relay.done.connect(events.publish)
+        events.set_dispatcher(self.event_relay.done.emit)
+
+        self.conn = datafetching.connect(timeout=datafetching.GUI_BUSY_TIMEOUT)
         self.init_db()  # create tables here
 
+        # Sub pages are built on first open and then reused (they share self.conn)
+        self.subpageemployee = None
+        self.subpagetraining = None
+        self.subpageinfo = None
+
+        # Optional watched-folder import (configured on the Info page)
+        self.autoimporter = None
+        self.import_relay = objects.ThreadRelay()
+        self.import_relay.done.connect(self.on_auto_import)
+        events.subscribe(events.SETTING, self.on_setting_change)
+        self.start_autoimport()
+
+        # Optional read-only JSON API for other tools (HR_APP_API_PORT=8765)
+        self.api_server = None
+        api_port = os.environ.get(api.API_PORT_ENV)
+        if api_port:
+            try:
+                self.api_server = api.serve_in_thread(datafetching.database_location(), int(api_port))
+            except (OSError, ValueError) as e:
+                print(f"API server not started: {e}")
+
+        # Optimise / vacuum / check the database while nobody is using the app
+        self.maintenance = IdleMaintenance(self.conn)
 
-        self.setStyleSheet(f"""
-            QWidget {{
-                background: qlineargradient(
-                    x1:0, y1:0, x2:1, y2:1,
-                    stop:0 {objects.COLOR_DARK_GREEN}, stop:0.5 {objects.COLOR_TEAL}, stop:1 {objects.COLOR_MINT}
-                );
-                font-family: Segoe UI, Arial, sans-serif;
-            }}
-        """)
+        # Daily verified backups with rotation, copied on a worker thread
+        self.backup_job = None
+        self.backup_relay = objects.ThreadRelay()
+        self.backup_relay.done.connect(self.on_backup_done)
+        self.backup_timer = QTimer(self)
+        self.backup_timer.timeout.connect(self.check_backup)
+        self.backup_timer.start(BACKUP_CHECK_MS)
+        QTimer.singleShot(0, self.check_backup)
+
+        # Reopen expired certifications once a day (a few indexed UPDATEs)
+        self.recert_timer = QTimer(self)
+        self.recert_timer.timeout.connect(self.check_recertification)
+        self.recert_timer.start(RECERT_CHECK_MS)
+        QTimer.singleShot(0, self.check_recertification)
+
+        theme.mark_page(self, theme.PAGE_GRADIENT)
 
         # Main layout
         outer_layout = QVBoxLayout()
@@ -101,35 +205,112 @@ class HRApp(QWidget):
         self.setLayout(outer_layout)
 
     def init_db(self):
-       datafetching.createtables(self.conn)
+        datafetching.createtables(self.conn)
+        if migrations.notices:
+            QMessageBox.information(self, "Database Upgrade", "\n\n".join(migrations.notices))
+
+    def start_autoimport(self):
+        """(Re)start the folder watcher from the saved setting."""
+        if self.autoimporter is not None:
+            self.autoimporter.stop(timeout=5)
+            self.autoimporter = None
+        row = datafetching.run_query(self.conn, "SELECT value FROM settings WHERE key=?", (autoimport.FOLDER_SETTING,), fetchone=True)
+        if row and row[0] and os.path.isdir(row[0]):
+            # emit() is thread-safe; the slot runs on the GUI thread
+            self.autoimporter = autoimport.AutoImportService(datafetching.database_location(), row[0], self.import_relay.done.emit)
+            self.autoimporter.start()
+
+    def on_setting_change(self, change):
+        if change.ids is None or autoimport.FOLDER_SETTING in change.ids:
+            self.start_autoimport()
+
+    def on_auto_import(self, outcome):
+        print(f"Auto-import {os.path.basename(outcome['file'])}: {outcome['status']} ({outcome['detail']})")
+
+    def check_backup(self):
+        if self.backup_job is not None and self.backup_job.is_alive():
+            return
+        if backup.is_due(self.conn):
+            self.backup_job = backup.BackupJob(backup.scheduled_backup, on_done=self.backup_relay.done.emit)
+            self.backup_job.start()
+
+    def on_backup_done(self, outcome):
+        result, error = outcome
+        if error is not None:
+            print(f"Scheduled backup failed: {error}")
+        else:
+            print(f"Backed up to {result[0]}")
 
+    def check_recertification(self):
+        if not recertification.sweep_is_due(self.conn):
+            return
+        try:
+            recertification.reopen_expired(self.conn)
+        except sqlite3.Error as e:
+            print(f"Recertification sweep failed: {e}")
+
+    def closeEvent(self, event):
+        if self.autoimporter is not None:
+            self.autoimporter.stop(timeout=5)
+        if self.api_server is not None:
+            self.api_server.shutdown()
+            self.api_server.server_close()
+        super().closeEvent(event)
+
+    def _bring_to_front(self, page):
+        page.showMaximized()
+        page.raise_()
+        page.activateWindow()
+
+    @profiling.profiled("openEmployees")
     def openEmployees(self):
         try:
-            self.subpageemployee = EmployeePage()
-            self.subpageemployee.showMaximized()
-            self.subpageemployee.show()
+            if self.subpageemployee is None:
+                self.subpageemployee = EmployeePage(self.conn)
+            else:
+                self.subpageemployee.show_employees()  # only changed rows are redrawn
+            self._bring_to_front(self.subpageemployee)
         except Exception as e:
             QMessageBox.critical(self, "Loading", f"Failed to load employees:\n{e}")
 
+    @profiling.profiled("openTrainings")
     def openTrainings(self):
         try:
-            self.subpagetraining = TrainingPage()
-            self.subpagetraining.showMaximized()
-            self.subpagetraining.show()
+            if self.subpagetraining is None:
+                self.subpagetraining = TrainingPage(self.conn)
+            else:
+                self.subpagetraining.show_trainings()
+            self._bring_to_front(self.subpagetraining)
         except Exception as e:
             QMessageBox.critical(self, "Loading", f"Failed to load trainings:\n{e}")
 
+    @profiling.profiled("openInfo")
     def openInfo(self):
         try:
-            self.subpageinfo = InfoPage()
-            self.subpageinfo.showMaximized()
-            self.subpageinfo.show()
+            if self.subpageinfo is None:
+                self.subpageinfo = InfoPage(self.conn)
+            else:
+                self.subpageinfo.load_info()
+            self._bring_to_front(self.subpageinfo)
         except Exception as e:
             QMessageBox.critical(self, "Loading", f"Failed to load info:\n{e}")
 
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
+    # Batch imports parse files in worker processes; a frozen (PyInstaller)
+    # build must let those children run the worker instead of the GUI.
+    multiprocessing.freeze_support()
+
+    # --db overrides HR_APP_DB and the per-user default; Qt gets the rest
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--db", help="database file, or :memory: for a throwaway database")
+    args, qt_args = parser.parse_known_args()
+    if args.db:
+        datafetching.configure_database(args.db)
+
+    app = QApplication(sys.argv[:1] + qt_args)
+    theme.apply(app)
+    watchdog = profiling.install_watchdog(app)
     window = HRApp()
     window.show()
     sys.exit(app.exec())
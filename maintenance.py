@@ -0,0 +1,147 @@
+# maintenance.py
+#
+# Housekeeping that keeps a long-lived database fast: planner statistics,
+# returning free pages to the file system, WAL checkpoints and a quick
+# integrity check. The app runs it when the GUI has been idle for a while
+# (see main.IdleMaintenance); it can also be run by hand:
+#   python maintenance.py [--db path] [--report] [--convert]
+# Idle runs only ever return free pages incrementally. A database created
+# before auto_vacuum=INCREMENTAL was set needs one full VACUUM first, which
+# rewrites the whole file and blocks writers meanwhile, so that is an
+# explicit admin action (--convert) done while nobody else is using it.
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+import datafetching
+
+# settings key with the time of the last completed run
+LAST_RUN_SETTING = "maintenance_last_run"
+# Run at most this often from the idle scheduler
+INTERVAL = timedelta(hours=24)
+# Free pages returned per run; the rest go on the next run
+VACUUM_PAGES = 2000
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+def report(conn):
+    """Size and fragmentation figures for the database behind `conn`."""
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    journal = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    database = conn.execute("PRAGMA database_list").fetchone()[2]
+    wal_bytes = 0
+    if database and os.path.exists(database + "-wal"):
+        wal_bytes = os.path.getsize(database + "-wal")
+    return {
+        "size_bytes": page_size * page_count,
+        "free_bytes": page_size * free_pages,
+        "fragmentation": free_pages / page_count if page_count else 0.0,
+        "journal_mode": journal,
+        "wal_bytes": wal_bytes,
+        "auto_vacuum": conn.execute("PRAGMA auto_vacuum").fetchone()[0],
+    }
+
+
+def format_report(info):
+    mb = 1024 * 1024
+    return (
+        f"Size: {info['size_bytes'] / mb:.2f} MB, free: {info['free_bytes'] / mb:.2f} MB "
+        f"({info['fragmentation']:.0%}), journal: {info['journal_mode']}, WAL: {info['wal_bytes'] / mb:.2f} MB"
+    )
+
+
+def is_due(conn, interval=INTERVAL):
+    return datafetching.is_due(conn, LAST_RUN_SETTING, interval)
+
+
+def run(conn, vacuum_pages=VACUUM_PAGES, convert=False):
+    """Run one maintenance pass. Returns a dict of what was done and found.
+
+    convert switches a database to auto_vacuum=INCREMENTAL with a full
+    VACUUM; without it such a database gets no vacuum and
+    result["needs_conversion"] is True.
+
+    Raises sqlite3.ProgrammingError if `conn` has a transaction open:
+    VACUUM and checkpoints need the connection idle, and committing the
+    caller's half-done writes is not ours to do.
+    """
+    if conn.in_transaction:
+        raise sqlite3.ProgrammingError("maintenance.run() called with a transaction already open")
+    started = time.perf_counter()
+    result = {"before": report(conn)}
+
+    # 1) Integrity first: no point tuning a damaged file
+    problems = [row[0] for row in conn.execute("PRAGMA quick_check")]
+    result["quick_check"] = problems
+    if problems != ["ok"]:
+        result["seconds"] = time.perf_counter() - started
+        return result
+
+    # 2) Planner statistics. ANALYZE once if there are none yet, then let
+    #    PRAGMA optimize decide what is stale.
+    has_stats = conn.execute("SELECT 1 FROM sqlite_master WHERE name='sqlite_stat1'").fetchone()
+    if not has_stats:
+        conn.execute("ANALYZE")
+    conn.execute("PRAGMA optimize")
+
+    # 3) Give free pages back. Incremental vacuum needs auto_vacuum=INCREMENTAL,
+    #    which an existing file only picks up through one full VACUUM.
+    result["needs_conversion"] = False
+    if result["before"]["auto_vacuum"] == AUTO_VACUUM_INCREMENTAL:
+        # executescript steps the pragma to completion; execute() would free one page
+        conn.executescript(f"PRAGMA incremental_vacuum({int(vacuum_pages)});")
+    elif convert:
+        conn.execute(f"PRAGMA auto_vacuum={AUTO_VACUUM_INCREMENTAL}")
+        conn.execute("VACUUM")
+    else:
+        result["needs_conversion"] = True
+
+    # 4) Fold the WAL back into the main file and shrink it
+    if result["before"]["journal_mode"] == "wal":
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+
+    datafetching.set_setting(conn, LAST_RUN_SETTING, datetime.now().isoformat(timespec="seconds"))
+    result["after"] = report(conn)
+    result["seconds"] = time.perf_counter() - started
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Optimise, vacuum and check the HR database.")
+    parser.add_argument("--db", default=None, help="database file (default: $HR_APP_DB or the app's database)")
+    parser.add_argument("--report", action="store_true", help="only print size and fragmentation")
+    parser.add_argument("--convert", action="store_true",
+                        help="one-time full VACUUM to enable incremental vacuum (close the app first)")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        datafetching.configure_database(args.db)
+    conn = datafetching.connect()
+    try:
+        datafetching.createtables(conn)
+        if args.report:
+            print(format_report(report(conn)))
+            return 0
+        result = run(conn, convert=args.convert)
+        print(f"Before: {format_report(result['before'])}")
+        if result["quick_check"] != ["ok"]:
+            print("Integrity check failed:")
+            print("\n".join(result["quick_check"]))
+            return 1
+        print(f"After:  {format_report(result['after'])}")
+        if result["needs_conversion"]:
+            print("Free pages are not returned until the database is converted once: run with --convert.")
+        print(f"Done in {result['seconds']:.2f}s")
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,373 @@
+# migrations.py
+#
+# Schema versioning. The database records how many of MIGRATIONS it has had
+# applied in PRAGMA user_version; migrate() runs the missing ones in order,
+# each in its own transaction, so once a database is current the startup
+# check is a single PRAGMA read.
+#
+# To change the schema, append a function to MIGRATIONS. Never edit or reorder
+# one that has shipped.
+import json
+
+import datafetching
+
+# Things the last migrate() run did that the user should hear about
+notices = []
+
+
+def ensure_column(conn, table, column, declaration, schema="main"):
+    """Add `column` to an existing table if an older database lacks it.
+
+    schema names an ATTACHed database (e.g. the archive) instead of main.
+    """
+    columns = {row[1] for row in conn.execute(f'PRAGMA {schema}.table_info("{table}")')}
+    if column not in columns:
+        conn.execute(f'ALTER TABLE {schema}."{table}" ADD COLUMN {column} {declaration}')
+
+
+def roster_tables(conn):
+    """[(training_id, table_name)] for every training whose table exists."""
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    return [
+        (t_id, table_name)
+        for t_id, name in conn.execute("SELECT id, name FROM trainings").fetchall()
+        if (table_name := datafetching.training_table(t_id, name)) in existing
+    ]
+
+
+def _v1_core_tables(conn):
+    """Everything createtables used to (re)create on every call.
+
+    Written with IF NOT EXISTS / ensure_column so it also adopts databases
+    created before versioning existed.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS company_info (
+            id INTEGER PRIMARY KEY,
+            name TEXT,
+            type TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS departments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS employees (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            company_id TEXT,
+            name TEXT,
+            job TEXT,
+            department TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS trainings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            description TEXT,
+            departments TEXT
+        )
+    """)
+    conn.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT)")
+    # One row per file the watched-folder import has processed
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS import_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            file_name TEXT,
+            sha256 TEXT UNIQUE,
+            kind TEXT,
+            status TEXT,
+            detail TEXT,
+            imported_at TEXT
+        )
+    """)
+
+    # Per-row content hashes let re-imports skip unchanged records
+    ensure_column(conn, "employees", "content_hash", "TEXT")
+    ensure_column(conn, "trainings", "content_hash", "TEXT")
+
+    # One employee per company id (imports upsert on it). Older databases may
+    # hold duplicates from re-imports; keep the newest row and set the others
+    # aside in duplicate_employees rather than losing them.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS duplicate_employees (
+            id INTEGER,
+            company_id TEXT,
+            name TEXT,
+            job TEXT,
+            department TEXT,
+            removed_at TEXT
+        )
+    """)
+    duplicates = """
+        company_id IS NOT NULL
+        AND id NOT IN (SELECT MAX(id) FROM employees WHERE company_id IS NOT NULL GROUP BY company_id)
+    """
+    removed = conn.execute(f"""
+        INSERT INTO duplicate_employees (id, company_id, name, job, department, removed_at)
+        SELECT id, company_id, name, job, department, datetime('now', 'localtime') FROM employees
+        WHERE {duplicates}
+    """).rowcount
+    conn.execute(f"DELETE FROM employees WHERE {duplicates}")
+    if removed:
+        notices.append(
+            f"Duplicate employee records (same Company ID) removed: {removed}. The newest record of "
+            "each employee was kept; the removed rows are kept in the duplicate_employees table."
+        )
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_employees_company_id ON employees(company_id)")
+
+
+def _v2_indexes(conn):
+    """Indexes for the hot lookups: employees by department, rosters by employee."""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_employees_department ON employees(department)")
+    for _, table_name in roster_tables(conn):
+        datafetching.create_roster_index(conn, table_name)
+
+
+def _v3_status_codes(conn):
+    """Integer status codes backed by a statuses lookup table.
+
+    Every roster is rebuilt with an INTEGER status column; old strings map
+    onto the canonical set ("Not Started" -> Pending, "Not Needed" -> Not
+    Required) and anything unrecognised becomes Pending.
+    """
+    conn.execute("CREATE TABLE IF NOT EXISTS statuses (code INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)")
+    conn.executemany("INSERT OR REPLACE INTO statuses (code, name) VALUES (?, ?)", datafetching.STATUSES.items())
+
+    mapping = {name.lower(): code for code, name in datafetching.STATUSES.items()}
+    mapping.update(datafetching.STATUS_ALIASES)
+    mapping = json.dumps(mapping)
+    for _, table_name in roster_tables(conn):
+        old = f"{table_name}__v2"
+        conn.execute(f'ALTER TABLE "{table_name}" RENAME TO "{old}"')
+        conn.execute(f'DROP INDEX IF EXISTS "idx_{table_name}_employee_id"')
+        # Spelled out rather than create_training_table(), which keeps growing
+        conn.execute(f"""
+            CREATE TABLE "{table_name}" (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                employee_id TEXT,
+                employee_name TEXT,
+                department TEXT,
+                status INTEGER NOT NULL DEFAULT {datafetching.PENDING} REFERENCES statuses(code)
+            )
+        """)
+        datafetching.create_roster_index(conn, table_name)
+        datafetching.create_open_index(conn, table_name)
+        conn.execute(f"""
+            INSERT INTO "{table_name}" (id, employee_id, employee_name, department, status)
+            SELECT o.id, o.employee_id, o.employee_name, o.department,
+                   CASE WHEN typeof(o.status) = 'integer' THEN o.status
+                        ELSE COALESCE((SELECT m.value FROM json_each(?) AS m WHERE m.key = lower(trim(o.status))), ?) END
+            FROM "{old}" AS o
+        """, (mapping, datafetching.PENDING))
+        conn.execute(f'DROP TABLE "{old}"')
+
+
+def _v4_due_dates(conn):
+    """Validity periods on trainings; completion and due dates on enrollments.
+
+    Existing completions get no date (nobody recorded when they happened),
+    so they only start expiring after their next completion.
+    """
+    ensure_column(conn, "trainings", "validity_months", "INTEGER")
+    for _, table_name in roster_tables(conn):
+        ensure_column(conn, table_name, "completed_at", "TEXT")
+        ensure_column(conn, table_name, "due_date", "TEXT")
+        datafetching.create_due_index(conn, table_name)
+        datafetching.create_completion_trigger(conn, table_name)
+
+
+def _v5_enrollment_events(conn):
+    """Append-only log of enrollment status changes plus a per-day rollup.
+
+    enrollment_daily is kept current by a trigger on the log, so reports
+    over a date range read one row per day instead of replaying events.
+    History before this version was not recorded and is not invented.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS enrollment_events (
+            id INTEGER PRIMARY KEY,
+            training_id INTEGER NOT NULL,
+            row_id INTEGER,
+            employee_id TEXT,
+            old_status INTEGER,
+            new_status INTEGER NOT NULL,
+            changed_at TEXT NOT NULL,
+            changed_by TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_enrollment_events_training ON enrollment_events(training_id, changed_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_enrollment_events_employee ON enrollment_events(employee_id, changed_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_enrollment_events_changed_at ON enrollment_events(changed_at)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS enrollment_daily (
+            day TEXT NOT NULL,
+            training_id INTEGER NOT NULL,
+            status INTEGER NOT NULL,
+            changes INTEGER NOT NULL,
+            PRIMARY KEY (day, training_id, status)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_enrollment_events_daily
+        AFTER INSERT ON enrollment_events
+        BEGIN
+            INSERT INTO enrollment_daily (day, training_id, status, changes)
+            VALUES (substr(NEW.changed_at, 1, 10), NEW.training_id, NEW.new_status, 1)
+            ON CONFLICT (day, training_id, status) DO UPDATE SET changes = changes + 1;
+        END
+    """)
+    # The log is append-only
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_enrollment_events_no_update
+        BEFORE UPDATE ON enrollment_events
+        BEGIN
+            SELECT RAISE(ABORT, 'enrollment_events is append-only');
+        END
+    """)
+    for _, table_name in roster_tables(conn):
+        ensure_column(conn, table_name, "updated_by", "TEXT")
+        datafetching.create_event_triggers(conn, table_name)
+
+
+def _v6_row_versions(conn):
+    """row_version on employees, trainings and rosters for optimistic edits.
+
+    Existing rows start at 1; a trigger per table moves the version on for
+    writers that do not bump it themselves (see datafetching.update_versioned).
+    """
+    for table_name in ["employees", "trainings"] + [t for _, t in roster_tables(conn)]:
+        ensure_column(conn, table_name, "row_version", "INTEGER NOT NULL DEFAULT 1")
+        datafetching.create_version_trigger(conn, table_name)
+
+
+def _v7_event_log_guards(conn):
+    """Make enrollment_events append-only against DELETE as well as UPDATE.
+
+    The one column that may still change is employee_id, so a corrected
+    company id carries the employee's history along
+    (enrollments.rename_on_rosters).
+    """
+    conn.execute("DROP TRIGGER IF EXISTS trg_enrollment_events_no_update")
+    conn.execute("""
+        CREATE TRIGGER trg_enrollment_events_no_update
+        BEFORE UPDATE OF id, training_id, row_id, old_status, new_status, changed_at, changed_by
+        ON enrollment_events
+        BEGIN
+            SELECT RAISE(ABORT, 'enrollment_events is append-only');
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_enrollment_events_no_delete
+        BEFORE DELETE ON enrollment_events
+        BEGIN
+            SELECT RAISE(ABORT, 'enrollment_events is append-only');
+        END
+    """)
+
+
+def _v8_text_roster_ids(conn):
+    """Store roster employee_id as TEXT, like the employees.company_id it holds.
+
+    Rosters declared it INTEGER, which turned company ids such as "007"
+    into 7. Every roster is rebuilt; an integer id (or its digits, where
+    _v3_status_codes() already copied it into a TEXT column) that matches
+    no company id is mapped back onto the one all-digit company id with
+    that value, if there is exactly one. The employee_id copied into
+    enrollment_events is corrected from the rebuilt rows.
+    """
+    for t_id, table_name in roster_tables(conn):
+        old = f"{table_name}__v7"
+        conn.execute(f'ALTER TABLE "{table_name}" RENAME TO "{old}"')
+        # Indexes and triggers moved along with the rename; the new table gets fresh ones
+        for kind, name in conn.execute(
+            "SELECT type, name FROM sqlite_master WHERE tbl_name=? AND type IN ('index', 'trigger') AND sql IS NOT NULL",
+            (old,)
+        ).fetchall():
+            conn.execute(f'DROP {kind.upper()} "{name}"')
+        # Spelled out as in _v3_status_codes(); triggers are only added after the copy
+        conn.execute(f"""
+            CREATE TABLE "{table_name}" (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                employee_id TEXT,
+                employee_name TEXT,
+                department TEXT,
+                status INTEGER NOT NULL DEFAULT {datafetching.PENDING} REFERENCES statuses(code),
+                completed_at TEXT,
+                due_date TEXT,
+                updated_by TEXT,
+                row_version INTEGER NOT NULL DEFAULT 1
+            )
+        """)
+        conn.execute(f"""
+            INSERT INTO "{table_name}"
+                (id, employee_id, employee_name, department, status, completed_at, due_date, updated_by, row_version)
+            SELECT o.id,
+                   CASE WHEN typeof(o.employee_id) = 'integer'
+                          OR (o.employee_id GLOB '[0-9]*' AND NOT o.employee_id GLOB '*[^0-9]*'
+                              AND NOT EXISTS (SELECT 1 FROM employees WHERE company_id = o.employee_id))
+                   THEN COALESCE(
+                       (SELECT CASE WHEN COUNT(*) = 1 THEN MAX(e.company_id) END FROM employees AS e
+                        WHERE e.company_id GLOB '[0-9]*' AND NOT e.company_id GLOB '*[^0-9]*'
+                          AND CAST(e.company_id AS INTEGER) = CAST(o.employee_id AS INTEGER)),
+                       CAST(o.employee_id AS TEXT))
+                   ELSE o.employee_id END,
+                   o.employee_name, o.department, o.status, o.completed_at, o.due_date, o.updated_by, o.row_version
+            FROM "{old}" AS o
+        """)
+        # Keep AUTOINCREMENT from reusing ids the event log refers to
+        conn.execute("DELETE FROM sqlite_sequence WHERE name = ?", (table_name,))
+        conn.execute("UPDATE sqlite_sequence SET name = ? WHERE name = ?", (table_name, old))
+        conn.execute(f'DROP TABLE "{old}"')
+        datafetching.create_training_table(conn, table_name)
+
+        conn.execute(f"""
+            UPDATE enrollment_events SET employee_id = r.employee_id
+            FROM "{table_name}" AS r
+            WHERE enrollment_events.training_id = ? AND enrollment_events.row_id = r.id
+              AND enrollment_events.employee_id IS NOT r.employee_id
+              AND enrollment_events.employee_id = CAST(CAST(r.employee_id AS INTEGER) AS TEXT)
+        """, (t_id,))
+
+
+MIGRATIONS = [
+    _v1_core_tables,
+    _v2_indexes,
+    _v3_status_codes,
+    _v4_due_dates,
+    _v5_enrollment_events,
+    _v6_row_versions,
+    _v7_event_log_guards,
+    _v8_text_roster_ids,
+]
+
+LATEST = len(MIGRATIONS)
+
+
+def migrate(conn):
+    """Apply pending migrations; returns the resulting schema version."""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= LATEST:
+        return version
+
+    conn.commit()  # each step needs a transaction of its own
+    notices.clear()
+    if version == 0:
+        # Only takes effect on a brand-new file (before the first table), so
+        # new databases never need maintenance.py's one-time --convert VACUUM
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    for number, step in enumerate(MIGRATIONS[version:], start=version + 1):
+        conn.execute("BEGIN")
+        try:
+            step(conn)
+            conn.execute(f"PRAGMA user_version = {number}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    for notice in notices:
+        print(notice)
+    return LATEST
@@ -1,7 +1,14 @@
 # objects.py
 
-from PyQt6.QtGui import QFont, QColor
-from PyQt6.QtWidgets import QPushButton, QLabel, QGraphicsDropShadowEffect, QFrame, QTableWidget, QDialog, QVBoxLayout
+from functools import lru_cache
+
+from PyQt6.QtCore import Qt, QEvent, QPoint, QRectF, QObject, pyqtSignal
+from PyQt6.QtGui import QFont, QColor, QImage, QPainter, QPixmap
+from PyQt6.QtWidgets import (
+    QPushButton, QLabel, QFrame, QTableWidget, QDialog, QVBoxLayout, QWidget,
+    QGraphicsScene, QGraphicsPixmapItem, QGraphicsBlurEffect,
+    QTextEdit, QCheckBox, QDialogButtonBox, QMessageBox
+)
 
 # 🎨 Colour palette (from your scheme)
 COLOR_PRIMARY_DARK = "#031716"  # Almost black, good for text or headers
@@ -18,66 +25,144 @@ SECONDARY_COLOR    = COLOR_MINT
 ACCENT_COLOR       = COLOR_LIGHT_BLUE
 TEXT_COLOR         = "#FFFFFF"  # White text for contrast
 
+# The widgets below only tag themselves with a "variant" property; their QSS
+# lives in theme.stylesheet(), which main.py installs once on the QApplication.
+
 # 📝 Fonts
 HEADER_FONT = QFont("Arial", 14, QFont.Weight.Bold)
 BODY_FONT   = QFont("Arial", 11)
 SMALL_FONT  = QFont("Arial", 9)
 
-def apply_card_shadow(widget):
-        shadow = QGraphicsDropShadowEffect()
-        shadow.setBlurRadius(25)   # softness
-        shadow.setXOffset(0)       # horizontal offset
-        shadow.setYOffset(5)       # vertical offset
-        shadow.setColor(QColor(0, 0, 0, 150))  # RGBA (black with transparency)
-        widget.setGraphicsEffect(shadow)
+# 🌑 Shadow look (matches the old QGraphicsDropShadowEffect settings)
+SHADOW_BLUR     = 25                      # softness
+SHADOW_OFFSET   = QPoint(0, 5)            # horizontal / vertical offset
+SHADOW_COLOR    = QColor(0, 0, 0, 150)    # RGBA (black with transparency)
+
+
+# Only a handful of sizes are worth sharing (rows of same-size buttons);
+# each CachedShadow keeps its own pixmap anyway, and a resized window would
+# otherwise leave a trail of full-window blurs behind in the cache.
+SHADOW_CACHE_SIZE = 8
+
+
+@lru_cache(maxsize=SHADOW_CACHE_SIZE)
+def _shadow_pixmap(width, height, radius):
+    """Blur a rounded rect once per (size, radius); shared by same-size shadows."""
+    margin = SHADOW_BLUR
+    source = QImage(width + 2 * margin, height + 2 * margin, QImage.Format.Format_ARGB32_Premultiplied)
+    source.fill(Qt.GlobalColor.transparent)
+    painter = QPainter(source)
+    painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+    painter.setPen(Qt.PenStyle.NoPen)
+    painter.setBrush(SHADOW_COLOR)
+    painter.drawRoundedRect(QRectF(margin, margin, width, height), radius, radius)
+    painter.end()
+
+    # Let Qt's blur run a single time off-screen, then keep the result.
+    scene = QGraphicsScene()
+    item = QGraphicsPixmapItem(QPixmap.fromImage(source))
+    blur = QGraphicsBlurEffect()
+    blur.setBlurRadius(SHADOW_BLUR)
+    item.setGraphicsEffect(blur)
+    scene.addItem(item)
+
+    result = QImage(source.size(), QImage.Format.Format_ARGB32_Premultiplied)
+    result.fill(Qt.GlobalColor.transparent)
+    painter = QPainter(result)
+    scene.render(painter, QRectF(result.rect()), QRectF(source.rect()))
+    painter.end()
+    return QPixmap.fromImage(result)
+
+
+class CachedShadow(QWidget):
+    """Pre-rendered drop shadow painted underneath `target` by its parent.
+
+    Replaces a live QGraphicsDropShadowEffect, which re-blurs the widget on
+    every repaint. The blurred pixmap is only rebuilt when the target's
+    size changes; moves just reposition it. Follows the target through
+    reparenting (e.g. when it is added to a layout after construction).
+    """
+
+    def __init__(self, target, radius):
+        super().__init__(target.parentWidget())
+        self.target = target
+        self.radius = radius
+        self._pixmap = None
+        self.setAttribute(Qt.WidgetAttribute.WA_TransparentForMouseEvents)
+        self.hide()
+        target.installEventFilter(self)
+
+    def eventFilter(self, obj, event):
+        kind = event.type()
+        if kind == QEvent.Type.ParentChange:
+            self.setParent(self.target.parentWidget())
+            self._sync()
+        elif kind in (QEvent.Type.Move, QEvent.Type.Resize, QEvent.Type.Show):
+            self._sync()
+        elif kind == QEvent.Type.Hide:
+            self.hide()
+        return False
+
+    def _sync(self):
+        if self.parentWidget() is None:
+            return
+        margin = SHADOW_BLUR
+        geometry = self.target.geometry().adjusted(-margin, -margin, margin, margin)
+        self.setGeometry(geometry.translated(SHADOW_OFFSET))
+        self.stackUnder(self.target)
+        self.setVisible(self.target.isVisible())
+
+    def resizeEvent(self, event):
+        self._pixmap = None  # only a new size needs a new blur
+        super().resizeEvent(event)
+
+    def paintEvent(self, event):
+        if self._pixmap is None:
+            size = self.target.size()
+            self._pixmap = _shadow_pixmap(size.width(), size.height(), self.radius)
+        painter = QPainter(self)
+        painter.drawPixmap(0, 0, self._pixmap)
+        painter.end()
+
+
+def apply_card_shadow(widget, radius=15):
+    """Give `widget` the app's drop shadow.
+
+    Top-level windows (StyledDialog) are skipped: a graphics effect on a
+    window is clipped to the window itself, and the window manager already
+    draws their frame shadow.
+    """
+    if isinstance(widget, QDialog):
+        return None
+    widget._shadow = CachedShadow(widget, radius)
+    return widget._shadow
+
+class ThreadRelay(QObject):
+    """Hands results from a worker thread to the GUI thread.
+
+    Pass `relay.done.emit` to the worker as its callback (emit is thread-safe)
+    and connect `done` to a slot; the slot runs on the GUI thread.
+    """
+    done = pyqtSignal(object)
 
 # 🔘 Styled reusable button
 class StyledButton(QPushButton):
     def __init__(self, text, parent=None):
         super().__init__(text, parent)
         self.setFont(BODY_FONT)
-        self.setStyleSheet(f"""
-           QPushButton {{
-                background-color: {COLOR_TEAL};
-                color: white;
-                font-size: 18px;
-                font-weight: bold;
-                padding: 12px 20px;
-                border-radius: 10px;
-                text-align: left;
-                qproperty-iconSize: 28px;
-            }}
-            QPushButton:hover {{
-                background-color: {COLOR_MINT};
-            }}
-            QPushButton:pressed {{
-                background-color: {COLOR_SLATE};
-            }}
-        """)
+        self.setProperty("variant", "styled")
 
 # 🔖 Styled reusable label
 class HeaderLabel(QLabel):
     def __init__(self, text, parent=None):
         super().__init__(text, parent)
         self.setFont(HEADER_FONT)
-        self.setStyleSheet(f"""
-            color: {COLOR_LIGHT_BLUE};
-            font-size: 28px;
-            font-weight: bold;
-            padding: 20px;
-        """)
+        self.setProperty("variant", "header")
 
 class Card(QFrame):
     def __init__(self, parent = None):
         super().__init__(parent)
-        self.setStyleSheet(f"""
-            QFrame {{
-                background-color: rgba(255, 255, 255, 0.9);
-                border: 2px solid {COLOR_SLATE};
-                border-radius: 15px;
-                padding: 30px;
-            }}
-        """)
+        self.setProperty("variant", "card")
         apply_card_shadow(self)
 
 
@@ -86,89 +171,84 @@ class Table(QTableWidget):
     def __init__(self, parent = None):
         super().__init__(parent)
         self.setAlternatingRowColors(True)
-        self.setStyleSheet(f"""
-            QTableWidget {{
-                background-color: {COLOR_PRIMARY_DARK};
-                alternate-background-color: {COLOR_DARK_GREEN};
-                gridline-color: {COLOR_TEAL};
-                color: white;
-                border: none;
-                font-size: 14px;
-                selection-background-color: {COLOR_MINT};
-                selection-color: white;
-            }}
-            QHeaderView::section {{
-                background-color: {COLOR_SLATE};
-                color: white;
-                font-weight: bold;
-                border: none;
-                padding: 6px;
-            }}
-            QTableWidget::item {{
-                padding: 6px;
-            }}
-        """)
+        self.setProperty("variant", "table")
         self.horizontalHeader().setStretchLastSection(True)
         self.verticalHeader().setVisible(False)
         self.setShowGrid(False)
 
+    def _id_positions(self):
+        """Map the id text in column 0 to its current row index."""
+        positions = {}
+        for row in range(self.rowCount()):
+            item = self.item(row, 0)
+            if item is not None:
+                positions[item.text()] = row
+        return positions
+
+    def row_for_id(self, row_id):
+        """Return the row currently showing `row_id`, or -1."""
+        return self._id_positions().get(str(row_id), -1)
+
+    def sync_rows(self, rows, fill_row, only_ids=None):
+        """Bring the table in line with `rows`, keyed on the id in column 0.
+
+        Unchanged rows are left alone, changed rows are refilled in place and
+        new ids are appended, so cell widgets survive a refresh. Rows whose id
+        is missing from `rows` are removed; with `only_ids` only those ids are
+        considered, which lets callers refresh a handful of rows.
+        fill_row(row_index, values, is_new) writes one row.
+        """
+        incoming = {str(values[0]): tuple(values) for values in rows}
+        positions = self._id_positions()
+        if only_ids is None:
+            stale = [pos for key, pos in positions.items() if key not in incoming]
+        else:
+            stale = [positions[str(i)] for i in only_ids if str(i) in positions and str(i) not in incoming]
+
+        self.setUpdatesEnabled(False)
+        try:
+            if stale:
+                for pos in sorted(stale, reverse=True):
+                    self.removeRow(pos)
+                positions = self._id_positions()
+
+            for key, values in incoming.items():
+                pos = positions.get(key)
+                if pos is None:
+                    pos = self.rowCount()
+                    self.insertRow(pos)
+                    fill_row(pos, values, True)
+                elif self.item(pos, 0).data(Qt.ItemDataRole.UserRole) == values:
+                    continue
+                else:
+                    fill_row(pos, values, False)
+                self.item(pos, 0).setData(Qt.ItemDataRole.UserRole, values)
+        finally:
+            self.setUpdatesEnabled(True)
+
 class FloatingButton(QPushButton):
     def __init__(self, text, parent=None):
         super().__init__(text, parent)
         self.setFixedSize(60, 60)
-        self.setStyleSheet(f"""
-            QPushButton {{
-                border-radius: 30px;
-                background-color: {COLOR_TEAL};
-                color: white;
-                font-size: 26px;
-                font-weight: bold;
-                padding: 10px;
-            }}
-            QPushButton:hover {{
-                background-color: {COLOR_MINT};
-            }}
-        """)
+        self.setProperty("variant", "floating")
 
-        apply_card_shadow(self)
+        apply_card_shadow(self, radius=30)
 
 class ButtonFrame(QFrame):
     def __init__(self, parent = None):
         super().__init__(parent)
-        self.setStyleSheet(f"""
-            QFrame {{
-                background-color: {COLOR_DARK_GREEN};
-                border-radius: 8px;
-                padding: 8px;
-            }}
-        """)
+        self.setProperty("variant", "buttons")
 
 class TableStyledButton(QPushButton):
     def __init__(self, text, parent=None):
         super().__init__(text, parent)
         self.setFont(BODY_FONT)
-        self.setStyleSheet(f"""
-           QPushButton {{
-                background-color: {COLOR_TEAL};
-                color: white;
-                font-size: 12px;
-                font-weight: bold;
-                padding: 4px 8px;;
-                border-radius: 20px;
-                text-align: center;
-            }}
-            QPushButton:hover {{
-                background-color: {COLOR_MINT};
-            }}
-            QPushButton:pressed {{
-                background-color: {COLOR_SLATE};
-            }}
-        """)
+        self.setProperty("variant", "table")
 
 class StyledDialog(QDialog):
     """
     A reusable QDialog with consistent HR app styling.
-    Applies styles to all child widgets: QLabel, QLineEdit, QComboBox, QPushButton.
+    theme.stylesheet() styles its child widgets: QLabel, QLineEdit, QComboBox, QPushButton.
     """
     def __init__(self, parent=None, title="Dialog"):
         super().__init__(parent)
@@ -178,81 +258,62 @@ class StyledDialog(QDialog):
         self.main_layout = QVBoxLayout()
         self.setLayout(self.main_layout)
 
-        # Apply stylesheet to all common widgets in this dialog
-        self.setStyleSheet(f"""
-            QDialog {{
-                background-color: rgba(3, 47, 48, 0.95);  /* dark greenish */
-                border-radius: 12px;
-            }}
-            QLabel {{
-                color: white;
-                font-size: 14px;
-                font-weight: bold;
-            }}
-            QLineEdit, QTextEdit {{
-                background-color: {COLOR_DARK_GREEN};
-                color: white;
-                border: 1px solid {COLOR_TEAL};
-                border-radius: 6px;
-                padding: 6px;
-            }}
-            QLineEdit:focus, QTextEdit:focus {{
-                border: 1px solid {COLOR_MINT};
-            }}
-            QComboBox {{
-                background-color: {COLOR_DARK_GREEN};
-                color: white;
-                border: 1px solid {COLOR_TEAL};
-                border-radius: 6px;
-                padding: 6px;
-            }}
-            QComboBox:focus {{
-                border: 1px solid {COLOR_MINT};
-            }}
-            QComboBox QAbstractItemView {{
-                background-color: {COLOR_DARK_GREEN};
-                color: white;
-                selection-background-color: {COLOR_TEAL};
-                selection-color: white;
-                border: 1px solid {COLOR_TEAL};
-            }}
-            QPushButton {{
-                background-color: {COLOR_TEAL};
-                color: white;
-                font-weight: bold;
-                padding: 8px 16px;
-                border-radius: 8px;
-            }}
-            QPushButton:hover {{
-                background-color: {COLOR_MINT};
-            }}
-            QPushButton:pressed {{
-                background-color: {COLOR_SLATE};
-            }}
-            QFormLayout {{
-                spacing: 10px;
-                margin: 15px;
-            }}
-            QCheckBox {{
-                color: white;
-                font-size: 13px;
-                spacing: 5px;
-            }}
-            QCheckBox::indicator {{
-                width: 18px;
-                height: 18px;
-                border-radius: 4px;
-                border: 1px solid {COLOR_TEAL};
-                background-color: {COLOR_DARK_GREEN};
-            }}
-            QCheckBox::indicator:checked {{
-                background-color: {COLOR_TEAL};
-                border: 1px solid {COLOR_MINT};
-            }}
-            QCheckBox::indicator:unchecked:hover {{
-                border: 1px solid {COLOR_MINT};
-            }}
-        """)
-
-        # Optional: shadow for depth
-        apply_card_shadow(self)
\ No newline at end of file
+        self.setProperty("variant", "styled")
+
+        # Optional: shadow for depth (no-op for top-level dialogs)
+        apply_card_shadow(self)
+
+
+class ImportPreviewDialog(StyledDialog):
+    """
+    Dry-run report shown before an import writes anything.
+    options are (key, label, checked) checkboxes; read them back with option(key).
+    """
+    def __init__(self, summary, options=(), parent=None, title="Import Preview"):
+        super().__init__(parent, title)
+        self.resize(520, 420)
+
+        report = QTextEdit()
+        report.setReadOnly(True)
+        report.setPlainText(summary)
+        self.main_layout.addWidget(report)
+
+        self.checks = {}
+        for key, label, checked in options:
+            box = QCheckBox(label)
+            box.setChecked(checked)
+            self.checks[key] = box
+            self.main_layout.addWidget(box)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
+        buttons.button(QDialogButtonBox.StandardButton.Ok).setText("Import")
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        self.main_layout.addWidget(buttons)
+
+    def option(self, key):
+        """Whether checkbox `key` is ticked (False if it was not offered)."""
+        box = self.checks.get(key)
+        return box is not None and box.isChecked()
+
+
+def ask_archive_or_delete(parent, noun):
+    """
+    Archive / Delete / Cancel prompt for removing a record.
+    Returns "archive", "delete" or None.
+    """
+    box = QMessageBox(parent)
+    box.setWindowTitle("Confirm Delete")
+    box.setText(f"Archive this {noun} or delete it permanently?")
+    box.setInformativeText("Archiving keeps the enrollment history in the archive database.")
+    archive = box.addButton("Archive", QMessageBox.ButtonRole.AcceptRole)
+    delete = box.addButton("Delete", QMessageBox.ButtonRole.DestructiveRole)
+    box.addButton(QMessageBox.StandardButton.Cancel)
+    box.setDefaultButton(archive)
+    box.exec()
+    clicked = box.clickedButton()
+    if clicked is archive:
+        return "archive"
+    if clicked is delete:
+        return "delete"
+    return None
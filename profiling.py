@@ -0,0 +1,138 @@
+# Opt-in diagnostics: event-loop stall watchdog and per-action cProfile hook.
+#
+# Both are switched on with environment variables so normal runs pay nothing:
+#   HR_APP_WATCHDOG_MS=250        report GUI stalls longer than 250 ms
+#   HR_APP_PROFILE_DIR=C:\prof    write one .pstats file per profiled action
+import cProfile
+import functools
+import inspect
+import os
+import sys
+import threading
+import time
+import traceback
+from datetime import datetime
+
+from PyQt6.QtCore import QObject, QTimer
+
+WATCHDOG_ENV = "HR_APP_WATCHDOG_MS"
+PROFILE_ENV = "HR_APP_PROFILE_DIR"
+
+# How often the GUI thread reports that it is alive.
+HEARTBEAT_MS = 50
+
+
+def _trim_args(func, args):
+    """Drop extra positional args Qt passes to slots (e.g. `checked`)."""
+    try:
+        params = inspect.signature(func).parameters.values()
+    except (TypeError, ValueError):
+        return args
+    if any(p.kind == p.VAR_POSITIONAL for p in params):
+        return args
+    positional = [p for p in params if p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD)]
+    return args[:len(positional)]
+
+
+def profiled(action):
+    """Decorator that profiles a slot into `<action>_<timestamp>.pstats`.
+
+    When HR_APP_PROFILE_DIR is not set the function is returned unchanged.
+    """
+    out_dir = os.environ.get(PROFILE_ENV)
+
+    def decorator(func):
+        if not out_dir:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            args = _trim_args(func, args)
+            profiler = cProfile.Profile()
+            try:
+                return profiler.runcall(func, *args, **kwargs)
+            finally:
+                os.makedirs(out_dir, exist_ok=True)
+                stamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+                profiler.dump_stats(os.path.join(out_dir, f"{action}_{stamp}.pstats"))
+
+        return wrapper
+
+    return decorator
+
+
+class EventLoopWatchdog(QObject):
+    """Measure Qt event-loop latency and sample the GUI stack when it stalls.
+
+    A QTimer in the GUI thread records a heartbeat; a daemon thread checks
+    the heartbeat age and, once it exceeds `threshold_ms`, prints the GUI
+    thread's current Python stack (once per stall) to `stream`. stop()
+    reports the worst latency seen (max_latency).
+    """
+
+    def __init__(self, threshold_ms, stream=None, parent=None):
+        super().__init__(parent)
+        self.threshold = threshold_ms / 1000.0
+        self.stream = stream or sys.stderr
+        self.max_latency = 0.0
+        self._gui_thread_id = threading.get_ident()
+        self._last_beat = time.perf_counter()
+        self._reported = False
+        self._stop = threading.Event()
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(HEARTBEAT_MS)
+        self._timer.timeout.connect(self._beat)
+        self._monitor = threading.Thread(target=self._watch, name="event-loop-watchdog", daemon=True)
+
+    def start(self):
+        self._last_beat = time.perf_counter()
+        self._timer.start()
+        self._monitor.start()
+
+    def stop(self):
+        """Stop watching and report the worst latency seen."""
+        if self._stop.is_set():
+            return
+        self._timer.stop()
+        self._stop.set()
+        print(f"[watchdog] worst event-loop latency: {self.max_latency * 1000:.0f} ms", file=self.stream)
+
+    def _beat(self):
+        now = time.perf_counter()
+        # Anything beyond the timer interval is time the loop could not run.
+        latency = now - self._last_beat - HEARTBEAT_MS / 1000.0
+        self.max_latency = max(self.max_latency, latency)
+        if self._reported:
+            print(f"[watchdog] event loop resumed after {latency * 1000:.0f} ms", file=self.stream)
+        self._last_beat = now
+        self._reported = False
+
+    def _watch(self):
+        while not self._stop.wait(self.threshold / 2):
+            stalled_for = time.perf_counter() - self._last_beat
+            if stalled_for < self.threshold or self._reported:
+                continue
+            self._reported = True
+            frame = sys._current_frames().get(self._gui_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else "  <no frame>\n"
+            print(f"[watchdog] event loop stalled for {stalled_for * 1000:.0f} ms, GUI stack:\n{stack}",
+                  file=self.stream)
+
+
+def install_watchdog(app):
+    """Start an EventLoopWatchdog if HR_APP_WATCHDOG_MS is set, else return None."""
+    threshold = os.environ.get(WATCHDOG_ENV)
+    if not threshold:
+        return None
+    try:
+        threshold_ms = int(threshold)
+        if threshold_ms <= 0:
+            raise ValueError(threshold)  # a zero interval would spin the watchdog thread
+    except ValueError:
+        print(f"[watchdog] ignoring invalid {WATCHDOG_ENV}={threshold!r}", file=sys.stderr)
+        return None
+    watchdog = EventLoopWatchdog(threshold_ms, parent=app)
+    watchdog.start()
+    app.aboutToQuit.connect(watchdog.stop)
+    return watchdog
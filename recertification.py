@@ -0,0 +1,155 @@
+# recertification.py
+#
+# Trainings with a validity period (trainings.validity_months) expire: a
+# completion is good through its roster row's due_date, after which the
+# employee has to redo the training. Rosters stamp completed_at / due_date
+# themselves (see datafetching.create_completion_trigger); this module
+# reopens expired completions and lists what is overdue or due soon.
+#   python recertification.py [--db path] [--sweep] [--days 30]
+import argparse
+import sys
+from datetime import date, timedelta
+
+import datafetching
+import events
+import migrations
+
+# settings key with the date of the last expiry sweep
+LAST_RUN_SETTING = "recert_last_sweep"
+# "Due soon" horizon of the due view
+DUE_WITHIN_DAYS = 30
+
+OVERDUE = "Overdue"
+DUE_SOON = "Due soon"
+
+
+def _today(today=None):
+    return (today or date.today()).isoformat()
+
+
+def reopen_expired(conn, today=None):
+    """Set Completed enrollments whose due_date is before today back to Pending.
+
+    A completion is still good on its due_date, matching due_enrollments(),
+    which lists that day as due soon.
+
+    One UPDATE per roster, driven by the due_date index, all in one
+    write_transaction(). The due_date is kept, so reopened rows show up as
+    overdue. Returns {training_id: [row id, ...]} of the rows reopened.
+    """
+    cutoff = _today(today)
+    by = datafetching.actor("recertification")
+
+    def work(c):
+        reopened = {}
+        for t_id, table_name in migrations.roster_tables(c):
+            ids = [r[0] for r in c.execute(f"""
+                UPDATE "{table_name}" SET status = {datafetching.PENDING}, updated_by = ?
+                WHERE due_date < ? AND status = {datafetching.COMPLETED}
+                RETURNING id
+            """, (by, cutoff))]
+            if ids:
+                reopened[t_id] = ids
+                events.notify(events.ENROLLMENT, events.UPDATE, ids, t_id)
+        c.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (LAST_RUN_SETTING, cutoff))
+        return reopened
+
+    return datafetching.write_transaction(conn, work)
+
+
+def sweep_is_due(conn, today=None):
+    """True once per day: the sweep has not run yet today."""
+    row = datafetching.run_query(conn, "SELECT value FROM settings WHERE key=?", (LAST_RUN_SETTING,), fetchone=True)
+    return not row or row[0] < _today(today)
+
+
+def recompute_due_dates(conn, training_id, validity_months):
+    """Re-derive due dates of a training's completions after its validity changed.
+
+    Completions without a recorded date keep no due date. Runs in one
+    write_transaction(); returns the number of rows changed.
+    """
+    row = conn.execute("SELECT name FROM trainings WHERE id=?", (training_id,)).fetchone()
+    if not row:
+        return 0
+    table_name = datafetching.training_table(training_id, row[0])
+    return datafetching.write_transaction(conn, lambda c: update_due_dates(c, table_name, validity_months))
+
+
+def update_due_dates(conn, table_name, validity_months):
+    """recompute_due_dates() for one roster, inside the caller's transaction."""
+    new_due = "CASE WHEN :months > 0 THEN date(completed_at, '+' || :months || ' months') END"
+    changed = conn.execute(f"""
+        UPDATE "{table_name}" SET due_date = {new_due}
+        WHERE status = {datafetching.COMPLETED} AND completed_at IS NOT NULL
+          AND due_date IS NOT {new_due}
+    """, {"months": validity_months or 0}).rowcount
+    if changed:
+        events.notify(events.ENROLLMENT, events.UPDATE, None, datafetching.roster_training_id(table_name))
+    return changed
+
+
+def due_enrollments(conn, within_days=DUE_WITHIN_DAYS, today=None):
+    """Overdue and soon-due enrollments across all trainings, soonest first.
+
+    Overdue: Pending with a due date before today. Due soon: Pending or
+    Completed with a due date in the next `within_days` days. Built as one
+    UNION ALL statement over the rosters, each arm a range scan on its
+    due_date index (chunked by datafetching.union_all). Returns a list of dicts.
+    """
+    today = today or date.today()
+    start, end = _today(today), _today(today + timedelta(days=within_days))
+    arms = [
+        f"""
+            SELECT {t_id} AS training_id, id, employee_id, employee_name, department, status, due_date
+            FROM "{table_name}"
+            WHERE due_date <= :end AND status IN ({datafetching.PENDING}, {datafetching.COMPLETED})
+        """
+        for t_id, table_name in migrations.roster_tables(conn)
+    ]
+    names = dict(conn.execute("SELECT id, name FROM trainings"))
+    rows = datafetching.union_all(conn, arms, {"end": end})
+    rows.sort(key=lambda row: row[6])
+    result = []
+    for t_id, row_id, employee_id, name, department, status, due_date in rows:
+        if due_date < start and status != datafetching.PENDING:
+            continue  # expired but not swept yet; the next sweep reopens it
+        result.append({
+            "training_id": t_id,
+            "training": names.get(t_id, ""),
+            "row_id": row_id,
+            "employee_id": employee_id,
+            "employee_name": name,
+            "department": department,
+            "status": datafetching.status_name(status),
+            "due_date": due_date,
+            "state": OVERDUE if due_date < start else DUE_SOON,
+        })
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reopen expired trainings and list what is due.")
+    parser.add_argument("--db", default=None, help="database file (default: $HR_APP_DB or the app's database)")
+    parser.add_argument("--sweep", action="store_true", help="reopen expired completions first")
+    parser.add_argument("--days", type=int, default=DUE_WITHIN_DAYS, help="'due soon' horizon in days")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        datafetching.configure_database(args.db)
+    conn = datafetching.connect()
+    try:
+        datafetching.createtables(conn)
+        if args.sweep:
+            reopened = reopen_expired(conn)
+            print(f"Reopened {sum(len(ids) for ids in reopened.values())} expired completions")
+        for item in due_enrollments(conn, args.days):
+            print(f"{item['due_date']}  {item['state']:<8}  {item['training']}: "
+                  f"{item['employee_id']} {item['employee_name']} ({item['department']})")
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,23 @@
+# test_datafetching.py
+import pytest
+
+import datafetching
+import enrollments
+
+
+def test_update_versioned_rejects_stale_version(hr_db):
+    emp_id = enrollments.add_employee(hr_db, "E1", "Ada", "Engineer", "Lab")["id"]
+    version = datafetching.row_version_of(hr_db, "employees", emp_id)
+
+    new_version = datafetching.write_transaction(
+        hr_db, lambda c: datafetching.update_versioned(c, "employees", emp_id, version, {"job": "Lead"})
+    )
+    assert new_version > version
+
+    # A second editor still holding the old version must not overwrite the first
+    with pytest.raises(datafetching.ConflictError):
+        datafetching.write_transaction(
+            hr_db, lambda c: datafetching.update_versioned(c, "employees", emp_id, version, {"job": "Intern"})
+        )
+    assert hr_db.execute("SELECT job FROM employees WHERE id=?", (emp_id,)).fetchone() == ("Lead",)
+    assert not hr_db.in_transaction
@@ -0,0 +1,35 @@
+# test_departments.py
+import datafetching
+import departments
+import enrollments
+
+
+def _roster(conn, table_name):
+    return {
+        employee_id: status
+        for employee_id, status in conn.execute(f'SELECT employee_id, status FROM "{table_name}"')
+    }
+
+
+def test_merge_fans_out_enrollments(hr_db):
+    for name in ("Lab", "Ops"):
+        departments.add(hr_db, name)
+    enrollments.add_employee(hr_db, "L1", "Ada", "Engineer", "Lab")
+    moved = enrollments.add_employee(hr_db, "L2", "Grace", "Engineer", "Lab")["id"]
+    enrollments.add_employee(hr_db, "O1", "Linus", "Operator", "Ops")
+    training_id, _ = enrollments.add_training(hr_db, "Safety", "", ["Lab"], None)
+    table_name = datafetching.training_table(training_id, "Safety")
+
+    # Moving to Ops retires the Lab training
+    enrollments.move_employees(hr_db, [moved], "Ops")
+    assert _roster(hr_db, table_name) == {"L1": datafetching.PENDING, "L2": datafetching.NOT_REQUIRED}
+
+    result = departments.merge(hr_db, ["Ops"], "Lab")
+
+    # Everyone now in Lab is enrolled: the retired row reopens, the newcomer is added
+    assert _roster(hr_db, table_name) == {
+        "L1": datafetching.PENDING, "L2": datafetching.PENDING, "O1": datafetching.PENDING,
+    }
+    assert result["enrollments"][training_id] >= 2
+    assert [r[0] for r in hr_db.execute("SELECT name FROM departments")] == ["Lab"]
+    assert hr_db.execute("SELECT COUNT(*) FROM employees WHERE department='Ops'").fetchone()[0] == 0
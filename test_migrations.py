@@ -0,0 +1,42 @@
+# test_migrations.py
+import datafetching
+import migrations
+
+# A database as the app wrote it before schema versioning: status strings
+# and an INTEGER employee_id on the roster
+BASELINE = """
+    CREATE TABLE company_info (id INTEGER PRIMARY KEY, name TEXT, type TEXT);
+    CREATE TABLE departments (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE);
+    CREATE TABLE employees (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, company_id TEXT, name TEXT, job TEXT, department TEXT
+    );
+    CREATE TABLE trainings (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, description TEXT, departments TEXT);
+    CREATE TABLE settings (key TEXT PRIMARY KEY, value TEXT);
+    CREATE TABLE "Safety_1" (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, employee_id INTEGER, employee_name TEXT,
+        department TEXT, status TEXT DEFAULT 'Pending'
+    );
+    INSERT INTO departments (name) VALUES ('Ops');
+    INSERT INTO employees (company_id, name, job, department) VALUES ('007', 'Bond', 'Agent', 'Ops');
+    INSERT INTO employees (company_id, name, job, department) VALUES ('A12', 'Moneypenny', 'Assistant', 'Ops');
+    INSERT INTO trainings (name, description, departments) VALUES ('Safety', '', 'Ops');
+    INSERT INTO "Safety_1" (employee_id, employee_name, department, status) VALUES ('007', 'Bond', 'Ops', 'Completed');
+    INSERT INTO "Safety_1" (employee_id, employee_name, department, status) VALUES ('A12', 'Moneypenny', 'Ops', 'Not Started');
+"""
+
+
+def test_migrates_baseline_database(hr_db):
+    hr_db.execute("PRAGMA user_version = 0")
+    for (name,) in hr_db.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'").fetchall():
+        hr_db.execute(f'DROP TABLE "{name}"')
+    hr_db.executescript(BASELINE)
+
+    assert migrations.migrate(hr_db) == migrations.LATEST
+    rows = hr_db.execute('SELECT employee_id, status, row_version FROM "Safety_1" ORDER BY id').fetchall()
+    assert rows == [("007", datafetching.COMPLETED, 1), ("A12", datafetching.PENDING, 1)]
+    triggers = {r[0] for r in hr_db.execute("SELECT name FROM sqlite_master WHERE type='trigger' AND tbl_name='Safety_1'")}
+    assert "trg_Safety_1_log_status" in triggers
+    # Upgrading writes no history of its own
+    assert hr_db.execute("SELECT COUNT(*) FROM enrollment_events").fetchone()[0] == 0
+    # and a current database is left alone
+    assert migrations.migrate(hr_db) == migrations.LATEST
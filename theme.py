@@ -0,0 +1,249 @@
+# theme.py
+#
+# One application-wide stylesheet built from the objects palette. Widgets pick
+# their look through the "variant" / "page" dynamic properties instead of each
+# instance parsing its own QSS.
+from functools import lru_cache
+
+from PyQt6.QtCore import Qt
+
+import objects
+
+PAGE_GRADIENT = "gradient"
+PAGE_INFO = "info"
+
+
+@lru_cache(maxsize=None)
+def stylesheet():
+    """Return the application stylesheet (built once per process)."""
+    p = objects
+    return f"""
+        /* === Pages === */
+        QWidget[page="{PAGE_GRADIENT}"] {{
+            background: qlineargradient(
+                x1:0, y1:0, x2:1, y2:1,
+                stop:0 {p.COLOR_DARK_GREEN}, stop:0.5 {p.COLOR_TEAL}, stop:1 {p.COLOR_MINT}
+            );
+            font-family: Segoe UI, Arial, sans-serif;
+        }}
+        QWidget[page="{PAGE_GRADIENT}"] QScrollArea,
+        QWidget[page="{PAGE_GRADIENT}"] QScrollArea > QWidget > QWidget {{
+            background: transparent;
+            border: none;
+        }}
+
+        QWidget[page="{PAGE_INFO}"],
+        QWidget[page="{PAGE_INFO}"] QWidget {{
+            background-color: rgba(3, 47, 48, 0.95);
+        }}
+        QWidget[page="{PAGE_INFO}"] QLabel {{
+            color: white;
+            font-size: 14px;
+            font-weight: bold;
+        }}
+        QWidget[page="{PAGE_INFO}"] QLabel[variant="title"] {{
+            font-size: 20px;
+        }}
+        QWidget[page="{PAGE_INFO}"] QLineEdit {{
+            background-color: {p.COLOR_DARK_GREEN};
+            color: white;
+            border: 1px solid {p.COLOR_TEAL};
+            border-radius: 6px;
+            padding: 6px;
+        }}
+        QWidget[page="{PAGE_INFO}"] QLineEdit:read-only {{
+            background-color: rgba(3, 47, 48, 0.7);
+            color: #aaa;
+        }}
+        QWidget[page="{PAGE_INFO}"] QPushButton {{
+            background-color: {p.COLOR_TEAL};
+            color: white;
+            font-weight: bold;
+            padding: 8px 16px;
+            border-radius: 8px;
+        }}
+        QWidget[page="{PAGE_INFO}"] QPushButton:hover {{
+            background-color: {p.COLOR_MINT};
+        }}
+        QWidget[page="{PAGE_INFO}"] QPushButton:pressed {{
+            background-color: {p.COLOR_SLATE};
+        }}
+        QWidget[page="{PAGE_INFO}"] QScrollArea {{
+            border: none;
+        }}
+
+        /* === StyledButton === */
+        QPushButton[variant="styled"] {{
+            background-color: {p.COLOR_TEAL};
+            color: white;
+            font-size: 18px;
+            font-weight: bold;
+            padding: 12px 20px;
+            border-radius: 10px;
+            text-align: left;
+            qproperty-iconSize: 28px;
+        }}
+        QPushButton[variant="styled"]:hover {{
+            background-color: {p.COLOR_MINT};
+        }}
+        QPushButton[variant="styled"]:pressed {{
+            background-color: {p.COLOR_SLATE};
+        }}
+
+        /* === TableStyledButton === */
+        QPushButton[variant="table"] {{
+            background-color: {p.COLOR_TEAL};
+            color: white;
+            font-size: 12px;
+            font-weight: bold;
+            padding: 4px 8px;
+            border-radius: 20px;
+            text-align: center;
+        }}
+        QPushButton[variant="table"]:hover {{
+            background-color: {p.COLOR_MINT};
+        }}
+        QPushButton[variant="table"]:pressed {{
+            background-color: {p.COLOR_SLATE};
+        }}
+
+        /* === FloatingButton === */
+        QPushButton[variant="floating"] {{
+            border-radius: 30px;
+            background-color: {p.COLOR_TEAL};
+            color: white;
+            font-size: 26px;
+            font-weight: bold;
+            padding: 10px;
+        }}
+        QPushButton[variant="floating"]:hover {{
+            background-color: {p.COLOR_MINT};
+        }}
+
+        /* === HeaderLabel === */
+        QLabel[variant="header"] {{
+            color: {p.COLOR_LIGHT_BLUE};
+            font-size: 28px;
+            font-weight: bold;
+            padding: 20px;
+        }}
+
+        /* === Card / ButtonFrame === */
+        QFrame[variant="card"] {{
+            background-color: rgba(255, 255, 255, 0.9);
+            border: 2px solid {p.COLOR_SLATE};
+            border-radius: 15px;
+            padding: 30px;
+        }}
+        QFrame[variant="buttons"] {{
+            background-color: {p.COLOR_DARK_GREEN};
+            border-radius: 8px;
+            padding: 8px;
+        }}
+
+        /* === Table === */
+        QTableWidget[variant="table"] {{
+            background-color: {p.COLOR_PRIMARY_DARK};
+            alternate-background-color: {p.COLOR_DARK_GREEN};
+            gridline-color: {p.COLOR_TEAL};
+            color: white;
+            border: none;
+            font-size: 14px;
+            selection-background-color: {p.COLOR_MINT};
+            selection-color: white;
+        }}
+        QTableWidget[variant="table"] QHeaderView::section {{
+            background-color: {p.COLOR_SLATE};
+            color: white;
+            font-weight: bold;
+            border: none;
+            padding: 6px;
+        }}
+        QTableWidget[variant="table"]::item {{
+            padding: 6px;
+        }}
+
+        /* === StyledDialog (kept last so it wins inside pages) === */
+        QDialog[variant="styled"] {{
+            background-color: rgba(3, 47, 48, 0.95);
+            border-radius: 12px;
+        }}
+        QDialog[variant="styled"] QLabel {{
+            color: white;
+            font-size: 14px;
+            font-weight: bold;
+        }}
+        QDialog[variant="styled"] QLineEdit,
+        QDialog[variant="styled"] QTextEdit {{
+            background-color: {p.COLOR_DARK_GREEN};
+            color: white;
+            border: 1px solid {p.COLOR_TEAL};
+            border-radius: 6px;
+            padding: 6px;
+        }}
+        QDialog[variant="styled"] QLineEdit:focus,
+        QDialog[variant="styled"] QTextEdit:focus {{
+            border: 1px solid {p.COLOR_MINT};
+        }}
+        QDialog[variant="styled"] QComboBox {{
+            background-color: {p.COLOR_DARK_GREEN};
+            color: white;
+            border: 1px solid {p.COLOR_TEAL};
+            border-radius: 6px;
+            padding: 6px;
+        }}
+        QDialog[variant="styled"] QComboBox:focus {{
+            border: 1px solid {p.COLOR_MINT};
+        }}
+        QDialog[variant="styled"] QComboBox QAbstractItemView {{
+            background-color: {p.COLOR_DARK_GREEN};
+            color: white;
+            selection-background-color: {p.COLOR_TEAL};
+            selection-color: white;
+            border: 1px solid {p.COLOR_TEAL};
+        }}
+        QDialog[variant="styled"] QPushButton {{
+            background-color: {p.COLOR_TEAL};
+            color: white;
+            font-weight: bold;
+            padding: 8px 16px;
+            border-radius: 8px;
+        }}
+        QDialog[variant="styled"] QPushButton:hover {{
+            background-color: {p.COLOR_MINT};
+        }}
+        QDialog[variant="styled"] QPushButton:pressed {{
+            background-color: {p.COLOR_SLATE};
+        }}
+        QDialog[variant="styled"] QCheckBox {{
+            color: white;
+            font-size: 13px;
+            spacing: 5px;
+        }}
+        QDialog[variant="styled"] QCheckBox::indicator {{
+            width: 18px;
+            height: 18px;
+            border-radius: 4px;
+            border: 1px solid {p.COLOR_TEAL};
+            background-color: {p.COLOR_DARK_GREEN};
+        }}
+        QDialog[variant="styled"] QCheckBox::indicator:checked {{
+            background-color: {p.COLOR_TEAL};
+            border: 1px solid {p.COLOR_MINT};
+        }}
+        QDialog[variant="styled"] QCheckBox::indicator:unchecked:hover {{
+            border: 1px solid {p.COLOR_MINT};
+        }}
+    """
+
+
+def mark_page(widget, kind):
+    """Tag a top-level page so the page rules apply to it."""
+    widget.setProperty("page", kind)
+    # Plain QWidget subclasses only paint QSS backgrounds with this attribute.
+    widget.setAttribute(Qt.WidgetAttribute.WA_StyledBackground, True)
+
+
+def apply(app):
+    """Install the stylesheet on the QApplication. Call once at startup."""
+    app.setStyleSheet(stylesheet())
@@ -4,7 +4,7 @@ import os
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QPushButton,
     QTableWidget, QTableWidgetItem, QHBoxLayout, QLineEdit, QLabel, QMessageBox, QFormLayout,
-    QScrollArea, QDialogButtonBox, QTextEdit, QCheckBox, QFileDialog, QInputDialog
+    QScrollArea, QDialogButtonBox, QTextEdit, QCheckBox, QFileDialog, QSpinBox
 )
 from PyQt6.QtGui import QIcon
 from PyQt6.QtCore import Qt, QSize
@@ -12,28 +12,15 @@ from employee_trainings import EmployeeTrainingPages
 import pandas as pd
 from datetime import datetime
 import objects
+import theme
 import datafetching
-import re
-
-BANNED_CHARS = r'[;"\'\\/]'
-
-def sanitize_training_name(raw_name):
-    """
-    Returns a safe version of the training name for use in table names.
-    Raises ValueError if raw_name contains banned characters.
-    """
-    if re.search(BANNED_CHARS, raw_name):
-        raise ValueError(
-            f"Training name '{raw_name}' contains invalid characters.\n"
-            "Please remove ; \" ' \\ / and try again."
-        )
-
-    # Replace spaces and other non-alphanumeric characters with underscores
-    safe_name = "".join(c if c.isalnum() else "_" for c in raw_name)
-    # Avoid empty table names
-    if not safe_name:
-        safe_name = "training"
-    return safe_name
+from datafetching import sanitize_training_name
+import events
+import importers
+import archive
+import enrollments
+import recertification
+import profiling
 
 def resource_path(relative_path):
     """Get absolute path to resource, works for PyInstaller."""
@@ -44,85 +31,33 @@ def resource_path(relative_path):
         base_path = os.path.abspath(".")
     return os.path.join(base_path, relative_path)
 
-def db_path(relative_path):
-    appdata_path = os.path.join(os.environ["APPDATA"], "HR_App")
-    os.makedirs(appdata_path, exist_ok=True)
-
-    # Always use this path for the database
-    db_path = os.path.join(appdata_path, relative_path)
-    return db_path
-
-def handle_department(conn, dept, parent = None):
-    # Check if department exists
-    department = datafetching.run_query(
-        conn,
-        "SELECT name FROM departments WHERE name=?",
-        (dept,),
-        fetchone=True
-    )
-
-    if not department:
-        # Ask user if they want to add new dept
-        msg = QMessageBox()
-        msg.setWindowTitle("Department Missing")
-        msg.setText(f"Department '{dept}' was not found.")
-        msg.setInformativeText("Do you want to add it as a new department?")
-        msg.setStandardButtons(QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
-        msg.setDefaultButton(QMessageBox.StandardButton.No)
-
-        response = msg.exec()
-
-        if response == QMessageBox.StandardButton.Yes:
-            # Insert new department
-            try:
-                datafetching.run_query(
-                    conn,
-                    "INSERT INTO departments (name) VALUES (?)",
-                    (dept,),
-                    commit=True
-                )
-            except sqlite3.IntegrityError:
-                pass
-            QMessageBox.information(parent, "Success", f"Department '{dept}' added.")
-            return dept
-        else:
-            # Show list of existing departments for selection
-            all_departments = datafetching.run_query(conn, "SELECT name FROM departments")
-            dept_names = [d[0] for d in all_departments]
-
-            selected, ok = QInputDialog.getItem(
-                None,
-                "Select Department",
-                "Choose from existing departments:",
-                dept_names,
-                0,
-                False
-            )
+# Longest validity period the dialogs offer
+MAX_VALIDITY_MONTHS = 240
+
+def validity_text(months):
+    return f"{months} months" if months else "Never expires"
 
-            if ok and selected:
-                return selected
-            else:
-                return None  # user cancelled
-    else:
-        return dept
+def validity_spinbox(months=0):
+    """Validity period input; 0 means the training never expires."""
+    box = QSpinBox()
+    box.setRange(0, MAX_VALIDITY_MONTHS)
+    box.setSuffix(" months")
+    box.setSpecialValueText("Never expires")
+    box.setValue(months or 0)
+    return box
 
 class TrainingPage(QWidget):
-    def __init__(self):
+    def __init__(self, conn=None):
         super().__init__()
         self.setWindowTitle("HR Training Tracker")
-        self.setStyleSheet(f"""
-            QWidget {{
-                background: qlineargradient(
-                    x1:0, y1:0, x2:1, y2:1,
-                    stop:0 {objects.COLOR_DARK_GREEN}, stop:0.5 {objects.COLOR_TEAL}, stop:1 {objects.COLOR_MINT}
-                );
-                font-family: Segoe UI, Arial, sans-serif;
-            }}
-        """)
-
-        # Database setup
-        self.conn = sqlite3.connect(db_path("hr_app.db"))
-        self.create_tables()
+        theme.mark_page(self, theme.PAGE_GRADIENT)
+
+        # Database setup (reuse the main window's connection when given)
+        if conn is None:
+            conn = datafetching.connect(timeout=datafetching.GUI_BUSY_TIMEOUT)
+            datafetching.createtables(conn)
+        self.conn = conn
+        self.training_page = None
 
         # Layout
         self.main_layout = QVBoxLayout()
@@ -150,6 +85,10 @@ class TrainingPage(QWidget):
         self.export_trainings.clicked.connect(self.export_trainings_to_excel)
         btn_layout.addWidget(self.export_trainings)
 
+        self.btn_due = objects.StyledButton("Due / Overdue")
+        self.btn_due.clicked.connect(self.show_due_view)
+        btn_layout.addWidget(self.btn_due)
+
         # === Scroll Area ===
         scroll_area = QScrollArea()
         scroll_area.setWidgetResizable(True)
@@ -161,6 +100,8 @@ class TrainingPage(QWidget):
 
         # Table widget
         self.table = objects.Table()
+        self.table.setColumnCount(6)  # Extra column for button
+        self.table.setHorizontalHeaderLabels(["ID", "Name", "Description", "Departments", "Details", "Employees"])
         self.scroll_layout.addWidget(self.table)
 
         scroll_area.setWidget(scroll_content)
@@ -182,22 +123,36 @@ class TrainingPage(QWidget):
 
         self.show_trainings()
 
-
-    def create_tables(self):
-        datafetching.createtables(self.conn)
+        # Patch rows when trainings change anywhere in the app
+        events.subscribe(events.TRAINING, self._on_training_change)
 
 
+    @profiling.profiled("show_trainings")
     def show_trainings(self):
-        rows = datafetching.run_query(self.conn, "SELECT * FROM trainings")
+        """Sync the table with the trainings table; only changed rows are touched."""
+        rows = datafetching.run_query(self.conn, "SELECT id, name, description, departments FROM trainings")
+        self.table.sync_rows(rows, self._fill_training_row)
+
+    def refresh_trainings(self, training_ids):
+        """Re-read just `training_ids` and patch (or drop) their rows."""
+        rows = datafetching.run_query(
+            self.conn,
+            "SELECT id, name, description, departments FROM trainings WHERE id IN (SELECT value FROM json_each(?))",
+            (datafetching.id_list(training_ids),)
+        )
+        self.table.sync_rows(rows, self._fill_training_row, only_ids=training_ids)
 
-        self.table.setRowCount(len(rows))
-        self.table.setColumnCount(6)  # Extra column for button
-        self.table.setHorizontalHeaderLabels(["ID", "Name", "Description", "Departments", "Details", "Employees"])
+    def _on_training_change(self, change):
+        if change.ids is None:
+            self.show_trainings()
+        else:
+            self.refresh_trainings(change.ids)
 
-        for i, row in enumerate(rows):
-            for j, val in enumerate(row):
-                self.table.setItem(i, j, QTableWidgetItem(str(val)))
+    def _fill_training_row(self, i, row, is_new):
+        for j, val in enumerate(row):
+            self.table.setItem(i, j, QTableWidgetItem(str(val)))
 
+        if is_new:
             # Add "..." button in second last column and view to the last
             detail_btn = objects.TableStyledButton("...")
             detail_btn.clicked.connect(lambda checked, training_id=row[0]: self.show_training_details(training_id))
@@ -209,10 +164,16 @@ class TrainingPage(QWidget):
 
     def show_training_details(self, training_id):
         """Open a dialog showing details of one training with edit/delete options."""
-        training = datafetching.run_query(self.conn, "SELECT * FROM trainings WHERE id=?", (training_id,), True)
+        # The version is read with the values shown, so saving checks exactly what the form displays
+        training = datafetching.run_query(
+            self.conn, "SELECT id, name, description, departments, row_version FROM trainings WHERE id=?",
+            (training_id,), True
+        )
 
         if training:
             dialog = objects.StyledDialog(self, "Training Details")
+            # Saving checks this, so edits made meanwhile by someone else are not overwritten
+            self.training_version = training[4]
 
             # Fields
             form_layout = QFormLayout()
@@ -228,7 +189,7 @@ class TrainingPage(QWidget):
             form_layout.addRow("", self.desc_edit)
 
             # === Departments ===
-            self.dept_label = QLabel(training[3] if len(training) > 3 and training[3] else "")
+            self.dept_label = QLabel(training[3] or "")
             self.dept_box = QWidget()
             dept_layout = QVBoxLayout(self.dept_box)
 
@@ -246,6 +207,14 @@ class TrainingPage(QWidget):
             form_layout.addRow("Departments:", self.dept_label)
             form_layout.addRow("", self.dept_box)
 
+            # === Validity period ===
+            validity = datafetching.run_query(self.conn, "SELECT validity_months FROM trainings WHERE id=?", (training_id,), fetchone=True)[0]
+            self.validity_label = QLabel(validity_text(validity))
+            self.validity_edit = validity_spinbox(validity)
+            self.validity_edit.hide()
+            form_layout.addRow("Valid for:", self.validity_label)
+            form_layout.addRow("", self.validity_edit)
+
 
             # Buttons
             btn_layout = QHBoxLayout()
@@ -264,56 +233,40 @@ class TrainingPage(QWidget):
                     self.desc_edit.show()
                     self.dept_label.hide()
                     self.dept_box.show()
+                    self.validity_label.hide()
+                    self.validity_edit.show()
                     self.btn_edit.setText("Save")
                 else:
                     new_desc = self.desc_edit.toPlainText()
                     selected_depts = [chk.text() for chk in dept_checks if chk.isChecked()]
                     dept_string = ", ".join(selected_depts)
+                    new_validity = self.validity_edit.value() or None
 
-                    # --- Get old departments before updating ---
-                    row = datafetching.run_query(self.conn, "SELECT departments FROM trainings WHERE id=?", (training_id,), fetchone=True)
-                    old_dept_string = row[0] if row and row[0] else ""
-                    old_depts = [d.strip() for d in old_dept_string.split(",") if d.strip()]
-
-                    # --- Update the training record ---
-                    datafetching.run_query(self.conn, "UPDATE trainings SET description=?, departments=? WHERE id=?", (new_desc, dept_string, training_id), commit=True)
-
-                    # --- Work out department changes ---
-                    added_depts = set(d.strip() for d in selected_depts) - set(old_depts)
-                    removed_depts = set(old_depts) - set(d.strip() for d in selected_depts)
-
-                    # --- Build safe table name for this training ---
-                    orig_name = training[1]  # training name from earlier fetch
-                    safe_name = "".join(c if c.isalnum() else "_" for c in orig_name).strip("_")
-                    if not safe_name:
-                        safe_name = f"training_{training_id}"
-                    # Wrap in double quotes so SQLite accepts names with underscores/numbers
-                    table_name = f'"{safe_name}_{training_id}"'
-
-                    # --- Ensure per-training table exists (schema uses employees.id as FK) ---
+                    # --- Save the training and its roster changes together, unless someone else saved it first ---
                     try:
-                        datafetching.createtables(self.conn, table_name)
+                        result = enrollments.update_training(
+                            self.conn, training_id, self.training_version, new_desc, selected_depts, new_validity
+                        )
+                    except datafetching.ConflictError:
+                        QMessageBox.warning(
+                            dialog, "Edit Conflict",
+                            "Someone else changed this training while you were editing.\n"
+                            "Open it again to see their changes, then re-apply yours."
+                        )
+                        self.refresh_trainings([training_id])
+                        dialog.reject()
+                        return
+                    except sqlite3.OperationalError as e:
+                        QMessageBox.critical(dialog, "Database Busy", f"The database is in use by someone else, try again:\n{e}")
+                        return
                     except sqlite3.Error as e:
-                        QMessageBox.critical(self, "Database Error", f"Could not create training table:\n{e}")
+                        QMessageBox.critical(dialog, "Database Error", f"Could not save training:\n{e}")
                         return
+                    self.training_version = result["row_version"]
 
-                    # --- Handle added departments: add employees to this training table ---
-                    for dept in added_depts:
-                        employees = datafetching.run_query(self.conn, "SELECT company_id, name, department FROM employees WHERE department=?", (dept,))
-                        for emp_id, emp_name, emp_dept in employees:
-                            # avoid duplicates by checking employee_id existance in this training table
-                            eXist = datafetching.run_query(self.conn, f'SELECT 1 FROM {table_name} WHERE employee_id=?', (emp_id,), fetchone=True)
-                            if not eXist:
-                                datafetching.run_query(self.conn, f'INSERT INTO {table_name} (employee_id, employee_name, department, status) VALUES (?, ?, ?, ?)', (emp_id, emp_name, emp_dept, "Pending"), commit=True)
-
-                    # --- Handle removed departments: mark Not Needed if not Completed --- 
-                    for dept in removed_depts:
-                        employees = datafetching.run_query(self.conn, "SELECT company_id FROM employees WHERE department=?", (dept,))
-                        for emp_id, in employees:
-                            datafetching.run_query(self.conn, f"UPDATE {table_name} SET status=? WHERE employee_id=? AND status!='Completed'", ("Not Needed", emp_id), commit=True)
-
-                    # --- Refresh UI ---
-                    self.show_trainings()
+                    self.validity_label.setText(validity_text(new_validity))
+                    self.validity_label.show()
+                    self.validity_edit.hide()
                     self.desc_label.setText(new_desc)
                     self.desc_label.show()
                     self.desc_edit.hide()
@@ -325,13 +278,19 @@ class TrainingPage(QWidget):
 
 
             def delete_training():
-                confirm = QMessageBox.question(dialog, "Confirm Delete",
-                                               "Are you sure you want to delete this training?",
-                                               QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
-                if confirm == QMessageBox.StandardButton.Yes:
-                    datafetching.run_query(self.conn, "DELETE FROM trainings WHERE id=?", (training_id,), commit=True)
-                    self.show_trainings()
-                    dialog.accept()  # close dialog
+                choice = objects.ask_archive_or_delete(dialog, "training")
+                if choice is None:
+                    return
+                try:
+                    # Either way the roster table goes too
+                    if choice == "archive":
+                        archive.archive_training(self.conn, training_id)
+                    else:
+                        archive.delete_training(self.conn, training_id)
+                except sqlite3.Error as e:
+                    QMessageBox.critical(dialog, "Delete Training", f"Failed to remove training:\n{e}")
+                    return
+                dialog.accept()  # close dialog
 
             self.btn_edit.clicked.connect(toggle_edit)
             self.btn_delete.clicked.connect(delete_training)
@@ -364,6 +323,8 @@ class TrainingPage(QWidget):
         layout.addRow("Training Name:", name_input)
         layout.addRow("Description:", desc_input)
         layout.addRow("Departments:", dept_box)
+        validity_input = validity_spinbox()
+        layout.addRow("Valid for:", validity_input)
         buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
         dialog.main_layout.addWidget(buttons)
         buttons.accepted.connect(dialog.accept)
@@ -373,55 +334,81 @@ class TrainingPage(QWidget):
             name = name_input.text().strip().replace(" ", "_")  # ensure safe table name
             desc = desc_input.toPlainText().strip()
             selected_depts = [chk.text() for chk in dept_checks if chk.isChecked()]
-            dept_string = ", ".join(selected_depts)
+            validity = validity_input.value() or None
             try:
                 name = sanitize_training_name(name)
             except ValueError as e:
                 QMessageBox.warning(self, "Invalid Training Name", str(e)) 
 
             if name:
-                # 1. Save the training to the trainings table
-                training_id = datafetching.run_query(self.conn, "INSERT INTO trainings (name, description, departments) VALUES (?, ?, ?)", (name, desc, dept_string), commit=True, return_id=True)
-                table_name = f"{name}_{training_id}"
-
-                # 2. Create a new table for this training
+                # Training record, roster table and enrollments are saved together
                 try:
-                    datafetching.createtables(self.conn, table_name)
+                    training_id, enrolled = enrollments.add_training(self.conn, name, desc, selected_depts, validity)
+                except sqlite3.OperationalError as e:
+                    QMessageBox.critical(self, "Database Busy", f"The database is in use by someone else, try again:\n{e}")
+                    return
                 except sqlite3.Error as e:
-                    QMessageBox.critical(self, "Database Error", f"Could not create training table:\n{e}")
+                    QMessageBox.critical(self, "Database Error", f"Could not create training:\n{e}")
                     return
 
-                # 3. Add employees from the selected departments into the new table
-                has_employees = False
-                for dept in selected_depts:
-                    employees = datafetching.run_query(self.conn, "SELECT id, company_id, name, department FROM employees WHERE department = ?", (dept,))
-                    if employees:  # Only insert if we actually found employees
-                        has_employees = True
-                        for emp in employees:
-                            datafetching.run_query(self.conn, f"INSERT INTO {table_name} (employee_id, employee_name, department, status) VALUES (?, ?, ?, ?)",
-                                (emp[1], emp[2], emp[3], "Pending"), 
-                                commit=True
-                                )
-
-                if has_employees:
+                table_name = datafetching.training_table(training_id, name)
+                if enrolled:
                     print(f"Employees added to training table {table_name}")
                 else:
                     print(f"No employees found. Created empty training table {table_name}")
 
-                self.show_trainings()  # Refresh table
+    @profiling.profiled("show_due_view")
+    def show_due_view(self):
+        """List overdue enrollments and those due in the next 30 days, soonest first."""
+        try:
+            items = recertification.due_enrollments(self.conn)
+        except sqlite3.Error as e:
+            QMessageBox.critical(self, "Due / Overdue", f"Failed to load due trainings:\n{e}")
+            return
 
+        dialog = objects.StyledDialog(self, "Due / Overdue")
+        dialog.resize(900, 500)
+        overdue = sum(1 for item in items if item["state"] == recertification.OVERDUE)
+        dialog.main_layout.addWidget(QLabel(
+            f"{overdue} overdue, {len(items) - overdue} due in the next {recertification.DUE_WITHIN_DAYS} days"
+        ))
+
+        columns = [("due_date", "Due"), ("state", "State"), ("training", "Training"), ("employee_id", "Employee ID"),
+                   ("employee_name", "Name"), ("department", "Department"), ("status", "Status")]
+        table = objects.Table()
+        table.setColumnCount(len(columns))
+        table.setHorizontalHeaderLabels([label for _, label in columns])
+        table.setRowCount(len(items))
+        for i, item in enumerate(items):
+            for j, (key, _) in enumerate(columns):
+                table.setItem(i, j, QTableWidgetItem(str(item[key])))
+        dialog.main_layout.addWidget(table)
+
+        close = QPushButton("Close")
+        close.clicked.connect(dialog.accept)
+        dialog.main_layout.addWidget(close)
+        dialog.exec()
+
+    @profiling.profiled("openEmployeeTrainings")
     def openEmployeeTrainings(self, training_id, training_name):
-        self.training_page = EmployeeTrainingPages()
-        self.training_page.showMaximized()
+        # One roster window is kept and re-pointed at whichever training is opened
+        if self.training_page is None:
+            self.training_page = EmployeeTrainingPages(self.conn)
         self.training_page.show_training_employees(training_id, training_name)
-        self.training_page.show()
+        self.training_page.showMaximized()
+        self.training_page.raise_()
+        self.training_page.activateWindow()
     
+    @profiling.profiled("import_trainings_from_excel")
     def import_trainings_from_excel(self):
         """Import trainings from an Excel file into the trainings table.
 
         - Detect header row in first 10 rows (case-insensitive).
         - Required columns: Name, Description, Departments.
+        - Dry run first: the whole sheet is validated and diffed against the
+          database, and one summary dialog asks for confirmation.
         - If a training name already exists (case-insensitive), update its record.
+        - Rows whose content hash matches the stored training are skipped.
         - Ensure training table exists and add missing employees from the listed departments.
         """
         file_path, _ = QFileDialog.getOpenFileName(
@@ -434,131 +421,44 @@ class TrainingPage(QWidget):
             return
 
         try:
-            required = {"name", "description", "departments"}
-
-            # 1) Preview first 10 rows (no header) to find header row
-            preview = pd.read_excel(file_path, header=None, nrows=10)
-            header_row_index = None
-            for i, row in preview.iterrows():
-                row_vals = [str(v).strip().lower() for v in row.values if pd.notna(v)]
-                if required.issubset(set(row_vals)):
-                    header_row_index = i
-                    break
-
-            if header_row_index is None:
-                QMessageBox.warning(
-                    self,
-                    "Invalid File",
-                    "Could not find required header row (Name, Description, Departments) in the first 10 rows."
-                )
+            # 1) Read the whole sheet; incomplete rows are reported, not dropped
+            try:
+                df = importers.read_trainings(file_path, drop_incomplete=False)
+            except ValueError as e:
+                QMessageBox.warning(self, "Invalid File", str(e))
                 return
 
-            # 2) Re-read file with detected header row
-            df = pd.read_excel(file_path, header=header_row_index)
-            # normalize column names
-            df.columns = [str(c).strip() for c in df.columns]
-            col_map = {str(c).strip().lower(): c for c in df.columns}
-            missing = required - set(col_map.keys())
-            if missing:
-                QMessageBox.warning(
-                    self,
-                    "Invalid File",
-                    f"Missing required columns after header detection: {', '.join(missing)}"
-                )
+            # 2) Dry run: validate and diff against the database, confirm once
+            preview = importers.preview_trainings(self.conn, df)
+            unknown = preview["unknown_departments"]
+            options = []
+            if unknown:
+                options.append(("add_departments",
+                                f"Add {len(unknown)} new departments (otherwise they are left off the trainings)", True))
+            dialog = objects.ImportPreviewDialog(
+                importers.summarize(preview, "trainings"), options, self, "Import Trainings"
+            )
+            if not dialog.exec():
                 return
 
-            name_col = col_map["name"]
-            desc_col = col_map["description"]
-            depts_col = col_map["departments"]
+            # 3) Write everything in one pass
+            add_departments = dialog.option("add_departments")
+            if add_departments:
+                importers.add_departments(self.conn, unknown)
+            result = importers.sync_trainings(self.conn, importers.training_rows(preview, add_departments))
 
-            added_count = 0
-            updated_count = 0
-
-            for _, row in df.iterrows():
-                raw_name = str(row[name_col]).strip() if pd.notna(row[name_col]) else ""
-                if not raw_name:
-                    continue
-
-                try:
-                    safe_name = sanitize_training_name(raw_name)
-                except ValueError as e:
-                    QMessageBox.warning(self, "Invalid Training Name", str(e))
-                    continue  # skip this row or ask user to correct
-
-                # keep stored name consistent with previous code: replace spaces with underscore
-                stored_name = safe_name.replace(" ", "_")
-                desc = str(row[desc_col]).strip() if pd.notna(row[desc_col]) else ""
-                depts = str(row[depts_col]).strip() if pd.notna(row[depts_col]) else ""
-
-                if not stored_name or not desc or not depts:
-                    continue  # skip incomplete rows
-
-                # 3) Check for existing training by name (case-insensitive)
-                existing = datafetching.run_query(self.conn, "SELECT id, name, description, departments FROM trainings WHERE LOWER(name)=?", (stored_name.lower(),), fetchone=True)
-                if existing:
-                    training_id = existing[0]
-                    # update description/departments if changed
-                    datafetching.run_query(self.conn, "UPDATE trainings SET description=?, departments=? WHERE id=?", (desc, depts, training_id), commit=True)
-                    updated_count += 1
-                else:
-                    # insert new training
-                    training_id = datafetching.run_query(self.conn, "INSERT INTO trainings (name, description, departments) VALUES (?, ?, ?)", (stored_name, desc, depts), commit=True, return_id=True)
-                    added_count += 1
-
-                # 4) Create/ensure training table exists (use safe name)
-                safe_name = "".join(c if c.isalnum() else "_" for c in stored_name)
-                table_name = f"{safe_name}_{training_id}"
-                try:
-                    datafetching.createtables(self.conn, table_name)
-                except sqlite3.Error as e:
-                    QMessageBox.critical(self, "Database Error", f"Could not create training table:\n{e}")
-                    return
-
-                # 5) Add employees for departments listed (avoid duplicates)
-                dept_list = [d.strip() for d in depts.split(",") if d.strip()]
-                clean_dept_list = []
-                dept_map = {} 
-                for dept in dept_list:
-                    if dept in dept_map:
-                        dept = dept_map[dept]  # reuse previous choice
-                    else:
-                        dept = handle_department(self.conn, dept, self)
-                        if not dept:
-                            return  # user cancelled
-                        dept_map[dept] = dept
-                        clean_dept_list.append(dept)
-                    employees = datafetching.run_query(self.conn, "SELECT company_id, name, department FROM employees WHERE department = ?", (dept,))
-                    if employees:
-                        for emp in employees:
-                            emp_id, emp_name, emp_dept = emp
-                            # avoid duplicate entry in training table
-                            exist = datafetching.run_query(self.conn, f'SELECT 1 FROM "{table_name}" WHERE employee_id=?', (emp_id,), fetchone=True)
-                            if not exist:
-                                datafetching.run_query(
-                                    self.conn, 
-                                    f'INSERT INTO "{table_name}" (employee_id, employee_name, department, status) VALUES (?, ?, ?, ?)',
-                                    (emp_id, emp_name, emp_dept, "Pending"),
-                                    commit=True
-                                    )
-                dept_string = ", ".join(clean_dept_list)
-                datafetching.run_query(
-                    self.conn,
-                    "UPDATE trainings SET description=?, departments=? WHERE id=?",
-                    (desc, dept_string, training_id),
-                    commit=True
-                )
             QMessageBox.information(
                 self,
                 "Import Complete",
-                f"Imported {added_count} new trainings. Updated {updated_count} existing trainings."
+                f"Imported {len(result['added'])} new trainings. Updated {len(result['updated'])} existing trainings, "
+                f"{result['unchanged']} unchanged."
             )
-            self.show_trainings()
 
         except Exception as e:
             QMessageBox.critical(self, "Import Error", f"Failed to import trainings:\n{e}")
 
 
-
+    @profiling.profiled("export_trainings_to_excel")
     def export_trainings_to_excel(self):
         """Export all trainings to an Excel file."""
         file_path, _ = QFileDialog.getSaveFileName(